@@ -1,11 +1,12 @@
 import coloredlogs
 import logging
+import shutil
 import subprocess
 from pathlib import Path
 import time
 from schema import Schema, Use, Or, And, Optional
 
-from SCAutolib.enums import CardType, UserType
+from SCAutolib.enums import CardType, UserType, CABackend
 
 fmt = ("%(asctime)s %(name)s:%(module)s.%(funcName)s.%(lineno)d "
        "[%(levelname)s] %(message)s")
@@ -30,6 +31,9 @@ LIB_DUMP_USERS = LIB_DUMP.joinpath("users")
 LIB_DUMP_CAS = LIB_DUMP.joinpath("cas")
 LIB_DUMP_CARDS = LIB_DUMP.joinpath("cards")
 LIB_DUMP_CONFS = LIB_DUMP.joinpath("confs")
+LIB_JOURNAL = LIB_DUMP.joinpath("journal.json")
+LIB_KEYS = LIB_DIR.joinpath("keys")
+SSSD_PIPES = Path("/var/lib/sss/pipes")
 
 
 schema_cas = Schema(And(
@@ -38,7 +42,8 @@ schema_cas = Schema(And(
     # two entries
     lambda l: 1 <= len(l.keys()) <= 2,  # noqa: E741
     {Optional("local_ca"): {
-        Optional("dir", default=Path("/etc/SCAutolib/ca")): Use(Path)},
+        Optional("dir", default=Path("/etc/SCAutolib/ca")): Use(Path),
+        Optional("backend", default=CABackend.openssl): Use(CABackend)},
         Optional("ipa"): {
             'admin_passwd': Use(str),
             'root_passwd': Use(str),
@@ -131,3 +136,87 @@ def run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True,
             raise subprocess.CalledProcessError(out.returncode, cmd)
     time.sleep(sleep)
     return out
+
+
+def wait_until(condition, timeout: float = 10, interval: float = 0.1,
+               max_interval: float = 1) -> bool:
+    """
+    Poll given condition until it is true or the timeout expires. Interval
+    between the checks is doubled after each unsuccessful check up to
+    ``max_interval``, so fast events are detected almost immediately and slow
+    events don't cause too many checks.
+
+    :param condition: callable without parameters returning True when the
+        awaited event occurred
+    :type condition: callable
+    :param timeout: maximum time in seconds to wait for the condition
+    :type timeout: float
+    :param interval: time in seconds before the second check
+    :type interval: float
+    :param max_interval: maximum time in seconds between two checks
+    :type max_interval: float
+    :return: True if the condition is met, False if the timeout expired
+    :rtype: bool
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if condition():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
+
+
+def _sssd_ready() -> bool:
+    """
+    Check if SSSD can serve requests: the service is active, sockets of NSS
+    and PAM responders exist and all domains report their status.
+    """
+    state = run(["systemctl", "show", "--property", "ActiveState", "--value",
+                 "sssd"], check=False, print_=False).stdout.strip()
+    if state != "active":
+        return False
+    if not all(SSSD_PIPES.joinpath(responder).exists()
+               for responder in ("nss", "pam")):
+        return False
+    # sssctl is part of sssd-tools package that doesn't have to be installed
+    if shutil.which("sssctl") is None:
+        return True
+    out = run(["sssctl", "domain-list"], check=False, print_=False)
+    if out.returncode != 0:
+        return False
+    return all(run(["sssctl", "domain-status", "--online", domain],
+                   check=False, print_=False).returncode == 0
+               for domain in out.stdout.split())
+
+
+def wait_for_sssd_ready(timeout: float = 30) -> bool:
+    """
+    Wait until SSSD is able to serve requests. Should be called after each
+    start or restart of SSSD service instead of sleeping for a fixed time.
+
+    :param timeout: maximum time in seconds to wait for SSSD
+    :type timeout: float
+    :return: True if SSSD is ready, False if the timeout expired
+    :rtype: bool
+    """
+    if wait_until(_sssd_ready, timeout=timeout, interval=0.2):
+        logger.debug("SSSD is ready")
+        return True
+    logger.warning(f"SSSD is not ready after {timeout} seconds")
+    return False
+
+
+def restart_sssd(timeout: float = 30) -> bool:
+    """
+    Restart SSSD service and wait until it is ready.
+
+    :param timeout: maximum time in seconds to wait for SSSD
+    :type timeout: float
+    :return: True if SSSD is ready, False if the timeout expired
+    :rtype: bool
+    """
+    run(["systemctl", "restart", "sssd"])
+    return wait_for_sssd_ready(timeout)
@@ -9,7 +9,6 @@ from sys import exit
 from collections import OrderedDict
 
 from SCAutolib import logger, exceptions, schema_user
-from SCAutolib.controller import Controller
 from SCAutolib.enums import ReturnCode
 
 
@@ -64,11 +63,15 @@ class NaturalOrderGroup(click.Group):
               help="Verbosity level.")
 @click.pass_context
 def cli(ctx, force, verbose, conf):
+    # Controller loads most of the library, so it is imported only when some
+    # command is executed, not for --help output
+    from SCAutolib.controller import Controller
+
     logger.setLevel(verbose)
     ctx.ensure_object(dict)  # Create a dict to store the context
     ctx.obj["FORCE"] = force  # Store the force option in the context
     parsed_conf = None
-    if ctx.invoked_subcommand != "gui":
+    if ctx.invoked_subcommand not in ("gui", "fill-key-pool"):
         parsed_conf = check_conf_path(conf)
     ctx.obj["CONTROLLER"] = Controller(parsed_conf)
 
@@ -89,18 +92,66 @@ def cli(ctx, force, verbose, conf):
               default=False,
               is_flag=True,
               help="Install missing packages")
+@click.option("--jobs", "-j",
+              required=False,
+              default=1,
+              type=click.IntRange(min=1),
+              show_default=True,
+              help="Number of setup tasks (CAs, users, cards) executed in "
+                   "parallel")
+@click.option("--no-csr-files",
+              required=False,
+              default=False,
+              is_flag=True,
+              help="Do not store CSR and user CNF files in card directories")
+@click.option("--key-pool",
+              required=False,
+              default=0,
+              type=click.IntRange(min=0),
+              show_default=True,
+              help="Number of private keys kept pre-generated in background "
+                   "during the setup")
 @click.pass_context
-def prepare(ctx, gdm, install_missing, graphical):
+def prepare(ctx, gdm, install_missing, graphical, jobs, no_csr_files,
+            key_pool):
     """Configure entire system for smart cards based on the config file."""
     ctx.obj["CONTROLLER"].prepare(
         ctx.obj["FORCE"],
         gdm,
         install_missing,
-        graphical
+        graphical,
+        jobs,
+        not no_csr_files,
+        key_pool
     )
     exit(ReturnCode.SUCCESS.value)
 
 
+@cli.command()
+@click.option("--size", "-s",
+              required=False,
+              default=20,
+              type=click.IntRange(min=1),
+              show_default=True,
+              help="Number of private keys the pool should contain")
+@click.option("--jobs", "-j",
+              required=False,
+              default=None,
+              type=click.IntRange(min=1),
+              help="Number of processes generating the keys. Number of CPUs "
+                   "is used by default")
+@click.pass_context
+def fill_key_pool(ctx, size, jobs):
+    """
+    Pre-generate private keys for virtual cards, so the keys are not generated
+    during the setup.
+    """
+    key_pool = ctx.obj["CONTROLLER"].key_pool
+    key_pool.size = size
+    key_pool.fill(jobs)
+    exit(ReturnCode.SUCCESS.value)
+
+
 @cli.command()
 @click.option("--ca-type", "-t",
               required=False,
@@ -1,5 +1,8 @@
 import json
 import os
+import pwd
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
 from pathlib import Path
 from schema import Schema, Use
 from shutil import rmtree
@@ -8,15 +11,19 @@ from typing import Union
 from SCAutolib import exceptions, schema_cas, schema_user, schema_card
 from SCAutolib import (logger, run, LIB_DIR, LIB_BACKUP, LIB_DUMP,
                        LIB_DUMP_USERS, LIB_DUMP_CAS, LIB_DUMP_CARDS,
-                       LIB_DUMP_CONFS, TEMPLATES_DIR)
+                       LIB_DUMP_CONFS, TEMPLATES_DIR, restart_sssd,
+                       wait_for_sssd_ready)
 from SCAutolib.models import CA, file, user, card, authselect as auth
 from SCAutolib.models.file import File, OpensslCnf
 from SCAutolib.models.CA import BaseCA
+from SCAutolib.models.journal import StepJournal
+from SCAutolib.models.key_pool import KeyPool
 from SCAutolib.enums import (CardType, UserType)
 from SCAutolib.utils import (_check_selinux, _gen_private_key,
                              _install_packages, _check_packages,
                              dump_to_json, ca_factory)
 from SCAutolib.isDistro import isDistro
+from SCAutolib.scheduler import TaskGraph
 
 
 class Controller:
@@ -27,8 +34,15 @@ class Controller:
     local_ca: CA.LocalCA = None
     ipa_ca: CA.IPAServerCA = None
     users: [user.User] = None
+    key_pool: KeyPool = KeyPool()
     dconf_file = File(filepath='/etc/dconf/db/local.d/gnome_disable_welcome',
                       template=Path(TEMPLATES_DIR, 'gnome_disable_welcome'))
+    # Files changed only by the system setup. Changes of these files
+    # invalidate the setup_system step in the journal.
+    _system_files = (Path("/usr/lib/systemd/system/pcscd.service"),
+                     Path("/usr/share/p11-kit/modules/opensc.module"))
+    _sssd_conf_file = Path("/etc/sssd/sssd.conf")
+    _ipa_default_conf = Path("/etc/ipa/default.conf")
 
     @property
     def conf_path(self):
@@ -68,6 +82,9 @@ class Controller:
             self.lib_conf = self._validate_configuration(tmp_conf, params)
 
         self.users = []
+        self.journal = StepJournal()
+        # Results of RPM database queries, so each package is checked only once
+        self._packages = {}
         for d in (LIB_DIR, LIB_BACKUP, LIB_DUMP, LIB_DUMP_USERS, LIB_DUMP_CAS,
                   LIB_DUMP_CARDS, LIB_DUMP_CONFS):
             d.mkdir(exist_ok=True)
@@ -79,7 +96,8 @@ class Controller:
             self.ipa_ca = BaseCA.load(LIB_DUMP_CAS.joinpath("ipa-server.json"))
 
     def prepare(self, force: bool, gdm: bool, install_missing: bool,
-                graphical: bool):
+                graphical: bool, jobs: int = 1, write_csr: bool = True,
+                key_pool_size: int = 0):
         """
         Prepare system for testing. This method provides complex configuration
         of system under test for testing including creation of CAs, users and
@@ -100,34 +118,132 @@ class Controller:
         :type install_missing: bool
         :param graphical: If True, GUI tests dependencies are installed
         :type graphical: bool
+        :param jobs: Maximum number of setup tasks (CAs, users, cards) that
+            are executed in parallel. Tasks are started when the tasks they
+            depend on are finished (e.g. card is created after its user). Steps
+            touching state shared between the cards (CA database, systemd
+            units, card readers) are serialized by the corresponding objects.
+        :type jobs: int
+        :param write_csr: If False, CSRs for virtual cards are passed to CAs
+            only in memory and neither CSR nor user CNF files are stored in
+            card directories.
+        :type write_csr: bool
+        :param key_pool_size: If greater than 0, the key pool is refilled to
+            given number of keys in background processes during the setup, so
+            private keys for cards are ready when the cards are enrolled.
+            Keys that are already present in the pool are used regardless of
+            this parameter.
+        :type key_pool_size: int
         """
-        self.setup_system(install_missing, gdm, graphical)
+        if key_pool_size:
+            self.key_pool.size = key_pool_size
+            self.key_pool.start()
+        try:
+            self._prepare(force, gdm, install_missing, graphical, jobs,
+                          write_csr)
+        finally:
+            self.key_pool.stop()
+
+    def _prepare(self, force: bool, gdm: bool, install_missing: bool,
+                 graphical: bool, jobs: int, write_csr: bool):
+        """
+        Build the graph of setup tasks and execute it. Independent tasks (CAs,
+        users, card tokens) run in parallel when ``jobs`` is greater than 1.
+        """
+        graph = TaskGraph()
+        graph.add("setup_system", lambda: self.setup_system(
+            install_missing, gdm, graphical))
 
         # Prepare CAs: Virtual cards are populated by certificates that are: a)
         # created locally and signed by local CA configured on the system under
         # test, or b) created and signed using FreeIPA.
-        try:
-            self.setup_local_ca(force=force)
-        except exceptions.SCAutolibWrongConfig as e:
-            logger.info(e)
-        try:
-            self.setup_ipa_client(force=force)
-        except exceptions.SCAutolibWrongConfig as e:
-            logger.info(e)
-
+        cas = {}
+        if "local_ca" in self.lib_conf["ca"]:
+            cas[UserType.local] = graph.add(
+                "setup_local_ca", lambda: self.setup_local_ca(force=force),
+                deps=["setup_system"]).name
+        else:
+            logger.info("Section for local CA is not found in the "
+                        "configuration file")
+        if "ipa" in self.lib_conf["ca"]:
+            # Both CAs restart SSSD and update its configuration, so they are
+            # not configured at the same time
+            cas[UserType.ipa] = graph.add(
+                "setup_ipa_client", lambda: self.setup_ipa_client(force=force),
+                deps=["setup_system", *cas.values()]).name
+        else:
+            logger.info("Section for IPA is not found in the configuration "
+                        "file")
+
+        # Local users are created one by one, IPA users are added to the IPA
+        # server together by single task
+        user_types = {}
+        user_tasks = {}
+        ipa_users = []
         for usr in self.lib_conf["users"]:
-            self.setup_user(usr, force=force)
+            user_types[usr["name"]] = usr["user_type"]
+            if usr["user_type"] == UserType.ipa:
+                ipa_users.append(usr)
+                continue
+            user_tasks[usr["name"]] = graph.add(
+                f"user/{usr['name']}",
+                lambda usr=usr: self.setup_user(usr, force=force),
+                deps=["setup_system"]).name
+        if ipa_users:
+            deps = ["setup_system"]
+            if UserType.ipa in cas:
+                deps.append(cas[UserType.ipa])
+            name = graph.add(
+                "users/ipa",
+                lambda: self.setup_ipa_users(ipa_users, force=force),
+                deps).name
+            user_tasks.update((usr["name"], name) for usr in ipa_users)
 
         # Create cards defined in config. For physical cards only objects will
-        # be created while for virtual cards tokens will be created and enrolled
+        # be created while for virtual cards tokens will be created. Virtual
+        # cards are then enrolled by one task per CA.
+        enrollments = {}
         for token in self.lib_conf["cards"]:
-            # prepare CA objects for physical cards
-            if token["card_type"] == CardType.physical:
-                self.setup_custom_ca(token)
-                self.setup_card(token)
-            elif token["card_type"] == CardType.virtual:
-                c = self.setup_card(token)
-                self.enroll_card(c)
+            deps = ["setup_system"]
+            if token["cardholder"] in user_tasks:
+                deps.append(user_tasks[token["cardholder"]])
+            name = graph.add(
+                f"card/{token['name']}",
+                lambda token=token: self.provision_card(
+                    token, write_cnf=write_csr), deps).name
+            if token["card_type"] == CardType.virtual:
+                user_type = user_types.get(token["cardholder"], UserType.local)
+                enrollments.setdefault(user_type, []).append(name)
+
+        for user_type, names in enrollments.items():
+            deps = list(names)
+            if user_type in cas:
+                deps.append(cas[user_type])
+            graph.add(f"enroll/{UserType(user_type).value}",
+                      lambda names=names: self.enroll_cards(
+                          [graph.tasks[n].result for n in names], jobs,
+                          write_csr=write_csr), deps)
+
+        graph.run(jobs)
+
+    def provision_card(self, token: dict, write_cnf: bool = True):
+        """
+        Create the card defined by given section of the configuration file.
+        Physical cards get their CA object and card object, virtual cards are
+        created, but not enrolled. Cards are independent of each other, so
+        this method can be executed for several cards in parallel.
+
+        :param token: Dictionary containing card attributes
+        :type token: dict
+        :param write_cnf: If True, openssl CNF file of the cardholder is
+            stored in the card directory
+        :type write_cnf: bool
+        :return: the card object
+        """
+        # prepare CA objects for physical cards
+        if token["card_type"] == CardType.physical:
+            self.setup_custom_ca(token)
+        return self.setup_card(token, write_cnf=write_cnf)
 
     def setup_system(self, install_missing: bool, gdm: bool, graphical: bool):
         """
@@ -148,6 +264,10 @@ class Controller:
                   LIB_DUMP_CARDS):
             d.mkdir(exist_ok=True)
 
+        if self.journal.done("setup_system",
+                             *self._system_inputs(gdm, graphical)):
+            return
+
         packages = ["opensc", "httpd", "sssd", "sssd-tools", "gnutls-utils",
                     "openssl", "nss-tools"]
 
@@ -168,9 +288,9 @@ class Controller:
             packages += self._general_steps_for_ipa()
 
         # Check for installed packages
-        missing = _check_packages(packages)
+        missing = _check_packages(packages, self._packages)
         if install_missing and missing:
-            _install_packages(missing)
+            _install_packages(missing, self._packages)
         elif missing:
             msg = "Can't continue. Some packages are missing: " \
                   f"{', '.join(missing)}"
@@ -198,6 +318,40 @@ class Controller:
         dump_to_json(base_user)
         dump_to_json(user.User(username="root",
                                password=self.lib_conf["root_passwd"]))
+        self.journal.record("setup_system",
+                            *self._system_inputs(gdm, graphical))
+
+    def _system_inputs(self, gdm: bool, graphical: bool) -> tuple:
+        """
+        Inputs of the setup_system step for the journal. sssd.conf is
+        created by this step, but it is changed by setup_ipa_client later, so
+        only its presence is considered. Otherwise, the step would never be
+        skipped after IPA client is configured.
+        """
+        return (gdm, graphical,
+                sorted({c["card_type"] for c in self.lib_conf["cards"]}),
+                sorted({u["user_type"] for u in self.lib_conf["users"]}),
+                [StepJournal.state(f) for f in self._system_files],
+                self._sssd_conf_file.exists())
+
+    def _ipa_client_inputs(self) -> tuple:
+        """
+        Inputs of the setup_ipa_client step for the journal. Domains in
+        sssd.conf are included, so the step is done again when sssd.conf
+        is re-created without the IPA domain.
+        """
+        return (self.lib_conf["ca"]["ipa"],
+                StepJournal.state(self._ipa_default_conf),
+                StepJournal.state(CA.IPAServerCA.dump_file),
+                self._sssd_domains())
+
+    def _sssd_domains(self):
+        """
+        :return: value of domains option in sssd.conf or None if it is not set
+        """
+        parser = ConfigParser(interpolation=None)
+        parser.read(self._sssd_conf_file)
+        return parser.get("sssd", "domains", fallback=None)
 
     def setup_graphical(self, install_missing: bool, gdm: bool):
         packages = ["gcc", "tesseract", "ffmpeg-free"]
@@ -205,9 +359,9 @@ class Controller:
         if gdm:
             packages.append("gdm")
 
-        missing = _check_packages(packages)
+        missing = _check_packages(packages, self._packages)
         if install_missing and missing:
-            _install_packages(missing)
+            _install_packages(missing, self._packages)
         elif missing:
             msg = "Can't continue with graphical. Some packages are missing: " \
                   f"{', '.join(missing)}"
@@ -248,10 +402,22 @@ class Controller:
             raise exceptions.SCAutolibWrongConfig(msg)
 
         ca_dir: Path = self.lib_conf["ca"]["local_ca"]["dir"]
+
+        def inputs():
+            return (self.lib_conf["ca"]["local_ca"],
+                    StepJournal.state(ca_dir.joinpath("rootCA.pem")),
+                    StepJournal.state(ca_dir.joinpath("rootCA.key")),
+                    StepJournal.state(CA.LocalCA.dump_file))
+
+        if not force and self.local_ca is not None \
+                and self.journal.done("setup_local_ca", *inputs()):
+            return
         ca_dir.mkdir(exist_ok=True, parents=True)
 
         cnf = OpensslCnf(ca_dir.joinpath("ca.cnf"), "CA", str(ca_dir))
-        self.local_ca = ca_factory(path=ca_dir, cnf=cnf, create=True)
+        self.local_ca = ca_factory(
+            path=ca_dir, cnf=cnf, create=True,
+            backend=self.lib_conf["ca"]["local_ca"]["backend"])
         if force:
             logger.warning(f"Removing previous local CA from {ca_dir}")
             self.local_ca.cleanup()
@@ -259,11 +425,12 @@ class Controller:
         cnf.save()
         self.local_ca.setup()
         self.local_ca.update_ca_db()
-        run(["systemctl", "restart", "sssd"], sleep=5)
+        restart_sssd()
 
         logger.info(f"Local CA is configured in {ca_dir}")
 
         dump_to_json(self.local_ca)
+        self.journal.record("setup_local_ca", *inputs())
 
     def setup_custom_ca(self, card_data: dict):
         if card_data["card_type"] == CardType.physical:
@@ -287,6 +454,11 @@ class Controller:
         if "ipa" not in self.lib_conf["ca"]:
             msg = "Section for IPA is not found in the configuration file"
             raise exceptions.SCAutolibWrongConfig(msg)
+
+        if not force and self.ipa_ca is not None \
+                and self.journal.done("setup_ipa_client",
+                                      *self._ipa_client_inputs()):
+            return
         self.ipa_ca = CA.IPAServerCA(**self.lib_conf["ca"]["ipa"])
 
         if self.ipa_ca.is_installed:
@@ -304,6 +476,7 @@ class Controller:
                            value=f"shadowutils, {self.ipa_ca.domain}",
                            section="sssd")
         dump_to_json(self.ipa_ca)
+        self.journal.record("setup_ipa_client", *self._ipa_client_inputs())
 
     def setup_user(self, user_dict: dict, force: bool = False):
         """
@@ -316,31 +489,103 @@ class Controller:
         :type user_dict: dict
         :return: the user object
         """
+        if user_dict["user_type"] == UserType.ipa:
+            return self.setup_ipa_users([user_dict], force)[0]
+
         new_user = None
+        step = f"setup_user/{user_dict['name']}"
+        dump_file = LIB_DUMP_USERS.joinpath(f"{user_dict['name']}.json")
+        # The user can be removed from the system by other means than the
+        # library, so presence of the user in the system is an input too
+        if not force and self.journal.done(step, user_dict,
+                                           dump_file.exists(),
+                                           self._local_user_exists(
+                                               user_dict["name"])):
+            new_user = user.User.load(dump_file, ipa_server=self.ipa_ca)
+            self.users.append(new_user)
+            return new_user
+
+        new_user = user.User(username=user_dict["name"],
+                             password=user_dict["passwd"])
+        if force:
+            new_user.delete_user()
+        new_user.add_user()
+        self.users.append(new_user)
+        dump_to_json(new_user)
+        self.journal.record(step, user_dict, dump_file.exists(),
+                            self._local_user_exists(user_dict["name"]))
+        return new_user
 
-        if user_dict["user_type"] == UserType.local:
-            new_user = user.User(username=user_dict["name"],
-                                 password=user_dict["passwd"])
-            if force:
-                new_user.delete_user()
-            new_user.add_user()
+    @staticmethod
+    def _local_user_exists(username: str) -> bool:
+        """
+        :param username: name of the local user
+        :type username: str
+        :return: True if the user exists on the system, otherwise False
+        :rtype: bool
+        """
+        try:
+            pwd.getpwnam(username)
+            return True
+        except KeyError:
+            return False
 
-        else:
-            if self.ipa_ca is None:
-                msg = "Can't proceed in configuration of IPA user because no " \
-                      "IPA Client is configured"
-                raise exceptions.SCAutolibException(msg)
+    def setup_ipa_users(self, user_dicts: list, force: bool = False) -> list:
+        """
+        Configure IPA users on the IPA server. All users that are not set up
+        yet are added by IPA batch command at once.
+
+        :param user_dicts: list of sets of values to initialise the users
+        :type user_dicts: list
+        :param force: specify if the users should be re-created
+        :type force: bool
+        :return: list of user objects in the same order as user_dicts
+        :rtype: list
+        :raise SCAutolib.exceptions.SCAutolibException: if some user can't be
+            added. Users added successfully are recorded anyway.
+        """
+        if self.ipa_ca is None:
+            msg = "Can't proceed in configuration of IPA user because no " \
+                  "IPA Client is configured"
+            raise exceptions.SCAutolibException(msg)
+
+        new_users = []
+        pending = []
+        for user_dict in user_dicts:
+            step = f"setup_user/{user_dict['name']}"
+            dump_file = LIB_DUMP_USERS.joinpath(f"{user_dict['name']}.json")
+            if not force and self.journal.done(step, user_dict,
+                                               dump_file.exists()):
+                new_users.append(user.User.load(dump_file,
+                                                ipa_server=self.ipa_ca))
+                continue
             new_user = user.IPAUser(ipa_server=self.ipa_ca,
                                     username=user_dict["name"],
                                     password=user_dict["passwd"])
-            if force:
-                new_user.delete_user()
-            new_user.add_user()
-        self.users.append(new_user)
-        dump_to_json(new_user)
-        return new_user
+            new_users.append(new_user)
+            pending.append((user_dict, new_user))
 
-    def setup_card(self, card_dict: dict, force: bool = False):
+        user_set = user.IPAUserSet(self.ipa_ca, [u for _, u in pending])
+        if force:
+            user_set.delete_users()
+        failed = []
+        for (user_dict, new_user), error in zip(pending,
+                                                user_set.add_users()):
+            if error is not None:
+                failed.append(new_user.username)
+                continue
+            dump_to_json(new_user)
+            self.journal.record(f"setup_user/{user_dict['name']}", user_dict,
+                                new_user.dump_file.exists())
+        self.users.extend(u for u in new_users
+                          if u.username not in failed)
+        if failed:
+            raise exceptions.SCAutolibException(
+                f"IPA users are not added: {', '.join(failed)}")
+        return new_users
+
+    def setup_card(self, card_dict: dict, force: bool = False,
+                   write_cnf: bool = True):
         """
         Create card object. Card object should contain its root CA cert as it
         represents general card (i.e. including physical read-only cards).
@@ -349,8 +594,28 @@ class Controller:
         :type card_dict: dict
         :param force: If its true and card directory exists it will be removed
         :type force: bool
+        :param write_cnf: If True, openssl CNF file describing content of the
+            CSR is stored in the card directory for local users
+        :type write_cnf: bool
         """
         card_dir: Path = Path("/root/cards", card_dict["name"])
+        step = f"setup_card/{card_dict['name']}"
+        dump_file = LIB_DUMP_CARDS.joinpath(f"{card_dict['name']}.json")
+
+        def inputs():
+            # Content of the card directory is changed by the enrollment, so
+            # only files created by this step are considered
+            return (card_dict, dump_file.exists(),
+                    StepJournal.state(card_dir.joinpath("sofhtsm2.conf")),
+                    StepJournal.state(Path(
+                        f"/etc/systemd/system/{card_dict['name']}.service")),
+                    card_dir.joinpath("tokens").exists())
+
+        if not force and self.journal.done(step, *inputs()):
+            new_card = card.Card.load(dump_file)
+            if isinstance(new_card, card.VirtualCard):
+                new_card.user = self.link_user_to_card(new_card)
+            return new_card
         card_dir.mkdir(parents=True, exist_ok=True)
 
         if force and card_dir.exists():
@@ -364,7 +629,7 @@ class Controller:
                                         card_dir=card_dir)
             # card needs to know some details of its user
             new_card.user = self.link_user_to_card(new_card)
-            if new_card.user.user_type == UserType.local:
+            if new_card.user.user_type == UserType.local and write_cnf:
                 new_card.cnf = self.prepare_user_cnf(new_card)
             if force:
                 self.revoke_certs(new_card)
@@ -374,6 +639,7 @@ class Controller:
                                       "'virtual' are not supported")
 
         dump_to_json(new_card)
+        self.journal.record(step, *inputs())
         return new_card
 
     def link_user_to_card(self, card: card.VirtualCard):
@@ -419,17 +685,92 @@ class Controller:
             raise exceptions.SCAutolibException(
                 f"Card {card.name} is not initialized")
 
-        if not card.key.exists():
-            _gen_private_key(card.key)
+        if self.journal.done(*self._enroll_inputs(card)):
+            return
+
+        self._gen_card_key(card)
 
         if not card.cert.exists():
             csr = card.gen_csr()
-            ca = self.ipa_ca \
-                if isinstance(card.user, user.IPAUser) else self.local_ca
-            card.cert = ca.request_cert(csr, card.cardholder, card.cert)
+            card.cert = self._card_ca(card).request_cert(csr, card.cardholder,
+                                                         card.cert)
 
         card.enroll()
         dump_to_json(card)
+        self.journal.record(*self._enroll_inputs(card))
+
+    def enroll_cards(self, cards: [card.VirtualCard], jobs: int = 1,
+                     write_csr: bool = True):
+        """
+        Enroll several cards at once. Private keys and CSRs are generated in
+        parallel, missing certificates are requested from each CA by single
+        batch request and then the cards are enrolled in parallel.
+
+        :param cards: card objects
+        :type cards: list
+        :param jobs: Maximum number of cards processed in parallel
+        :type jobs: int
+        :param write_csr: If False, CSRs are not stored in card directories
+            and they are passed to CAs only in memory
+        :type write_csr: bool
+        """
+        def enroll(c: card.VirtualCard):
+            c.enroll()
+            dump_to_json(c)
+            self.journal.record(*self._enroll_inputs(c))
+
+        cards = [c for c in cards
+                 if not self.journal.done(*self._enroll_inputs(c))]
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            list(executor.map(self._gen_card_key, cards))
+
+            requests = {}
+            for c in cards:
+                if not c.cert.exists():
+                    requests.setdefault(self._card_ca(c), []).append(c)
+            failed = []
+            for ca, ca_cards in requests.items():
+                csrs = list(executor.map(lambda c: c.gen_csr(write_csr),
+                                         ca_cards))
+                results = ca.request_certs(
+                    [(csr, c.cardholder, c.cert)
+                     for csr, c in zip(csrs, ca_cards)])
+                for c, result in zip(ca_cards, results):
+                    if isinstance(result, Exception):
+                        failed.append(c.name)
+                    else:
+                        c.cert = result
+            if failed:
+                raise exceptions.SCAutolibException(
+                    f"Certificates for cards {', '.join(failed)} are not "
+                    f"issued")
+
+            list(executor.map(enroll, cards))
+
+    @staticmethod
+    def _enroll_inputs(card: card.VirtualCard) -> tuple:
+        """
+        Name and inputs of the enrollment step of given card for the journal.
+        """
+        return (f"enroll_card/{card.name}", StepJournal.state(card.key),
+                StepJournal.state(card.cert),
+                StepJournal.state(card.card_dir.joinpath("tokens")),
+                StepJournal.state(card.dump_file))
+
+    def _gen_card_key(self, card: card.VirtualCard):
+        """
+        Provide private key for given card if it doesn't exist. Key is taken
+        from the key pool and generated only if the pool is empty.
+        """
+        if not card.key.exists() and not self.key_pool.take(card.key):
+            _gen_private_key(card.key)
+
+    def _card_ca(self, card: card.VirtualCard):
+        """
+        Return CA that issues certificates for the user of given card.
+        """
+        return self.ipa_ca \
+            if isinstance(card.user, user.IPAUser) else self.local_ca
 
     def cleanup(self):
         """
@@ -437,20 +778,33 @@ class Controller:
         deletes created users with cards, remove CA's (local and/or IPA Client)
         """
         users = {}
+        ipa_users = []
 
         for user_file in LIB_DUMP_USERS.iterdir():
             usr = user.User.load(user_file, ipa_server=self.ipa_ca)
             users[usr.username] = usr
-            if usr.username != "root":
+            if isinstance(usr, user.IPAUser):
+                ipa_users.append(usr)
+            elif usr.username != "root":
                 usr.delete_user()
+        # IPA users are removed from the server by single batch
+        if ipa_users:
+            user.IPAUserSet(self.ipa_ca, ipa_users).delete_users()
 
+        virtual_cards = []
         for card_file in LIB_DUMP_CARDS.iterdir():
             if card_file.exists():
                 card_obj = card.Card.load(card_file)
                 if card_obj.card_type == CardType.virtual:
                     card_obj.user = users[card_obj.cardholder]
-                    self.revoke_certs(card_obj)
-                    card_obj.delete()
+                    virtual_cards.append(card_obj)
+
+        # Certificates are revoked before the cards are deleted. Cleanup
+        # continues if some certificate is not revoked, so the system is not
+        # left half cleaned, but the failure is reported at the end.
+        not_revoked = self._revoke_card_certs(virtual_cards)
+        for card_obj in virtual_cards:
+            card_obj.delete()
 
         if self.local_ca:
             self.local_ca.cleanup()
@@ -478,6 +832,42 @@ class Controller:
         pcscd_service.restore()
         opensc_module = File("/usr/share/p11-kit/modules/opensc.module")
         opensc_module.restore()
+        self.journal.forget()
+
+        if not_revoked:
+            raise exceptions.SCAutolibException(
+                f"Certificates are not revoked: "
+                f"{', '.join(str(cert) for cert in not_revoked)}")
+
+    def _revoke_card_certs(self, cards: list) -> list:
+        """
+        Revoke certificates of the cards. Certificates of each CA are revoked
+        together.
+
+        :param cards: virtual cards with loaded users
+        :type cards: list
+        :return: paths to the certificates that are not revoked
+        :rtype: list
+        """
+        def certs(user_type):
+            paths = [c.cert for c in cards if c.user.user_type == user_type]
+            return [cert for cert in paths if cert and cert.exists()]
+
+        failed = []
+        ipa_certs = certs(UserType.ipa)
+        if ipa_certs:
+            results = self.ipa_ca.revoke_certs(ipa_certs)
+            failed += [(cert, r) for cert, r in zip(ipa_certs, results)
+                       if isinstance(r, Exception)]
+        # The local CA is removed by cleanup, so its CRL is not regenerated
+        local_certs = certs(UserType.local)
+        if local_certs:
+            results = self.local_ca.revoke_certs(local_certs, update_crl=False)
+            failed += [(cert, r) for cert, r in zip(local_certs, results)
+                       if r is not None]
+        for cert, error in failed:
+            logger.error(f"Certificate {cert} is not revoked: {error}")
+        return [cert for cert, _ in failed]
 
     @staticmethod
     def _validate_configuration(conf: dict, params: {} = None) -> dict:
@@ -547,6 +937,7 @@ class Controller:
 
         run("systemctl daemon-reload")
         run("systemctl restart pcscd sssd")
+        wait_for_sssd_ready()
 
         logger.debug("Copr repo for virt_cacard is enabled")
 
@@ -589,7 +980,9 @@ class Controller:
         :type local: bool
         """
         if local:
-            self.local_ca = CA.LocalCA(self.lib_conf["ca"]["local_ca"]["dir"])
+            self.local_ca = CA.LocalCA(
+                self.lib_conf["ca"]["local_ca"]["dir"],
+                backend=self.lib_conf["ca"]["local_ca"]["backend"])
             if not self.local_ca.cert.exists():
                 raise exceptions.SCAutolibMissingCA(
                     f"CA certificate not found in {str(self.local_ca.cert)}")
@@ -30,6 +30,14 @@ class CAType(str, Enum):
     ipa = "IPA"
 
 
+class CABackend(str, Enum):
+    """
+    Enumeration of engines used by the local CA for issuing certificates.
+    """
+    openssl = "openssl"
+    cryptography = "cryptography"
+
+
 class ReturnCode(Enum):
     """
     Enum for return codes
@@ -5,22 +5,26 @@ import shutil
 
 import re
 
+import fcntl
 import json
 import os
-import python_freeipa
-from cryptography import x509
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from hashlib import sha256
 from pathlib import Path, PosixPath
-from python_freeipa import exceptions
-from python_freeipa.client_meta import ClientMeta
 from shutil import rmtree, copy2
 from socket import gethostname
+from tempfile import TemporaryDirectory
+from typing import Union
 
 from SCAutolib import TEMPLATES_DIR, logger, run, LIB_DIR, LIB_DUMP_CAS, \
     LIB_BACKUP
 from SCAutolib.exceptions import SCAutolibException
 from SCAutolib.models.file import OpensslCnf
-from SCAutolib.enums import CAType
+from SCAutolib.models.ipa_session import get_session, IPASession
+from SCAutolib.enums import CAType, CABackend
 
 
 class BaseCA:
@@ -39,8 +43,8 @@ class BaseCA:
         """
         Request certificate from CA for given username
 
-        :param csr: path to CSR
-        :type csr: str
+        :param csr: path to CSR or CSR in PEM format
+        :type csr: pathlib.Path or bytes
         :param username: subject for the certificate
         :type username: str
         :param cert_out: path where the certificate should be duplicated.
@@ -51,6 +55,38 @@ class BaseCA:
         """
         ...
 
+    def request_certs(self, batch: list) -> list:
+        """
+        Request certificates for several users at once. Default implementation
+        requests certificates one by one, CAs that are able to process the
+        whole batch at once override this method.
+
+        :param batch: list of (csr, username, cert_out) tuples with the same
+            meaning as parameters of request_cert method
+        :type batch: list
+        :return: list with path to the certificate or an exception raised for
+            each item of the batch in the same order as the batch
+        :rtype: list
+        """
+        results = []
+        for csr, username, cert_out in batch:
+            try:
+                results.append(self.request_cert(csr, username, cert_out))
+            except Exception as e:
+                logger.error(f"Certificate for {username} is not issued: {e}")
+                results.append(e)
+        return results
+
+    @staticmethod
+    def _read_csr(csr) -> bytes:
+        """
+        Return content of the CSR given either by path or in PEM format.
+        """
+        if isinstance(csr, bytes):
+            return csr
+        with Path(csr).open("rb") as f:
+            return f.read()
+
     def setup(self):
         """
         Configure the CA
@@ -137,7 +173,8 @@ class BaseCA:
         elif cnt["ca_type"] == CAType.custom:
             ca = CustomCA(cnt)
         elif cnt["ca_type"] == CAType.local:
-            ca = LocalCA(root_dir=cnt["root_dir"])
+            ca = LocalCA(root_dir=cnt["root_dir"],
+                         backend=cnt.get("backend", CABackend.openssl))
         else:
             raise SCAutolibException("CA object has unknown type. Only ipa, "
                                      "custom and local types are supported. CA "
@@ -155,8 +192,12 @@ class LocalCA(BaseCA):
     ca_type = CAType.local
     ca_name = "local_ca"
     dump_file = LIB_DUMP_CAS.joinpath(f"{ca_name}.json")
+    # openssl ca rewrites index.txt and serial files on every call, so
+    # operations on CA database can't be executed in parallel
+    _db_lock = threading.Lock()
 
-    def __init__(self, root_dir: Path = None, cnf: OpensslCnf = None):
+    def __init__(self, root_dir: Path = None, cnf: OpensslCnf = None,
+                 backend: CABackend = CABackend.openssl):
         """
         Class for local CA. Initialize required attributes, real setup is made
         by LocalCA.setup() method
@@ -166,9 +207,15 @@ class LocalCA(BaseCA):
         :type: Path
         :param cnf: object representing openssl cnf file
         :type cnf: OpensslCnf
+        :param backend: engine used for creating the root certificate and for
+            issuing certificates. With cryptography backend certificates are
+            signed in-process while the CA database stays compatible with
+            ``openssl ca``.
+        :type backend: SCAutolib.enums.CABackend
         """
         self.name = LocalCA.ca_name
         self.ca_type = LocalCA.ca_type
+        self.backend = CABackend(backend)
         self.root_dir: Path = Path("/etc/SCAutolib/ca") if root_dir is None \
             else Path(root_dir)
         if not self.root_dir.exists():
@@ -188,6 +235,13 @@ class LocalCA(BaseCA):
 
         self._serial: Path = self.root_dir.joinpath("serial")
         self._index: Path = self.root_dir.joinpath("index.txt")
+        self._lock_file: Path = self.root_dir.joinpath(".lock")
+        self._engine = None
+        if self.backend == CABackend.cryptography:
+            # Imported only when needed, so cryptography is not loaded on
+            # startup of the library
+            from SCAutolib.models.ca_engine import CAEngine
+            self._engine = CAEngine(self.root_dir, self._ca_cnf.path)
 
     @property
     def cnf(self):
@@ -198,6 +252,8 @@ class LocalCA(BaseCA):
         if not cnf.path.exists():
             raise SCAutolibException("CNF file does not exist")
         self._ca_cnf = cnf
+        if self._engine:
+            self._engine.cnf = cnf.path
 
     def to_dict(self):
         """
@@ -209,6 +265,7 @@ class LocalCA(BaseCA):
         """
         dict_ = {k: str(v) if type(v) is PosixPath else v
                  for k, v in super().__dict__.items()}
+        dict_.pop("_engine")
         if self._ca_cnf:
             dict_["_ca_cnf"] = str(self._ca_cnf.path)
         return dict_
@@ -257,7 +314,9 @@ class LocalCA(BaseCA):
 
         self._index.touch()
 
-        # Generate self-signed certificate
+        # Generate self-signed certificate. The engine doesn't create the
+        # root, because cryptography doesn't allow serial number 0 used by
+        # the CA and the root is created only once anyway.
         cmd = ['openssl', 'req', '-batch', '-config', self._ca_cnf.path,
                '-x509', '-new', '-nodes', '-newkey', 'rsa:2048', '-keyout',
                self._ca_key, '-sha256', '-set_serial', '0',
@@ -268,19 +327,19 @@ class LocalCA(BaseCA):
             f"CA self-signed certificate is generated into {self._ca_cert}")
 
         # Configuring CRL
-        run(['openssl', 'ca', '-config', self._ca_cnf.path, '-gencrl',
-             '-out', self._crl], check=True)
+        with self._locked():
+            self._gen_crl()
 
         logger.info("Local CA files are prepared")
 
-    def request_cert(self, csr: Path, username: str,
+    def request_cert(self, csr: Union[Path, bytes], username: str,
                      cert_out: Path = None) -> Path:
         """
         Create the certificate from CSR and sign it. Certificate is stored
         in the <root ca directory>/ca/newcerts directory with name username.pem
 
-        :param csr: path to CSR
-        :type csr: pathlib.Path
+        :param csr: path to CSR or CSR in PEM format
+        :type csr: pathlib.Path or bytes
         :param username: subject in the CSR
         :type username: str
         :param cert_out: path where the certificate should be duplicated.
@@ -292,6 +351,180 @@ class LocalCA(BaseCA):
         :return: returns path to the signed certificate
         :rtype: pathlib.Path
         """
+        cert_out = self._cert_path(username, cert_out)
+
+        if self._engine:
+            csr_obj = self._load_csr(csr)
+            with self._locked():
+                cert = self._engine.issue(csr_obj)
+            return self._write_cert(cert, cert_out)
+
+        # CSR in PEM format is passed to openssl through stdin
+        in_memory = isinstance(csr, bytes)
+        cmd = ["openssl", "ca", "-config", self._ca_cnf.path,
+               "-batch", "-keyfile", str(self._ca_key),
+               "-in", "/dev/stdin" if in_memory else str(csr),
+               "-notext", "-days", "365", "-extensions", "usr_cert",
+               "-out", str(cert_out)]
+        with self._locked():
+            run(cmd, check=True, input=csr.decode() if in_memory else None)
+        return cert_out
+
+    def request_certs(self, batch: list) -> list:
+        """
+        Create certificates from several CSRs at once. The CA database is
+        updated only once for the whole batch: either by single
+        ``openssl ca -infiles`` call or by the in-process engine. If the
+        openssl call fails, certificates are requested one by one to find out
+        which item of the batch is wrong.
+
+        :param batch: list of (csr, username, cert_out) tuples with the same
+            meaning as parameters of request_cert method
+        :type batch: list
+        :return: list with path to the signed certificate or an exception
+            raised for each item of the batch in the same order as the batch
+        :rtype: list
+        """
+        results = [None] * len(batch)
+        pending = []
+        for i, (csr, username, cert_out) in enumerate(batch):
+            try:
+                if self._engine:
+                    csr = self._load_csr(csr)
+                elif not isinstance(csr, bytes) and not csr.exists():
+                    raise FileNotFoundError(f"CSR {csr} does not exist")
+                pending.append((i, csr, self._cert_path(username, cert_out)))
+            except Exception as e:
+                results[i] = e
+
+        if self._engine:
+            with self._locked():
+                certs = self._engine.issue_many([c for _, c, _ in pending])
+            for (i, _, cert_out), cert in zip(pending, certs):
+                if not isinstance(cert, Exception):
+                    cert = self._write_cert(cert, cert_out)
+                results[i] = cert
+        elif pending:
+            with TemporaryDirectory() as tmp:
+                # openssl can read only one CSR from stdin, so CSRs in PEM
+                # format are stored to temporary files
+                for n, (i, csr, cert_out) in enumerate(pending):
+                    if isinstance(csr, bytes):
+                        pending[n] = (i, Path(tmp, f"{n}.csr"), cert_out)
+                        with pending[n][1].open("wb") as f:
+                            f.write(csr)
+                for (i, _, _), cert in zip(pending,
+                                           self._openssl_batch(pending)):
+                    results[i] = cert
+
+        for (_, username, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                logger.error(f"Certificate for {username} is not issued: "
+                             f"{result}")
+        logger.info(f"{len(batch)} certificate requests are processed")
+        return results
+
+    def _openssl_batch(self, pending: list) -> list:
+        """
+        Sign all pending CSRs by single ``openssl ca`` call. openssl stores
+        each certificate to the newcerts directory named by its serial number.
+        Issued certificates are paired with the CSRs by their public keys and
+        copied to requested locations while the CA database is still locked,
+        so certificates of concurrent requests can't be mixed up.
+        """
+        cmd = ["openssl", "ca", "-config", self._ca_cnf.path,
+               "-batch", "-keyfile", str(self._ca_key),
+               "-notext", "-days", "365", "-extensions", "usr_cert",
+               "-out", os.devnull,
+               "-infiles", *[str(csr) for _, csr, _ in pending]]
+        with self._locked():
+            first = self._read_serial()
+            try:
+                run(cmd, check=True)
+            except subprocess.CalledProcessError:
+                results = None
+            else:
+                results = self._collect_batch(pending, first)
+        if results is not None:
+            return results
+
+        logger.warning("Batch request failed, requesting certificates one by "
+                       "one")
+        results = []
+        for _, csr, cert_out in pending:
+            try:
+                results.append(self.request_cert(csr, None, cert_out))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _collect_batch(self, pending: list, first: int) -> list:
+        """
+        Copy certificates issued since the serial number ``first`` to the
+        locations requested for the CSRs with the same public key. Caller has
+        to hold the lock of the CA database.
+        """
+        from cryptography import x509
+        from cryptography.hazmat.primitives import serialization
+        from SCAutolib.models.ca_engine import CAEngine
+
+        def key_id(obj) -> bytes:
+            return obj.public_key().public_bytes(
+                serialization.Encoding.DER,
+                serialization.PublicFormat.SubjectPublicKeyInfo)
+
+        issued = {}
+        for serial in range(first, self._read_serial()):
+            path = self._newcerts.joinpath(f"{CAEngine.hex_serial(serial)}.pem")
+            with path.open("rb") as f:
+                cert = x509.load_pem_x509_certificate(f.read())
+            issued.setdefault(key_id(cert), []).append(path)
+
+        results = []
+        for _, csr, cert_out in pending:
+            paths = issued.get(key_id(self._load_csr(csr)))
+            if not paths:
+                results.append(SCAutolibException(
+                    f"Certificate for CSR {csr} was not issued"))
+                continue
+            copy2(paths.pop(0), cert_out)
+            results.append(cert_out)
+        return results
+
+    def _load_csr(self, csr):
+        """
+        :param csr: path to CSR or CSR in PEM format
+        :type csr: pathlib.Path or bytes
+        :return: CSR object of the cryptography package
+        :rtype: cryptography.x509.CertificateSigningRequest
+        """
+        from cryptography import x509
+
+        return x509.load_pem_x509_csr(self._read_csr(csr))
+
+    @staticmethod
+    def _write_cert(cert, cert_out: Path) -> Path:
+        """
+        Store certificate object of the cryptography package in PEM format.
+
+        :return: path to the stored certificate
+        :rtype: pathlib.Path
+        """
+        from cryptography.hazmat.primitives import serialization
+
+        with cert_out.open("wb") as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+        return cert_out
+
+    def _read_serial(self) -> int:
+        with self._serial.open() as f:
+            return int(f.read().strip(), 16)
+
+    def _cert_path(self, username: str, cert_out: Path = None) -> Path:
+        """
+        Resolve path of the certificate for given user as described in
+        request_cert method.
+        """
         if cert_out is not None:
             if cert_out.is_dir():
                 cert_out = cert_out.joinpath(f"{username}.pem")
@@ -299,26 +532,125 @@ class LocalCA(BaseCA):
                 cert_out = cert_out.with_suffix(".pem")
         else:
             cert_out = self._certs.joinpath(f"{username}.pem")
-        cmd = ["openssl", "ca", "-config", self._ca_cnf.path,
-               "-batch", "-keyfile", str(self._ca_key), "-in", str(csr),
-               "-notext", "-days", "365", "-extensions", "usr_cert",
-               "-out", str(cert_out)]
-        run(cmd, check=True)
         return cert_out
 
-    def revoke_cert(self, cert: Path):
+    def revoke_cert(self, cert: Path, update_crl: bool = True):
         """
         Revoke given certificate
 
         :param cert: path to the certificate
         :type cert: pathlib.Path
+        :param update_crl: if False, revocation is only recorded to the CA
+            database and the CRL is regenerated later by update_crl method
+        :type update_crl: bool
         """
-        cmd = ['openssl', 'ca', '-config', self._ca_cnf.path, '-revoke', cert]
-        run(cmd, check=True)
-        cmd = ['openssl', 'ca', '-config', self._ca_cnf.path, '-gencrl',
-               '-out', self._crl]
-        run(cmd, check=True)
-        logger.info("Certificate is revoked")
+        result = self.revoke_certs([cert], update_crl)[0]
+        if isinstance(result, Exception):
+            raise result
+
+    def revoke_certs(self, certs: list, update_crl: bool = True) -> list:
+        """
+        Revoke given certificates. Revocations are recorded to the CA database
+        immediately, while the CRL is regenerated only once for all of them.
+
+        :param certs: paths to the certificates
+        :type certs: list
+        :param update_crl: if False, the CRL is not regenerated, so several
+            batches of revocations can be followed by single update_crl call
+        :type update_crl: bool
+        :return: list with None for each revoked certificate or an exception
+            in the same order as certificates are given
+        :rtype: list
+        """
+        with self._locked():
+            if self._engine:
+                results = self._engine_revoke(certs)
+            else:
+                results = []
+                for cert in certs:
+                    cmd = ['openssl', 'ca', '-config', self._ca_cnf.path,
+                           '-revoke', cert]
+                    try:
+                        run(cmd, check=True)
+                        results.append(None)
+                    except Exception as e:
+                        results.append(e)
+            if update_crl:
+                self._gen_crl()
+        revoked = sum(r is None for r in results)
+        logger.info(f"{revoked} of {len(certs)} certificates are revoked")
+        return results
+
+    def _engine_revoke(self, certs: list) -> list:
+        from cryptography import x509
+
+        results = [None] * len(certs)
+        loaded = []
+        for i, cert in enumerate(certs):
+            try:
+                with Path(cert).open("rb") as f:
+                    loaded.append(
+                        (i, x509.load_pem_x509_certificate(f.read())))
+            except Exception as e:
+                results[i] = e
+        revoked = self._engine.revoke_many([c for _, c in loaded])
+        for (i, _), result in zip(loaded, revoked):
+            results[i] = result
+        return results
+
+    @property
+    def crl_outdated(self) -> bool:
+        """
+        Revocations are not tracked separately, so any change of the CA
+        database after the CRL was generated makes the CRL outdated, including
+        issuing of new certificates. In such case the regenerated CRL has the
+        same content as the old one, only with new validity dates.
+
+        :return: True if the CA database was changed after the CRL was
+            generated
+        :rtype: bool
+        """
+        if not self._crl.exists():
+            return True
+        return self._index.stat().st_mtime_ns > self._crl.stat().st_mtime_ns
+
+    def update_crl(self, force: bool = False):
+        """
+        Regenerate the CRL, if the CA database was changed since the last
+        generation (e.g. by revocations with update_crl=False). See
+        crl_outdated for changes that are taken into account.
+
+        :param force: regenerate the CRL even if it is up-to-date
+        :type force: bool
+        """
+        with self._locked():
+            if force or self.crl_outdated:
+                self._gen_crl()
+
+    def _gen_crl(self):
+        """
+        Generate the CRL. Caller has to hold the lock of the CA database.
+        """
+        if self._engine:
+            self._engine.gen_crl(self._crl)
+        else:
+            run(['openssl', 'ca', '-config', self._ca_cnf.path, '-gencrl',
+                 '-out', self._crl], check=True)
+        logger.debug(f"CRL {self._crl} is generated")
+
+    @contextmanager
+    def _locked(self):
+        """
+        Serialize access to the CA database between threads of this process
+        and other processes working with the same CA.
+        """
+        with self._db_lock:
+            with self._lock_file.open("a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
 
     def cleanup(self):
         """
@@ -408,16 +740,20 @@ class IPAServerCA(BaseCA):
     _ipa_client_hostname: str = None
     _ipa_server_root_passwd: str = None
     _ipa_client_script = Path(LIB_DIR, "ipa-client-sc.sh")
-    meta_client: ClientMeta = None
+    meta_client: IPASession = None
     dump_file = LIB_DUMP_CAS.joinpath("ipa-server.json")
+    # Maximal number of commands sent to IPA server in one batch request
+    batch_size = 100
+    # Maximal number of batch requests sent to IPA server at the same time
+    max_requests = 4
 
     def __init__(self, ip_addr: str, server_hostname: str, domain: str,
                  admin_passwd: str, root_passwd: str, client_hostname: str,
                  realm: str = None):
         """
-        Initialize object for IPA client for given IPA server. Also, creates
-        meta client (python_freeipa.client_meta.ClientMeta) logged in to the
-        server and ready-to-use.
+        Initialize object for IPA client for given IPA server. Meta client
+        is a session shared by all objects for the same IPA server, so login
+        is done only once per process, on the first use of the session.
 
         :param ip_addr: IP address of the IPA server
         :type ip_addr: str
@@ -449,7 +785,8 @@ class IPAServerCA(BaseCA):
         self._ipa_client_hostname = client_hostname
         self._ipa_server_root_passwd = root_passwd
 
-        self._meta_client_login()
+        self.meta_client = get_session(self._ipa_server_hostname, "admin",
+                                       self._ipa_server_admin_passwd)
 
     @property
     def is_installed(self):
@@ -542,12 +879,12 @@ class IPAServerCA(BaseCA):
 
     def _meta_client_login(self):
         """
-        Login to admin user via IPA meta client.
+        Login (again) to admin user via IPA meta client.
         """
+        import python_freeipa
+
         try:
-            self.meta_client: ClientMeta = ClientMeta(self._ipa_server_hostname,
-                                                      verify_ssl=False)
-            self.meta_client.login("admin", self._ipa_server_admin_passwd)
+            self.meta_client.login()
             logger.info("Connected to IPA via meta client")
         except python_freeipa.exceptions.BadRequest:
             logger.warning("Can't login to the IPA server. "
@@ -644,19 +981,20 @@ class IPAServerCA(BaseCA):
         logger.debug("File for setting up IPA client for smart cards is "
                      f"copied to {self._ipa_client_script}")
 
-    def request_cert(self, csr: Path, username: str, cert_out: Path):
+    def request_cert(self, csr: Union[Path, bytes], username: str,
+                     cert_out: Path):
         """
         Request certificate using CSR from IPA CA for given username. It is
         a wrapper around the python_freeipa.client_meta.ClientMeta.cert_request
-        method. It works with a file, extracts CSR data from it and then
-        stores in PEM format adding required prefix and suffix as in normal
-        certificate and. If cert_out is a directory, then certificate would be
-        stored in this directory with name <username>.pem. If it is a file,
-        then check if it has PEM extension. If not, append .pem suffix to the
-        name.
-
-        :param csr: path to CSR
-        :type csr: patlib.Path
+        method. It takes CSR from a file or directly in PEM format and then
+        stores the certificate in PEM format adding required prefix and suffix
+        as in normal certificate and. If cert_out is a directory, then
+        certificate would be stored in this directory with name
+        <username>.pem. If it is a file, then check if it has PEM extension.
+        If not, append .pem suffix to the name.
+
+        :param csr: path to CSR or CSR in PEM format
+        :type csr: patlib.Path or bytes
         :param username: subject for the certificate
         :type username: str
         :param cert_out: path where the certificate is stored. Can be a
@@ -666,13 +1004,99 @@ class IPAServerCA(BaseCA):
         :return: Path to the PEM certificate.
         :rtype: patlib.Path
         """
-        with csr.open() as f:
-            csr_content = f.read()
+        csr_content = self._read_csr(csr).decode()
         r = self.meta_client.cert_request(a_csr=csr_content,
                                           o_principal=username)
         logger.debug(r)
         cert = r["result"]["certificate"]
 
+        return self._store_cert(cert, username, cert_out)
+
+    def request_certs(self, batch: list) -> list:
+        """
+        Request certificates for several users from IPA CA. All cert_request
+        calls are sent to the server by IPA batch command, so only one HTTP
+        request is made per chunk of the batch instead of one request per
+        user.
+
+        :param batch: list of (csr, username, cert_out) tuples with the same
+            meaning as parameters of request_cert method
+        :type batch: list
+        :return: list with path to the PEM certificate or an exception raised
+            for each item of the batch in the same order as the batch
+        :rtype: list
+        """
+        methods = []
+        for csr, username, _ in batch:
+            methods.append({"method": "cert_request",
+                            "params": [[self._read_csr(csr).decode()],
+                                       {"principal": username}]})
+
+        results = []
+        for (_, username, cert_out), r in zip(batch, self.batch(methods)):
+            if not isinstance(r, Exception):
+                r = self._store_cert(r["result"]["certificate"], username,
+                                     cert_out)
+            else:
+                logger.error(f"Certificate for {username} is not issued: {r}")
+            results.append(r)
+        return results
+
+    def batch(self, methods: list, group: int = 1) -> list:
+        """
+        Execute given IPA commands by IPA batch command. Commands are sent in
+        chunks of batch_size commands, so many commands cost only a few round
+        trips to the server. Up to max_requests chunks are sent at the same
+        time through the shared session, so latency of the server is paid
+        only once for all of them.
+
+        :param methods: list of commands in format
+            {"method": <name>, "params": [<args>, <options>]}
+        :type methods: list
+        :param group: number of consecutive commands that depend on each
+            other. Groups are never split between chunks, so commands of one
+            group are executed in order by the same batch request.
+        :type group: int
+        :return: list with result of each command or python_freeipa exception
+            for failed commands
+        :rtype: list
+        """
+        from python_freeipa import exceptions
+
+        if len(methods) % group:
+            raise ValueError(f"Number of commands {len(methods)} is not "
+                             f"a multiple of the group size {group}")
+        size = max(self.batch_size // group, 1) * group
+        chunks = [methods[i:i + size] for i in range(0, len(methods), size)]
+        if len(chunks) > 1:
+            workers = min(self.max_requests, len(chunks))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                replies = list(executor.map(self._send_batch, chunks))
+        else:
+            replies = [self._send_batch(chunk) for chunk in chunks]
+
+        results = []
+        for r in replies:
+            for item in r["results"]:
+                if item.get("error"):
+                    exc = exceptions.error_codes.get(item.get("error_code"),
+                                                     exceptions.BadRequest)
+                    item = exc(item["error"], item.get("error_code"))
+                results.append(item)
+        return results
+
+    def _send_batch(self, chunk: list) -> dict:
+        r = self.meta_client.batch(a_methods=chunk)
+        logger.debug(f"IPA batch of {len(chunk)} commands is executed")
+        return r
+
+    @staticmethod
+    def _store_cert(cert: str, username: str, cert_out: Path) -> Path:
+        """
+        Store base64 encoded certificate from IPA server in PEM format. If
+        cert_out is a directory, certificate is stored as <username>.pem in
+        this directory, otherwise .pem suffix is set to the filename.
+        """
         if cert_out.is_dir():
             cert_out = cert_out.joinpath(f"{username}.pem")
         else:
@@ -720,6 +1144,8 @@ class IPAServerCA(BaseCA):
         :param cert_path: Path to the certificate in PEM format
 
         """
+        from cryptography import x509
+
         with cert_path.open("rb") as f:
             cert = x509.load_pem_x509_certificate(f.read())
         r = self.meta_client.cert_revoke(cert.serial_number)
@@ -727,6 +1153,37 @@ class IPAServerCA(BaseCA):
         logger.info(f"Certificate {cert.serial_number} is revoked")
         return cert.serial_number
 
+    def revoke_certs(self, cert_paths: list) -> list:
+        """
+        Revoke given certificates on the IPA server by IPA batch command.
+
+        :param cert_paths: Paths to the certificates in PEM format
+        :type cert_paths: list
+        :return: list with serial number of each revoked certificate or an
+            exception for certificates that are not revoked, in the same order
+            as cert_paths
+        :rtype: list
+        """
+        from cryptography import x509
+
+        serials = []
+        for cert_path in cert_paths:
+            with cert_path.open("rb") as f:
+                serials.append(
+                    x509.load_pem_x509_certificate(f.read()).serial_number)
+        methods = [{"method": "cert_revoke", "params": [[serial], {}]}
+                   for serial in serials]
+
+        results = []
+        for serial, r in zip(serials, self.batch(methods)):
+            if isinstance(r, Exception):
+                logger.error(f"Certificate {serial} is not revoked: {r}")
+            else:
+                logger.info(f"Certificate {serial} is revoked")
+                r = serial
+            results.append(r)
+        return results
+
     def cleanup(self):
         """
         Remove IPA client from the system and from the IPA server
@@ -734,6 +1191,8 @@ class IPAServerCA(BaseCA):
         :raise subprocess.CalledProcessError: by run function
         """
 
+        from python_freeipa import exceptions
+
         logger.warning("Removing IPA client from the host "
                        f"{gethostname()}")
         try:
@@ -0,0 +1,359 @@
+"""
+This module implements in-process engine for issuing certificates by the local
+CA. The engine is built on the cryptography package, so no ``openssl``
+process is forked for signing the certificates. Files of the CA (index.txt,
+serial, newcerts directory) are kept in the same format as ``openssl ca``
+creates them, so the CA can still be managed by the openssl tool.
+Certificates can also be revoked and the CRL generated in-process.
+"""
+import os
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.x509.oid import NameOID
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from SCAutolib import logger
+from SCAutolib.exceptions import SCAutolibException
+from SCAutolib.models import openssl_conf
+
+
+class CAEngine:
+    """
+    Signs certificates by the root key of the local CA. The root key and the
+    root certificate are loaded only once, on the first use. The root
+    certificate itself is created by ``openssl req`` (see LocalCA.setup).
+    """
+    days = 365
+    # default_crl_hours in ca.cnf template
+    crl_hours = 1
+    # Format of dates in index.txt
+    date_format = "%y%m%d%H%M%SZ"
+
+    def __init__(self, root_dir: Path, cnf: Path):
+        """
+        Initialize paths to the files of the CA. The files are expected in the
+        same locations as defined in ca.cnf template.
+
+        :param root_dir: Path to root directory of the CA
+        :type root_dir: pathlib.Path
+        :param cnf: Path to the CA configuration file. Policy of the CA is
+            read from this file.
+        :type cnf: pathlib.Path
+        """
+        self.root_dir = Path(root_dir)
+        self.cnf = Path(cnf)
+        self._ca_cert = self.root_dir.joinpath("rootCA.pem")
+        self._ca_key = self.root_dir.joinpath("rootCA.key")
+        self._newcerts = self.root_dir.joinpath("newcerts")
+        self._serial = self.root_dir.joinpath("serial")
+        self._index = self.root_dir.joinpath("index.txt")
+        self._index_attr = self.root_dir.joinpath("index.txt.attr")
+        self._key = None
+        self._cert = None
+
+    @property
+    def key(self):
+        if self._key is None:
+            with self._ca_key.open("rb") as f:
+                self._key = serialization.load_pem_private_key(f.read(), None)
+            logger.debug(f"CA private key is loaded from {self._ca_key}")
+        return self._key
+
+    @property
+    def cert(self):
+        if self._cert is None:
+            with self._ca_cert.open("rb") as f:
+                self._cert = x509.load_pem_x509_certificate(f.read())
+            logger.debug(f"CA certificate is loaded from {self._ca_cert}")
+        return self._cert
+
+    def issue(self, csr: x509.CertificateSigningRequest) -> x509.Certificate:
+        """
+        Issue the certificate for given CSR with the same content as
+        ``openssl ca`` with ca.cnf template would do. Extensions from the CSR
+        are copied to the certificate and the certificate is recorded to the
+        CA database.
+
+        .. note: Caller is responsible for serialization of access to the CA
+            database.
+
+        :param csr: certificate signing request
+        :type csr: cryptography.x509.CertificateSigningRequest
+        :return: signed certificate
+        :rtype: cryptography.x509.Certificate
+        """
+        result = self.issue_many([csr])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def issue_many(self, csrs: list) -> list:
+        """
+        Issue certificates for all given CSRs. The CA database (index.txt and
+        serial files) is read and updated only once for all certificates.
+
+        .. note: Caller is responsible for serialization of access to the CA
+            database.
+
+        :param csrs: certificate signing requests
+        :type csrs: list
+        :return: list with signed certificate or an exception for each CSR in
+            the same order as CSRs are given
+        :rtype: list
+        """
+        policy, email_in_dn = self._read_policy()
+        subjects = self._valid_subjects() if self._unique_subject else None
+        serial = self._read_serial()
+        not_before = datetime.now(timezone.utc)
+        not_after = not_before + timedelta(days=self.days)
+        expires = not_after.strftime(self.date_format)
+
+        results = []
+        entries = []
+        for csr in csrs:
+            if not csr.is_signature_valid:
+                results.append(SCAutolibException(
+                    f"Signature of the CSR for {self._oneline(csr.subject)} "
+                    f"is not valid"))
+                continue
+            try:
+                name = self._apply_policy(csr.subject, policy, email_in_dn)
+            except SCAutolibException as e:
+                results.append(e)
+                continue
+            subject = self._oneline(name)
+            if subjects is not None and subject in subjects:
+                results.append(SCAutolibException(
+                    f"Valid certificate for {subject} already exists in the "
+                    f"CA database"))
+                continue
+
+            cert = self._sign(csr, name, serial, not_before, not_after)
+            serial_hex = self.hex_serial(serial)
+            with self._newcerts.joinpath(f"{serial_hex}.pem").open("wb") as f:
+                f.write(cert.public_bytes(serialization.Encoding.PEM))
+            entries.append(f"V\t{expires}\t\t{serial_hex}\tunknown\t"
+                           f"{subject}\n")
+            logger.debug(f"Certificate with serial {serial_hex} is issued for "
+                         f"{subject}")
+            if subjects is not None:
+                subjects.add(subject)
+            results.append(cert)
+            serial += 1
+
+        if entries:
+            with self._index.open("a") as f:
+                f.writelines(entries)
+            self._write_serial(serial)
+        return results
+
+    def revoke_many(self, certs: list) -> list:
+        """
+        Mark given certificates as revoked in the CA database the same way as
+        ``openssl ca -revoke`` does. The database is rewritten only once for
+        all certificates. The CRL is not updated, see gen_crl.
+
+        .. note: Caller is responsible for serialization of access to the CA
+            database.
+
+        :param certs: certificates to be revoked
+        :type certs: list
+        :return: list with None for each revoked certificate or an exception
+            in the same order as certificates are given
+        :rtype: list
+        """
+        revoked_at = datetime.now(timezone.utc).strftime(self.date_format)
+        entries = self._read_index()
+        rows = {fields[3]: fields for fields in entries if len(fields) == 6}
+
+        results = []
+        for cert in certs:
+            serial_hex = self.hex_serial(cert.serial_number)
+            fields = rows.get(serial_hex)
+            if fields is None:
+                results.append(SCAutolibException(
+                    f"Certificate {serial_hex} is not in the CA database"))
+            elif fields[0] != "V":
+                results.append(SCAutolibException(
+                    f"Certificate {serial_hex} is already revoked"))
+            else:
+                fields[0] = "R"
+                fields[2] = revoked_at
+                logger.debug(f"Certificate {serial_hex} is revoked")
+                results.append(None)
+
+        if any(r is None for r in results):
+            tmp = self._index.with_name(f".{self._index.name}.tmp")
+            with tmp.open("w") as f:
+                f.writelines("\t".join(fields) + "\n" for fields in entries)
+            os.replace(tmp, self._index)
+        return results
+
+    def gen_crl(self, crl_out: Path):
+        """
+        Generate CRL with all revoked certificates from the CA database, as
+        ``openssl ca -gencrl`` does.
+
+        :param crl_out: path where the CRL in PEM format is stored
+        :type crl_out: pathlib.Path
+        """
+        now = datetime.now(timezone.utc)
+        builder = x509.CertificateRevocationListBuilder() \
+            .issuer_name(self.cert.subject) \
+            .last_update(now) \
+            .next_update(now + timedelta(hours=self.crl_hours))
+        for fields in self._read_index():
+            if len(fields) != 6 or fields[0] != "R":
+                continue
+            # Revocation date can be followed by the reason
+            revoked_at = datetime.strptime(fields[2].split(",")[0],
+                                           self.date_format)
+            builder = builder.add_revoked_certificate(
+                x509.RevokedCertificateBuilder()
+                .serial_number(int(fields[3], 16))
+                .revocation_date(revoked_at.replace(tzinfo=timezone.utc))
+                .build())
+        crl = builder.sign(self.key, hashes.SHA256())
+        with Path(crl_out).open("wb") as f:
+            f.write(crl.public_bytes(serialization.Encoding.PEM))
+        logger.debug(f"CRL is stored to {crl_out}")
+
+    def _sign(self, csr: x509.CertificateSigningRequest, subject: x509.Name,
+              serial: int, not_before: datetime,
+              not_after: datetime) -> x509.Certificate:
+        builder = x509.CertificateBuilder() \
+            .subject_name(subject) \
+            .issuer_name(self.cert.subject) \
+            .public_key(csr.public_key()) \
+            .serial_number(serial) \
+            .not_valid_before(not_before) \
+            .not_valid_after(not_after)
+        # [ usr_cert ] extension from the ca.cnf template
+        try:
+            ski = self.cert.extensions.get_extension_for_class(
+                x509.SubjectKeyIdentifier).value
+            aki = x509.AuthorityKeyIdentifier \
+                .from_issuer_subject_key_identifier(ski)
+        except x509.ExtensionNotFound:
+            aki = x509.AuthorityKeyIdentifier.from_issuer_public_key(
+                self.key.public_key())
+        builder = builder.add_extension(aki, critical=False)
+        # copy_extensions = copy does not overwrite extensions set by the CA
+        for ext in csr.extensions:
+            if ext.oid != aki.oid:
+                builder = builder.add_extension(ext.value, ext.critical)
+        return builder.sign(self.key, hashes.SHA256())
+
+    def _apply_policy(self, subject: x509.Name, policy: list,
+                      email_in_dn: bool) -> x509.Name:
+        """
+        Build subject of the certificate from the subject of the CSR the same
+        way as ``openssl ca`` does: only fields listed in the policy are kept,
+        in the order of the policy.
+        """
+        attrs = []
+        for field, rule in policy:
+            oid = openssl_conf.attribute_oid(field)
+            if oid is None:
+                raise SCAutolibException(f"Unknown field {field} in the CA "
+                                         f"policy")
+            found = subject.get_attributes_for_oid(oid)
+            if rule == "optional":
+                pass
+            elif rule == "supplied":
+                if not found:
+                    raise SCAutolibException(
+                        f"The {field} field needed to be supplied and was "
+                        f"missing")
+            elif rule == "match":
+                values = [attr.value for attr in
+                          self.cert.subject.get_attributes_for_oid(oid)]
+                if not found:
+                    raise SCAutolibException(
+                        f"The mandatory {field} field was missing")
+                if any(attr.value not in values for attr in found):
+                    raise SCAutolibException(
+                        f"The {field} field is different between CA "
+                        f"certificate and the request")
+            else:
+                raise SCAutolibException(f"Unknown policy rule {rule} for "
+                                         f"{field} field")
+            attrs.extend(found)
+        if not email_in_dn:
+            attrs = [attr for attr in attrs
+                     if attr.oid != NameOID.EMAIL_ADDRESS]
+        return x509.Name(attrs)
+
+    def _read_policy(self):
+        """
+        Read the policy and email_in_dn option of the default CA from the CA
+        configuration file.
+
+        :return: list of (field, rule) tuples and email_in_dn flag
+        """
+        sections = openssl_conf.parse(self.cnf.read_text())
+        ca = sections.get(sections.get("ca", {}).get("default_ca"), {})
+        policy = sections.get(ca.get("policy"))
+        if policy is None:
+            raise SCAutolibException(f"Policy of the CA is not defined in "
+                                     f"{self.cnf}")
+        # Same as openssl, only "no" turns the option off
+        return list(policy.items()), ca.get("email_in_dn") != "no"
+
+    @property
+    def _unique_subject(self):
+        if self._index_attr.exists():
+            with self._index_attr.open() as f:
+                for line in f:
+                    key, _, value = line.partition("=")
+                    if key.strip() == "unique_subject":
+                        return value.strip().lower() in ("yes", "y", "true")
+        return True
+
+    def _valid_subjects(self):
+        return {fields[5] for fields in self._read_index()
+                if len(fields) == 6 and fields[0] == "V"}
+
+    def _read_index(self) -> list:
+        """
+        Read the CA database as list of entries split to fields.
+        """
+        if not self._index.exists():
+            return []
+        with self._index.open() as f:
+            return [line.rstrip("\n").split("\t") for line in f]
+
+    def _read_serial(self) -> int:
+        with self._serial.open() as f:
+            return int(f.read().strip(), 16)
+
+    def _write_serial(self, serial: int):
+        with self._serial.open("w") as f:
+            f.write(f"{self.hex_serial(serial)}\n")
+
+    @staticmethod
+    def hex_serial(serial: int) -> str:
+        """
+        Format serial number as openssl does: uppercase hexadecimal number with
+        even number of digits.
+        """
+        value = f"{serial:X}"
+        return value if len(value) % 2 == 0 else f"0{value}"
+
+    @staticmethod
+    def _oneline(name: x509.Name) -> str:
+        """
+        Format name as openssl does in index.txt file (e.g. /O=Example/CN=user).
+        Characters out of printable ASCII are escaped as bytes (e.g. \\xC3).
+        """
+        parts = []
+        for attr in name:
+            key = openssl_conf.SHORT_NAMES.get(attr.oid,
+                                               attr.oid.dotted_string)
+            value = "".join(
+                char if " " <= char <= "~"
+                else "".join(f"\\x{b:02X}" for b in char.encode())
+                for char in attr.value)
+            parts.append(f"/{key}={value}")
+        return "".join(parts)
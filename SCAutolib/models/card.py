@@ -5,14 +5,21 @@ that we are using in the library. Those types are: virtual smart card, real
 """
 import json
 import re
-import time
+import threading
 import shutil
 from pathlib import Path
 from traceback import format_exc
+from typing import Union
 
-from SCAutolib import run, logger, TEMPLATES_DIR, LIB_DUMP_CARDS
+from SCAutolib import run, logger, wait_until, TEMPLATES_DIR, LIB_DUMP_CARDS
 from SCAutolib.exceptions import SCAutolibException
 from SCAutolib.enums import CardType, UserType
+from SCAutolib.models.file import OpensslCnf
+
+# systemd daemon reload and card URI detection operate on a state shared by all
+# virtual cards in the system, so they have to be serialized when cards are
+# created in parallel
+_shared_lock = threading.Lock()
 
 
 class Card:
@@ -98,6 +105,8 @@ class VirtualCard(Card):
     _pattern = r"(pkcs11:model=PKCS%2315%20emulated;" \
                r"manufacturer=Common%20Access%20Card;serial=.*)"
     _inserted: bool = False
+    # Maximum time in seconds to wait for the card to appear or disappear
+    timeout: float = 10
 
     name: str = None
     pin: str = None
@@ -223,26 +232,70 @@ class VirtualCard(Card):
 
     def insert(self):
         """
-        Insert virtual smart card by starting the corresponding service.
+        Insert virtual smart card by starting the corresponding service. Method
+        returns when the token of the card is visible through p11-kit.
+
+        :raise: SCAutolibException if the card doesn't appear within
+            ``timeout`` seconds
         """
         cmd = ["systemctl", "start", self._service_name]
         out = run(cmd, check=True)
-        time.sleep(2)  # to prevent error with fast restarting of the service
+        if not wait_until(lambda: self._is_active() and self._token_present(),
+                          timeout=self.timeout):
+            raise SCAutolibException(
+                f"Smart card {self._service_name} is not detected after "
+                f"{self.timeout} seconds")
         logger.info(f"Smart card {self._service_name} is inserted")
         self._inserted = True
         return out
 
     def remove(self):
         """
-        Remove the virtual card by stopping the service
+        Remove the virtual card by stopping the service. Method returns when
+        the service is stopped and the token of the card (if its URI is known)
+        is not visible through p11-kit anymore, so the card can be inserted
+        again right away.
+
+        :raise: SCAutolibException if the card doesn't disappear within
+            ``timeout`` seconds
         """
         cmd = ["systemctl", "stop", self._service_name]
         out = run(cmd, check=True)
-        time.sleep(2)  # to prevent error with fast restarting of the service
+        if not wait_until(self._is_removed, timeout=self.timeout):
+            raise SCAutolibException(
+                f"Smart card {self._service_name} is still present after "
+                f"{self.timeout} seconds")
         logger.info(f"Smart card {self._service_name} is removed")
         self._inserted = False
         return out
 
+    def _unit_state(self, prop: str) -> str:
+        """
+        Get value of given property of the systemd service of the card.
+        """
+        cmd = ["systemctl", "show", "--property", prop, "--value",
+               self._service_name]
+        return run(cmd, check=False, print_=False).stdout.strip()
+
+    def _is_active(self) -> bool:
+        return self._unit_state("ActiveState") == "active"
+
+    def _is_removed(self) -> bool:
+        if self._is_active():
+            return False
+        return self.uri is None or not self._token_present()
+
+    def _token_present(self) -> bool:
+        """
+        Check if the token of the card is listed by ``p11tool``. If the URI of
+        the card is not known yet, any virtual card token is matched.
+        """
+        out = run(["p11tool", "--list-token-urls"], check=False,
+                  print_=False).stdout
+        if self.uri is not None:
+            return self.uri in out.splitlines()
+        return re.search(self._pattern, out) is not None
+
     def enroll(self):
         """
         Upload certificate and private key to the virtual smart card (upload to
@@ -266,7 +319,7 @@ class VirtualCard(Card):
         # To get URI of the card, the card has to be inserted
         # Virtual smart card can't be started without a cert and a key uploaded
         # to it, so URI can be set only after uploading the cert and a key
-        with self:
+        with _shared_lock, self:
             self.insert()
             self._set_uri()
 
@@ -312,7 +365,8 @@ class VirtualCard(Card):
                                           card_dir=self.card_dir))
 
         logger.debug(f"Service is created in {self._service_location}")
-        run("systemctl daemon-reload")
+        with _shared_lock:
+            run("systemctl daemon-reload")
 
         return self
 
@@ -326,34 +380,92 @@ class VirtualCard(Card):
         logger.info(f"Virtual card dir of {self.name} removed")
 
         self._service_location.unlink()
-        run("systemctl daemon-reload", sleep=3)
+        with _shared_lock:
+            run("systemctl daemon-reload")
+        if not wait_until(
+                lambda: self._unit_state("LoadState") == "not-found",
+                timeout=self.timeout):
+            logger.warning(f"Service {self._service_name} is still loaded "
+                           f"by systemd")
         logger.debug(f"Service {self._service_name} was removed")
 
         if self.dump_file.exists():
             self.dump_file.unlink()
             logger.debug(f"Removed {self.dump_file} dump file")
 
-    def gen_csr(self):
-        """
-        Method for generating user specific CSR file that would be sent to the
-        CA for generating the certificate. CSR is generated using 'openssl`
-        command based on template CNF file.
-        """
-        csr_path = self.card_dir.joinpath(f"csr-{self.cardholder}.csr")
+    def gen_csr(self, write: bool = True) -> Union[Path, bytes]:
+        """
+        Method for generating user specific CSR that would be sent to the CA
+        for generating the certificate. For local users, subject and
+        extensions of the CSR are given by the CNF file of the card (see
+        Controller.prepare_user_cnf) or by user.cnf template rendered in
+        memory if the file is not written. The CSR is built in memory, only if
+        the CNF file uses syntax not supported by
+        SCAutolib.models.openssl_conf, ``openssl req`` is used. CSR for IPA
+        users contains only CN=<cardholder> subject.
+
+        :param write: if True, CSR is stored to the card directory, otherwise
+            only CSR in PEM format is returned
+        :type write: bool
+        :return: path to CSR file or CSR in PEM format if write is False
+        :rtype: pathlib.Path or bytes
+        """
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.x509.oid import NameOID
+        from SCAutolib.models import openssl_conf
+
+        if not self.key or not self.key.exists():
+            raise SCAutolibException("Can't generate CSR because private "
+                                     "key is not set")
+        with self.key.open("rb") as f:
+            key = serialization.load_pem_private_key(f.read(), None)
+
+        builder = x509.CertificateSigningRequestBuilder()
+        csr = None
         if self.user.user_type == UserType.local:
-            cmd = ["openssl", "req", "-new", "-nodes", "-key", self.key,
-                   "-reqexts", "req_exts", "-config", self.cnf,
-                   "-out", csr_path]
+            cnf = self._user_cnf()
+            sections = openssl_conf.parse(cnf)
+            try:
+                builder = builder.subject_name(openssl_conf.build_name(
+                    sections["req_distinguished_name"]))
+                for ext, critical in openssl_conf.build_extensions(
+                        sections["req_exts"], key.public_key()):
+                    builder = builder.add_extension(ext, critical)
+            except NotImplementedError as e:
+                logger.debug(f"CSR can't be built in memory: {e}. Using "
+                             f"openssl req")
+                csr = run(["openssl", "req", "-new", "-key", self.key,
+                           "-reqexts", "req_exts", "-config", "/dev/stdin"],
+                          input=cnf, print_=False).stdout.encode()
         else:
-            if not self.key:
-                raise SCAutolibException("Can't generate CSR because private "
-                                         "key is not set")
-            cmd = ["openssl", "req", "-new", "-days", "365",
-                   "-nodes", "-key", self.key, "-out",
-                   csr_path, "-subj", f"/CN={self.cardholder}"]
-        run(cmd)
+            builder = builder.subject_name(x509.Name([
+                x509.NameAttribute(NameOID.COMMON_NAME, self.cardholder)]))
+        if csr is None:
+            csr = builder.sign(key, hashes.SHA256()).public_bytes(
+                serialization.Encoding.PEM)
+        logger.debug(f"CSR for card {self.name} is generated")
+        if not write:
+            return csr
+
+        csr_path = self.card_dir.joinpath(f"csr-{self.cardholder}.csr")
+        with csr_path.open("wb") as f:
+            f.write(csr)
         return csr_path
 
+    def _user_cnf(self) -> str:
+        """
+        Content of the CNF file of the card. If the file is not written,
+        user.cnf template is rendered in memory.
+        """
+        if self.cnf and Path(self.cnf).exists():
+            with Path(self.cnf).open() as f:
+                return f.read()
+        cnf = OpensslCnf(self.card_dir.joinpath(f"{self.cardholder}.cnf"),
+                         "user", [self.cardholder, self.CN])
+        cnf.create()
+        return cnf.content
+
 
 class PhysicalCard(Card):
     """
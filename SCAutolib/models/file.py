@@ -24,7 +24,8 @@ from traceback import format_exc
 from typing import Union
 import json
 
-from SCAutolib import logger, TEMPLATES_DIR, LIB_BACKUP, LIB_DUMP_CONFS, run
+from SCAutolib import (logger, TEMPLATES_DIR, LIB_BACKUP, LIB_DUMP_CONFS,
+                       restart_sssd)
 from SCAutolib.exceptions import SCAutolibException
 from SCAutolib.isDistro import isDistro
 
@@ -338,7 +339,7 @@ class SSSDConf(File):
 
         self.set(key, value, section)
         self.save()
-        run("systemctl restart sssd", sleep=10)
+        restart_sssd()
         return self
 
     def __enter__(self):
@@ -363,7 +364,7 @@ class SSSDConf(File):
         if exc_type is not None:
             logger.error("Exception in virtual smart card context")
             logger.error(format_exc())
-        run("systemctl restart sssd", sleep=10)
+        restart_sssd()
 
     def create(self):
         """
@@ -601,6 +602,13 @@ class OpensslCnf(File):
         for old, new in zip(self._old_strings, self._new_strings):
             self._content = self._content.replace(old, new)
 
+    @property
+    def content(self):
+        """
+        Content of the file created from the template.
+        """
+        return self._content
+
     def save(self):
         """
         Save content stored in internal file object to config file.
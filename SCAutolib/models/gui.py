@@ -1,49 +1,453 @@
+import atexit
+import hashlib
 import inspect
-from time import sleep, time
+import json
+import os
+import re
+import subprocess
+from collections import OrderedDict
+from csv import QUOTE_NONE
+from io import StringIO
+from queue import Empty, Queue
+from threading import Condition, Lock, Thread, current_thread
+from time import monotonic, sleep, time
 from pathlib import Path
+from typing import Union
 
 import cv2
 import keyboard
 import numpy as np
+import pandas as pd
 import pytesseract
 import uinput
 import logging
 
-from SCAutolib import run, logger
+from SCAutolib import run, logger, wait_until
 from SCAutolib.isDistro import isDistro
 
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+
+class FrameStream:
+    """Captures the screen continuously by single long-running ffmpeg process
+    that writes raw frames to a pipe. Only the latest frame is kept in
+    memory. Optionally, the same process records the screen to a video
+    file."""
+
+    cmd = ['ffmpeg', '-hide_banner', '-nostats', '-f', 'kmsgrab', '-i', '-',
+           '-vf', 'hwdownload,format=bgr0', '-f', 'rawvideo',
+           '-pix_fmt', 'bgr0', 'pipe:1']
+
+    def __init__(self, record: Path = None, fps: int = 5):
+        """Init method
+        :param record: Path to WebM video file the screen is recorded to.
+            If None, the screen is not recorded.
+        :param fps: Frame rate of the recorded video
+        """
+        self.record = record
+        self.fps = fps
+        self._proc = None
+        self._reader = None
+        self._frame = None
+        self._frame_time = None
+        self._start_time = None
+        self._seq = 0
+        self._error = None
+        self._cond = Condition()
+
+    @property
+    def command(self):
+        if self.record is None:
+            return self.cmd
+        # VP9 is encoded in realtime mode to keep the CPU usage low
+        return ['ffmpeg', '-hide_banner', '-nostats', '-y', '-f', 'kmsgrab',
+                '-i', '-', '-filter_complex',
+                'hwdownload,format=bgr0,split=2[raw][rec]',
+                '-map', '[raw]', '-f', 'rawvideo', '-pix_fmt', 'bgr0',
+                'pipe:1',
+                '-map', '[rec]', '-r', str(self.fps), '-c:v', 'libvpx-vp9',
+                '-deadline', 'realtime', '-cpu-used', '8', '-b:v', '0',
+                '-crf', '40', '-pix_fmt', 'yuv420p', str(self.record)]
+
+    @property
+    def running(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self, timeout: float = 30):
+        """Starts ffmpeg and waits for the first frame.
+
+        :param timeout: Timeout in seconds for the first frame
+        """
+        if self.running:
+            return
+        logger.debug("Starting ffmpeg capture stream")
+        self._seq = 0
+        self._error = None
+        self._start_time = None
+        self._proc = subprocess.Popen(self.command,
+                                      stdin=subprocess.DEVNULL,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE)
+        self._reader = Thread(target=self._read, daemon=True)
+        self._reader.start()
+        try:
+            self.frame(timeout, newer=False)
+        except Exception:
+            self.stop()
+            raise
+
+    def stop(self):
+        """Stops ffmpeg process."""
+        if self._proc is None:
+            return
+        self._proc.terminate()
+        try:
+            self._proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+            self._proc.wait()
+        self._reader.join()
+        self._proc = None
+        logger.debug("ffmpeg capture stream is stopped")
+
+    def frame(self, timeout: float = 30, newer: bool = True):
+        """Returns the latest frame.
+
+        :param timeout: Timeout in seconds. If no frame is captured before
+            the timeout, an exception is raised.
+        :param newer: If True, wait for a frame captured after this call, so
+            the frame reflects all changes made before the call.
+        :return: BGR image
+        :rtype: numpy.ndarray
+        """
+        return self.timed_frame(timeout, newer)[0]
+
+    def timed_frame(self, timeout: float = 30, newer: bool = True):
+        """Returns the latest frame with its time.
+
+        :param timeout: Timeout in seconds. If no frame is captured before
+            the timeout, an exception is raised.
+        :param newer: If True, wait for a frame captured after this call.
+        :return: BGR image and time in seconds since the first frame of the
+            stream (i.e. position in the recorded video)
+        :rtype: tuple
+        """
+        with self._cond:
+            seq = self._seq if newer else 0
+            self._cond.wait_for(
+                lambda: self._seq > seq or self._error is not None, timeout)
+            if self._seq <= seq:
+                msg = self._error
+                if msg is None:
+                    msg = 'Could not capture screenshot within timeout.'
+                raise Exception(msg)
+            return (self._frame[:, :, :3],
+                    self._frame_time - self._start_time)
+
+    def _read(self):
+        width, height = self._parse_size()
+        if width is None:
+            return self._fail("Could not detect resolution of the stream")
+        # Keep reading stderr, so ffmpeg is not blocked by full pipe
+        Thread(target=self._proc.stderr.read, daemon=True).start()
+
+        frame_size = width * height * 4
+        while True:
+            data = self._proc.stdout.read(frame_size)
+            if len(data) < frame_size:
+                break
+            frame = np.frombuffer(data, np.uint8).reshape(height, width, 4)
+            with self._cond:
+                self._frame = frame
+                self._frame_time = monotonic()
+                if self._start_time is None:
+                    self._start_time = self._frame_time
+                self._seq += 1
+                self._cond.notify_all()
+        self._fail(f"ffmpeg exited with {self._proc.wait()}")
+
+    def _parse_size(self):
+        """Reads size of the frames from the description of the output
+        stream printed by ffmpeg."""
+        output = False
+        for line in self._proc.stderr:
+            line = line.decode(errors="replace")
+            if line.startswith("Output #0"):
+                output = True
+            match = re.search(r"\b(\d{2,5})x(\d{2,5})\b", line)
+            if output and "Video:" in line and match:
+                return int(match.group(1)), int(match.group(2))
+            logger.debug(f"ffmpeg: {line.rstrip()}")
+        return None, None
+
+    def _fail(self, msg: str):
+        with self._cond:
+            self._error = msg
+            self._cond.notify_all()
+
+
+class ReportWriter:
+    """Writes screenshots and HTML report in a background thread, so GUI
+    actions don't wait for image encoding and disk I/O. Items are written in
+    the order they were added and HTML fragments are appended to the report
+    in batches."""
+
+    batch_size = 64
+
+    def __init__(self, html_file: str, thumbnail: str = None,
+                 thumbnail_scale: float = 0.5):
+        """Init method
+        :param html_file: Path to the HTML report
+        :param thumbnail: Format of the thumbnails shown in the report
+            ('jpg' or 'webp'). Report links to the lossless PNG original.
+            If None, the originals are shown directly.
+        :param thumbnail_scale: Scale of the thumbnails
+        """
+        self.html_file = Path(html_file)
+        self.thumbnail = thumbnail
+        self.thumbnail_scale = thumbnail_scale
+        self._queue = Queue()
+        self._closed = False
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        # Pending items are written also when the process ends without
+        # closing the writer (e.g. GUI used from CLI)
+        atexit.register(self.flush)
+
+    @property
+    def in_writer_thread(self):
+        return current_thread() is self._thread
+
+    def write(self, text: str):
+        """Append text to the HTML report."""
+        self._put((text, None, None, None))
+
+    def add_image(self, path: str, image: np.ndarray = None, alt: str = ""):
+        """Add image to the HTML report.
+
+        :param path: Path where the image is stored
+        :param image: BGR image to be stored to the path. If None, the image
+            is expected to be already stored.
+        :param alt: Alternative text of the image
+        """
+        self._put((None, Path(path), image, alt))
+
+    def flush(self):
+        """Wait until all items are written."""
+        if not self._closed:
+            self._queue.join()
+
+    def close(self):
+        """Write all items and stop the background thread. Items added
+        after closing are written synchronously."""
+        if self._closed:
+            return
+        self._queue.put(None)
+        self._queue.join()
+        self._thread.join()
+        self._closed = True
+        atexit.unregister(self.flush)
+
+    def _put(self, item: tuple):
+        if self._closed:
+            with open(self.html_file, 'a') as fp:
+                fp.write(self._process(*item))
+        else:
+            self._queue.put(item)
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            try:
+                chunks = [self._process(*item) for item in items
+                          if item is not None]
+                with open(self.html_file, 'a') as fp:
+                    fp.write("".join(chunks))
+            except Exception as e:
+                logger.error(f"Writing to the report failed: {e}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+            if None in items:
+                return
+
+    def _process(self, text: str, path: Path, image: np.ndarray, alt: str):
+        """Write the image and return HTML fragment for the item."""
+        if path is None:
+            return text
+        if image is not None:
+            cv2.imwrite(str(path), image)
+        src = os.path.relpath(path, self.html_file.parent)
+        if self.thumbnail is None or image is None:
+            return f"<img src=\"{src}\" alt=\"{alt}\">"
+
+        thumb = path.with_name(f"{path.stem}_thumb.{self.thumbnail}")
+        small = cv2.resize(image, dsize=None, fx=self.thumbnail_scale,
+                           fy=self.thumbnail_scale,
+                           interpolation=cv2.INTER_AREA)
+        params = []
+        if self.thumbnail == "webp":
+            params = [cv2.IMWRITE_WEBP_QUALITY, 80]
+        elif self.thumbnail == "jpg":
+            params = [cv2.IMWRITE_JPEG_QUALITY, 80]
+        cv2.imwrite(str(thumb), small, params)
+        thumb_src = os.path.relpath(thumb, self.html_file.parent)
+        return f"<a href=\"{src}\"><img src=\"{thumb_src}\" alt=\"{alt}\"></a>"
+
+
+class ReportHandler(logging.Handler):
+    """Logging handler adding log records to the HTML report through
+    the report writer."""
+
+    def __init__(self, writer: ReportWriter):
+        super().__init__()
+        self.writer = writer
+
+    def emit(self, record: logging.LogRecord):
+        # Errors of the writer itself are not written to the report to
+        # prevent endless loop
+        if self.writer.in_writer_thread:
+            return
+        try:
+            self.writer.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
 
 class Screen:
     """Captures the screenshots."""
 
-    def __init__(self, directory: str, html_file: str = None):
+    def __init__(self, directory: str, html_file: str = None,
+                 stream: bool = False, report: ReportWriter = None,
+                 record: Path = None):
         """Init method
         :param directory: Path to directory, where the screenshots
             will be saved.
+        :param html_file: HTML report the screenshots are added to
+        :param stream: If True, the screen is captured by single long-running
+            ffmpeg process between ``start`` and ``stop`` calls. Otherwise
+            new ffmpeg process is executed for each screenshot.
+        :param report: Writer of the HTML report. If not set and html_file
+            is given, new writer is created.
+        :param record: Path to the video file. If set, the whole session is
+            recorded by the capture stream and screenshots are not stored as
+            images, but as positions in the video listed in the report and in
+            the index file next to the video.
         """
         self.directory = directory
         self.html_file = html_file
+        self.record = Path(record) if record else None
+        self.stream = FrameStream(record=self.record) \
+            if stream or record else None
+        # Positions of recently captured frames in the video
+        self._times = OrderedDict()
+        self._index = []
+        if report is None and html_file:
+            report = ReportWriter(html_file)
+        self.report = report
+
+        # Only screenshots (<N>.png) are counted, not their thumbnails
+        taken_images = [int(image.stem)
+                        for image in Path(directory).iterdir()
+                        if image.suffix == ".png" and image.stem.isdigit()]
+        self.screenshot_num = max(taken_images, default=0) + 1
+
+    def start(self):
+        """Starts the capture stream if the streaming is enabled."""
+        if self.stream is not None:
+            self.stream.start()
+        if self.record is not None and self.report is not None:
+            self.report.write(f"<video src=\"{self._report_path(self.record)}"
+                              f"\" controls width=\"100%\"></video>\n")
+
+    def stop(self):
+        """Stops the capture stream."""
+        if self.stream is not None:
+            self.stream.stop()
+        if self.record is not None:
+            index = self.record.with_suffix(".json")
+            with index.open("w") as f:
+                json.dump({"video": self.record.name,
+                           "screenshots": self._index}, f, indent=2)
+            logger.debug(f"Index of the recording is written to {index}")
+
+    def extract(self, position: float, filename: str):
+        """Extracts frame at given position from the recorded video.
+
+        :param position: Position in the video in seconds
+        :param filename: Path to the output image
+        :return: Path to the image
+        :rtype: str
+        """
+        run(['ffmpeg', '-hide_banner', '-y', '-ss', f'{position:.3f}', '-i',
+             str(self.record), '-frames:v', '1', filename], print_=False)
+        return filename
 
-        taken_images = [str(image).split('/')[-1]
-                        for image in Path(directory).iterdir()]
-        taken_images.sort(reverse=True)
+    def capture(self, timeout: float = 30):
+        """Captures the screen without adding it to the report.
 
-        self.screenshot_num = 1
-        if len(taken_images) > 0:
-            self.screenshot_num = int(taken_images[0].split('.')[0]) + 1
+        :param timeout: Timeout in seconds. If the screen cannot be captured
+            before the specified timeout, an exception is raised.
+        :return: BGR image
+        :rtype: numpy.ndarray
+        """
+        if self.stream is not None and self.stream.running:
+            frame, position = self.stream.timed_frame(timeout)
+            if self.record is not None:
+                self._times[id(frame)] = (frame, position)
+                if len(self._times) > 16:
+                    self._times.popitem(last=False)
+            return frame
+        filename = f'{self.directory}/.capture.png'
+        self._grab(filename, timeout)
+        return cv2.imread(filename)
+
+    def save(self, image: np.ndarray):
+        """Saves the image as next screenshot and adds it to the report.
+        The image is written in background, so the file may not exist yet
+        when this method returns.
+
+        :param image: BGR image
+        :return: Path to the screenshot. In recording mode, path to the video
+            with position of the frame (video.webm#t=seconds).
+        :rtype: str
+        """
+        if self.record is not None and self.stream.running:
+            return self._mark(image)
+        filename = f'{self.directory}/{self.screenshot_num}.png'
+        if self.report is None:
+            cv2.imwrite(filename, image)
+        self._report(filename, image)
+        return filename
 
     def screenshot(self, timeout: float = 30):
-        """Runs ffmpeg to take a screenshot.
+        """Takes a screenshot and adds it to the report.
 
         :param timeout: Timeout in seconds. If ffmpeg cannot take screenshot
             before the specified timeout, an exception is raised.
         :return: Path to the screenshot
         :rtype: str
         """
-
-        logger.debug(f"Taking screenshot number {self.screenshot_num}")
+        if self.stream is not None and self.stream.running:
+            return self.save(self.capture(timeout))
 
         filename = f'{self.directory}/{self.screenshot_num}.png'
+        self._grab(filename, timeout)
+        self._report(filename)
+        return filename
+
+    def _grab(self, filename: str, timeout: float):
+        """Runs ffmpeg to take a screenshot."""
+        logger.debug(f"Taking screenshot to {filename}")
+
         t_end = time() + timeout
         captured = False
 
@@ -64,15 +468,38 @@ class Screen:
         if not captured:
             raise Exception('Could not capture screenshot within timeout.')
 
-        if self.html_file:
-            with open(self.html_file, 'a') as fp:
-                fp.write(
-                    f"<img src=\"screenshots/{self.screenshot_num}.png\" "
-                    f"alt=\"screenshot number {self.screenshot_num}\">"
-                )
+    def _mark(self, image: np.ndarray):
+        """Records position of the frame in the video instead of saving
+        the image."""
+        if id(image) in self._times and self._times[id(image)][0] is image:
+            position = self._times[id(image)][1]
+        else:
+            position = self.stream.timed_frame(newer=False)[1]
+        number = self.screenshot_num
+        self._index.append({"number": number, "time": round(position, 3)})
+        logger.debug(f"Screenshot number {number} is at {position:.2f}s of "
+                     f"the recording")
+        if self.report is not None:
+            src = self._report_path(self.record)
+            self.report.write(f"<p><a href=\"{src}#t={position:.2f}\">"
+                              f"screenshot number {number} at "
+                              f"{position:.2f}s</a></p>\n")
+        self.screenshot_num += 1
+        return f"{self.record}#t={position:.2f}"
+
+    def _report_path(self, path: Path):
+        if self.report is None:
+            return str(path)
+        return os.path.relpath(path, self.report.html_file.parent)
+
+    def _report(self, filename: str, image: np.ndarray = None):
+        logger.debug(f"Screenshot number {self.screenshot_num} is saved to "
+                     f"{filename}")
+        if self.report is not None:
+            self.report.add_image(
+                filename, image, f"screenshot number {self.screenshot_num}")
 
         self.screenshot_num += 1
-        return filename
 
 
 class Mouse:
@@ -141,14 +568,151 @@ class Mouse:
         self.device.emit(uinput_button, 0)
 
 
-def image_to_data(path: str):
+class OCREngine:
+    """Interface of OCR engines used for reading text from the screenshots."""
+
+    # Header of TSV output of tesseract
+    columns = ("level", "page_num", "block_num", "par_num", "line_num",
+               "word_num", "left", "top", "width", "height", "conf", "text")
+
+    def image_to_data(self, image: np.ndarray):
+        """Recognize words in the image.
+
+        :param image: preprocessed image
+        :return: dataframe in the same format as
+            pytesseract.image_to_data(..., output_type='data.frame') returns
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release resources of the engine."""
+
+
+class PytesseractEngine(OCREngine):
+    """Runs new tesseract process for each image."""
+
+    def image_to_data(self, image: np.ndarray):
+        return pytesseract.image_to_data(image, output_type='data.frame')
+
+
+class TesserocrEngine(OCREngine):
+    """Keeps tesseract API with loaded language model in memory, so each
+    image is passed to tesseract directly without temporary files and
+    new processes."""
+
+    def __init__(self, lang: str = "eng"):
+        self._api = tesserocr.PyTessBaseAPI(lang=lang)
+        # Tesseract API is not thread safe
+        self._lock = Lock()
+
+    def image_to_data(self, image: np.ndarray):
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        with self._lock:
+            self._api.SetImageBytes(image.tobytes(), width, height, channels,
+                                    width * channels)
+            self._api.Recognize()
+            tsv = self._api.GetTSVText(0)
+        return pd.read_csv(StringIO("\t".join(self.columns) + "\n" + tsv),
+                           sep="\t", quoting=QUOTE_NONE)
+
+    def close(self):
+        self._api.End()
+
+
+_ocr_engine = None
+
+
+def get_ocr_engine():
+    """Return OCR engine shared by all GUI objects. Tesseract API from
+    tesserocr package is used if it is installed, otherwise pytesseract is
+    used.
+
+    :return: OCR engine
+    :rtype: OCREngine
+    """
+    global _ocr_engine
+    if _ocr_engine is None:
+        if tesserocr is not None:
+            _ocr_engine = TesserocrEngine()
+        else:
+            logger.debug("tesserocr is not installed, using pytesseract")
+            _ocr_engine = PytesseractEngine()
+    return _ocr_engine
+
+
+def set_ocr_engine(engine: OCREngine):
+    """Replace OCR engine shared by all GUI objects.
+
+    :param engine: new OCR engine
+    """
+    global _ocr_engine
+    if _ocr_engine is not None and _ocr_engine is not engine:
+        _ocr_engine.close()
+    _ocr_engine = engine
+
+
+# Named regions of the screen as normalized (left, top, right, bottom)
+# coordinates
+REGIONS = {
+    "top-bar": (0, 0, 1, 0.06),
+    "bottom-bar": (0, 0.9, 1, 1),
+    "login-dialog": (0.25, 0.15, 0.75, 0.85),
+    "center": (0.25, 0.25, 0.75, 0.75),
+}
+
+
+def get_region(region: Union[str, tuple, None]):
+    """Resolve region of the screen to normalized coordinates.
+
+    :param region: Name of the region from REGIONS, tuple with normalized
+        (left, top, right, bottom) coordinates or None for whole screen.
+    :return: tuple with normalized (left, top, right, bottom) coordinates
+    """
+    if region is None:
+        return 0, 0, 1, 1
+    if isinstance(region, str):
+        if region not in REGIONS:
+            raise ValueError(f"Unknown region '{region}'. Known regions: "
+                             f"{', '.join(REGIONS)}")
+        return REGIONS[region]
+    left, top, right, bottom = region
+    if not (0 <= left < right <= 1 and 0 <= top < bottom <= 1):
+        raise ValueError("Region must be (left, top, right, bottom) with "
+                         "values between 0 and 1")
+    return left, top, right, bottom
+
+
+def crop(image: np.ndarray, region: Union[str, tuple, None]):
+    """Crop the image to given region of the screen.
+
+    :param image: The image to crop.
+    :param region: Region of the screen, see get_region.
+    :return: View of the cropped part of the image.
+    """
+    left, top, right, bottom = get_region(region)
+    yres, xres = image.shape[:2]
+    x0, x1 = int(left * xres), max(int(right * xres), int(left * xres) + 1)
+    y0, y1 = int(top * yres), max(int(bottom * yres), int(top * yres) + 1)
+    return image[y0:y1, x0:x1]
+
+
+def image_to_data(image: Union[str, np.ndarray],
+                  region: Union[str, tuple] = None):
     """Convert screenshot into dataframe of words with their coordinates.
+    Coordinates are normalized to the whole screen also when only a region
+    is processed.
 
-    :param path: path to the image to convert.
+    :param image: path to the image to convert or the image itself.
+    :param region: Process only given region of the screen, see get_region.
     """
     upscaling_factor = 2
 
-    image = cv2.imread(path)
+    if isinstance(image, (str, Path)):
+        image = cv2.imread(str(image))
+    if region is not None:
+        image = crop(image, region)
     grayscale = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     upscaled = cv2.resize(grayscale,
                           dsize=None,
@@ -156,43 +720,409 @@ def image_to_data(path: str):
                           fy=upscaling_factor,
                           interpolation=cv2.INTER_LANCZOS4)
     _, binary = cv2.threshold(upscaled, 120, 255, cv2.THRESH_BINARY_INV)
-    df = pytesseract.image_to_data(binary, output_type='data.frame')
+    df = get_ocr_engine().image_to_data(binary)
 
     yres, xres = binary.shape[:2]
-    df[['left', 'width']] /= xres
-    df[['top', 'height']] /= yres
+    left, top, right, bottom = get_region(region)
+    df[['left', 'width']] *= (right - left) / xres
+    df[['top', 'height']] *= (bottom - top) / yres
+    df['left'] += left
+    df['top'] += top
 
     logger.debug(df)
     return df
 
 
-def images_equal(path1: str, path2: str):
-    """Compare two images, return True if they are completely identical.
-    Images are considered identical, when their resolutions match and
-    all pixel values are equal.
-    Images can be in any format, that can be read using
-    imread function from OpenCV.
+def edit_distance(a: str, b: str, limit: int):
+    """Levenshtein distance of two strings bounded by the limit.
+
+    :return: the distance or limit + 1 if the distance exceeds the limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+class WordIndex:
+    """Words of single OCR result grouped into lines and indexed for fast
+    lookup of words and phrases."""
+
+    # Characters that are ignored at the beginning and the end of the words
+    punctuation = ".,:;!?\"'()[]{}"
+
+    def __init__(self, df):
+        """Init method
+        :param df: dataframe as returned by image_to_data
+        """
+        words = df[df['text'].notna()]
+        words = words.assign(text=words['text'].astype(str).str.strip())
+        words = words[words['text'] != ""]
+        words = words.sort_values(['block_num', 'par_num', 'line_num',
+                                   'word_num'])
+
+        # Each line is a list of (normalized word, (left, top, width, height))
+        self.lines = []
+        # Normalized word -> list of (line, position in the line)
+        self._positions = {}
+        for _, line in words.groupby(['block_num', 'par_num', 'line_num'],
+                                     sort=False):
+            entries = [(self.normalize(w.text),
+                        (w.left, w.top, w.width, w.height))
+                       for w in line.itertuples()]
+            for pos, (word, _) in enumerate(entries):
+                self._positions.setdefault(word, []).append(
+                    (len(self.lines), pos))
+            self.lines.append(entries)
+
+    @classmethod
+    def normalize(cls, text: str):
+        return text.strip().strip(cls.punctuation)
+
+    def find(self, phrase: str, max_distance: int = 0,
+             ignore_case: bool = False):
+        """Find all occurrences of the phrase. Words of the phrase have to be
+        on the same line in the same order.
+
+        :param phrase: One or more words separated by spaces
+        :param max_distance: Maximal edit distance between the phrase and the
+            text on the screen (e.g. 1 allows one misrecognized character).
+        :param ignore_case: Compare the text case-insensitively
+        :return: list of normalized (left, top, width, height) boxes
+            containing the whole phrase
+        """
+        tokens = [self.normalize(t) for t in phrase.split()]
+        tokens = [t for t in tokens if t]
+        if not tokens:
+            return []
+
+        if max_distance == 0 and not ignore_case:
+            # Exact lookup starts only at positions of the first word
+            candidates = self._positions.get(tokens[0], [])
+        else:
+            candidates = [(n, pos) for n, line in enumerate(self.lines)
+                          for pos in range(len(line))]
+
+        text = " ".join(tokens)
+        if ignore_case:
+            text = text.casefold()
+        matches = []
+        for n, pos in candidates:
+            words = self.lines[n][pos:pos + len(tokens)]
+            if len(words) < len(tokens):
+                continue
+            found = " ".join(word for word, _ in words)
+            if ignore_case:
+                found = found.casefold()
+            if found != text \
+                    and edit_distance(found, text, max_distance) > max_distance:
+                continue
+            boxes = [box for _, box in words]
+            left = min(b[0] for b in boxes)
+            top = min(b[1] for b in boxes)
+            right = max(b[0] + b[2] for b in boxes)
+            bottom = max(b[1] + b[3] for b in boxes)
+            matches.append((left, top, right - left, bottom - top))
+        return matches
+
+
+class OCRReader:
+    """Recognizes text in captured frames and reuses previous results.
+
+    Results are cached by hash of the frame, so the same frame is recognized
+    only once. When a frame differs from the previous frame of the same
+    region only in a small area, only the changed area is recognized again
+    and the words from the rest of the screen are taken from the previous
+    result.
+    """
+
+    # Number of cached results
+    cache_size = 16
+    # Maximal fraction of the region that can be changed for partial OCR
+    partial_limit = 0.5
+    # Margin in pixels added around the changed area
+    margin = 8
+
+    def __init__(self):
+        self._cache = OrderedDict()
+        self._last = {}
+
+    def read(self, frame: np.ndarray, region: Union[str, tuple] = None):
+        """Convert the frame into dataframe of words with their coordinates.
+
+        :param frame: BGR image of the whole screen
+        :param region: Process only given region of the screen, see
+            get_region.
+        :return: dataframe as returned by image_to_data
+        """
+        return self._entry(frame, region)[0]
+
+    def words(self, frame: np.ndarray, region: Union[str, tuple] = None):
+        """Get searchable index of words recognized in the frame.
+
+        :param frame: BGR image of the whole screen
+        :param region: Process only given region of the screen, see
+            get_region.
+        :return: index of the words
+        :rtype: WordIndex
+        """
+        entry = self._entry(frame, region)
+        if entry[1] is None:
+            entry[1] = WordIndex(entry[0])
+        return entry[1]
+
+    def _entry(self, frame: np.ndarray, region: Union[str, tuple]):
+        """Get cached [dataframe, word index] for the frame or recognize the
+        frame. Word index is built lazily."""
+        bounds = get_region(region)
+        part = np.ascontiguousarray(crop(frame, bounds))
+        key = (hashlib.blake2b(part.data, digest_size=16).digest(), bounds)
+        if key in self._cache:
+            logger.debug("Frame is not changed, using cached OCR result")
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        df = None
+        last = self._last.get(bounds)
+        if last is not None and last[0].shape == part.shape:
+            df = self._update(frame, part, bounds, *last)
+        if df is None:
+            df = image_to_data(frame, bounds)
+
+        self._last[bounds] = (part, df)
+        self._cache[key] = [df, None]
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return self._cache[key]
+
+    def _update(self, frame: np.ndarray, part: np.ndarray, bounds: tuple,
+                last_part: np.ndarray, last_df):
+        """Recognize only the area of the region that differs from the last
+        frame. Returns None if the changed area is too big."""
+        changed = np.any(part != last_part, axis=2)
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        if rows.size == 0:
+            return last_df
+
+        yres, xres = part.shape[:2]
+        left, top, right, bottom = bounds
+        # Changed area in normalized coordinates of the whole screen
+        area = [left + (right - left) * max(cols[0] - self.margin, 0) / xres,
+                top + (bottom - top) * max(rows[0] - self.margin, 0) / yres,
+                left + (right - left) * min(cols[-1] + self.margin + 1,
+                                            xres) / xres,
+                top + (bottom - top) * min(rows[-1] + self.margin + 1,
+                                           yres) / yres]
+
+        # Words that are partially in the changed area are recognized again
+        # as a whole
+        words = last_df.dropna(subset=['text'])
+        overlapping = words[self._in_area(words, area, whole=False)]
+        if not overlapping.empty:
+            right_edges = overlapping['left'] + overlapping['width']
+            bottom_edges = overlapping['top'] + overlapping['height']
+            area = [min(area[0], overlapping['left'].min()),
+                    min(area[1], overlapping['top'].min()),
+                    max(area[2], right_edges.max()),
+                    max(area[3], bottom_edges.max())]
+        area = [max(area[0], left), max(area[1], top),
+                min(area[2], right), min(area[3], bottom)]
+
+        size = (area[2] - area[0]) * (area[3] - area[1])
+        if size > self.partial_limit * (right - left) * (bottom - top):
+            return None
+        logger.debug(f"Recognizing only changed area {area} of the screen")
+
+        kept = last_df.drop(overlapping.index)
+        kept = kept[~self._in_area(kept, area, whole=True)]
+        new = image_to_data(frame, tuple(area))
+        # Keep blocks of the new result separated from the kept ones, so
+        # words from different results are not mixed into one line
+        if not kept.empty:
+            new['block_num'] += int(kept['block_num'].max())
+        return pd.concat([kept, new], ignore_index=True)
+
+    @staticmethod
+    def _in_area(df, area: list, whole: bool):
+        """Select rows of the dataframe with boxes inside the area (whole=True)
+        or intersecting the area (whole=False)."""
+        left, top = df['left'], df['top']
+        right, bottom = left + df['width'], top + df['height']
+        if whole:
+            selection = (left >= area[0]) & (top >= area[1])
+            return selection & (right <= area[2]) & (bottom <= area[3])
+        selection = (left < area[2]) & (right > area[0])
+        return selection & (top < area[3]) & (bottom > area[1])
+
+
+class TemplateLocator:
+    """Locates UI elements (icons, fields, buttons) on the screen by matching
+    image templates. Templates are matched on downscaled images first and
+    the best match is refined in full resolution, so the whole screen is
+    never searched in full resolution."""
+
+    # Minimal normalized correlation of the match
+    threshold = 0.8
+    # Minimal size of the template in pixels on the coarsest level
+    min_size = 12
+    max_levels = 3
+
+    def __init__(self, directory: Union[str, Path] = None):
+        """Init method
+        :param directory: Directory with templates stored as <name>.png
+        """
+        self.directory = Path(directory) if directory else None
+        self._templates = {}
+
+    def template(self, name: str):
+        """Load the template and its downscaled versions. Templates are
+        cached, so each template is loaded only once.
 
-    :param path1: Path to the first image.
-    :param path2: Path to the second image.
+        :param name: Name of the template in templates directory or path to
+            the image.
+        :return: List of grayscale images from the original to the smallest
+        """
+        if name in self._templates:
+            return self._templates[name]
+        path = Path(name)
+        if not path.suffix and self.directory is not None:
+            path = self.directory.joinpath(f"{name}.png")
+        image = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise FileNotFoundError(f"Template {path} could not be loaded")
+        pyramid = [image]
+        while len(pyramid) <= self.max_levels \
+                and min(pyramid[-1].shape) // 2 >= self.min_size:
+            pyramid.append(cv2.pyrDown(pyramid[-1]))
+        self._templates[name] = pyramid
+        return pyramid
+
+    def locate(self, frame: np.ndarray, name: str,
+               region: Union[str, tuple] = None, threshold: float = None):
+        """Find the best match of the template on the screen.
+
+        :param frame: BGR image of the whole screen
+        :param name: Name of the template or path to it
+        :param region: Search only in given region of the screen, see
+            get_region.
+        :param threshold: Minimal normalized correlation of the match
+        :return: Normalized (left, top, width, height) of the match or None
+        """
+        threshold = self.threshold if threshold is None else threshold
+        pyramid = self.template(name)
+        part = crop(frame, region)
+        gray = cv2.cvtColor(part, cv2.COLOR_BGR2GRAY)
+        th, tw = pyramid[0].shape
+        yres, xres = gray.shape
+        if yres < th or xres < tw:
+            return None
+
+        # Coarse search on the smallest level that still fits the screen
+        level = len(pyramid) - 1
+        screens = [gray]
+        for _ in range(level):
+            screens.append(cv2.pyrDown(screens[-1]))
+        while level > 0 and np.any(np.less(screens[level].shape,
+                                           pyramid[level].shape)):
+            level -= 1
+        result = cv2.matchTemplate(screens[level], pyramid[level],
+                                   cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+
+        if level > 0:
+            # Refine the match in the full resolution around the candidate
+            scale = 2 ** level
+            x0 = min(max(x * scale - 2 * scale, 0), xres - tw)
+            y0 = min(max(y * scale - 2 * scale, 0), yres - th)
+            window = gray[y0:y0 + th + 4 * scale, x0:x0 + tw + 4 * scale]
+            result = cv2.matchTemplate(window, pyramid[0],
+                                       cv2.TM_CCOEFF_NORMED)
+            _, score, _, (dx, dy) = cv2.minMaxLoc(result)
+            x, y = x0 + dx, y0 + dy
+
+        logger.debug(f"Best match of template {name} has score {score:.2f}")
+        if score < threshold:
+            return None
+        left, top, right, bottom = get_region(region)
+        return (left + x / xres * (right - left),
+                top + y / yres * (bottom - top),
+                tw / xres * (right - left),
+                th / yres * (bottom - top))
+
+
+def changed_tiles(im1: np.ndarray, im2: np.ndarray, tile: int = 32):
+    """Find tiles of the image with at least one changed pixel.
+
+    :param im1: The first image.
+    :param im2: The second image with the same shape.
+    :param tile: Size of the square tile in pixels.
+    :return: 2D boolean array with True for each changed tile
+    """
+    changed = im1 != im2
+    if changed.ndim == 3:
+        changed = changed.any(axis=2)
+    yres, xres = changed.shape
+    rows, cols = -(-yres // tile), -(-xres // tile)
+    padded = np.zeros((rows * tile, cols * tile), dtype=bool)
+    padded[:yres, :xres] = changed
+    return padded.reshape(rows, tile, cols, tile).any(axis=(1, 3))
+
+
+def images_equal(im1: Union[str, np.ndarray], im2: Union[str, np.ndarray],
+                 tolerance: int = 0, tile: int = 32, step: int = 8):
+    """Compare two images, return True if they are identical.
+    Images are considered identical, when their resolutions match and
+    pixel values differ at most in ``tolerance`` tiles, so small changes
+    like cursor blinking or clock ticking can be ignored.
+    Images can be given as arrays or paths to files in any format, that can
+    be read using imread function from OpenCV.
+
+    Comparison starts on downsampled images, which detects big changes
+    without processing all pixels. Full resolution is compared only when
+    the downsampled images don't prove the difference.
+
+    :param im1: The first image or path to it.
+    :param im2: The second image or path to it.
+    :param tolerance: Number of tiles that can differ.
+    :param tile: Size of the square tile in pixels.
+    :param step: Only each step-th pixel in both axes is compared by the
+        fast check.
     """
-    im1 = cv2.imread(path1)
-    im2 = cv2.imread(path2)
+    if isinstance(im1, (str, Path)):
+        im1 = cv2.imread(str(im1))
+    if isinstance(im2, (str, Path)):
+        im2 = cv2.imread(str(im2))
 
     # Is the resolution the same
     if im1.shape != im2.shape:
         return False
 
-    # Check if value of every pixel is the same
-    if np.bitwise_xor(im1, im2).any():
+    # Each tile of the downsampled image covers the same part of the screen
+    # as a tile of the full image, so the changed tiles found there are
+    # changed in the full image as well
+    sampled = changed_tiles(im1[::step, ::step], im2[::step, ::step],
+                            max(tile // step, 1))
+    if sampled.sum() > tolerance:
         return False
 
-    return True
+    # Check the value of every pixel
+    return changed_tiles(im1, im2, tile).sum() <= tolerance
 
 
 def action_decorator(func):
     """Decorator for all functions, that change the state of GUI.
     This decorator takes a screenshot before and after the action.
+    After the action, it waits until the screen is settled (at most
+    ``wait_time`` seconds), so the end screenshot shows result of the action.
     The two screenshots are compared. If they are the same,
     an exception is raised.
 
@@ -204,17 +1134,29 @@ def action_decorator(func):
                 wait_time=None,
                 screenshot=True,
                 check_difference=True,
+                change_tolerance=None,
                 **kwargs):
 
-        start_screenshot = self.screen.screenshot() if screenshot else None
+        start_screenshot = None
+        if change_tolerance is None:
+            change_tolerance = self.change_tolerance
+        if screenshot:
+            start_screenshot = self.screen.capture()
+            self.screen.save(start_screenshot)
         func(self, *args, **kwargs)
-        sleep(wait_time or self.wait_time)
-        end_screenshot = self.screen.screenshot() if screenshot else None
+        # The action is expected to change the screen, so the screen is not
+        # considered settled until it differs from the start screenshot
+        changed_from = start_screenshot if check_difference else None
+        end_screenshot = self.wait_for_stable(wait_time or self.wait_time,
+                                              changed_from, change_tolerance)
+        if screenshot:
+            self.screen.save(end_screenshot)
 
         if screenshot and check_difference:
             # If the checking is enabled
             # the action should change contents of the screen
-            if images_equal(start_screenshot, end_screenshot):
+            if images_equal(start_screenshot, end_screenshot,
+                            change_tolerance):
                 # If the screenshot before and after action are the same
                 # an exception is raised
                 raise Exception("Action did not change "
@@ -244,15 +1186,36 @@ class GUI:
     """Represents the GUI and allows controlling the system under test."""
 
     def __init__(self, wait_time: float = 5, res_dir_name: str = None,
-                 from_cli: bool = False):
+                 from_cli: bool = False, stream: bool = False,
+                 change_tolerance: int = 0, thumbnail: str = None,
+                 record: bool = False, template_dir: str = None,
+                 settle_time: float = 0.5):
         """Initializes the GUI of system under test.
 
-        :param wait_time: Time to wait after each action
+        :param wait_time: Maximal time to wait for the screen to settle after
+            each action
         :param custom_dir_name: Provide a custom name of the results dir under
         /tmp/SC-tests/. The default is `timestamp`_`caller func's name`.
+        :param stream: Capture the screen by single long-running ffmpeg
+            process instead of new process for each screenshot
+        :param change_tolerance: Number of 32x32 pixels tiles that can change
+            without the action being considered as changing the screen (e.g.
+            blinking cursor or ticking clock)
+        :param thumbnail: Show screenshots in the report as thumbnails in
+            given format ('jpg' or 'webp') linking to PNG originals
+        :param record: Record the whole session to single video file
+            (recording.webm in the results dir) instead of storing screenshots
+            as images. Screenshots are listed in the report and in
+            recording.json as positions in the video.
+        :param template_dir: Directory with image templates (<name>.png) of UI
+            elements used by methods with image=True
+        :param settle_time: The screen is considered settled when it doesn't
+            change for this time in seconds
         """
 
         self.wait_time = wait_time
+        self.settle_time = settle_time
+        self.change_tolerance = change_tolerance
         self.gdm_init_time = 10
         self.from_cli = from_cli
         # Create the directory for screenshots
@@ -307,7 +1270,9 @@ class GUI:
         fmt += "%(name)s:%(module)s.%(funcName)s.%(lineno)d </span>"
         fmt += "<span style=\"color:royalblue;\">[%(levelname)s] </span>"
         fmt += "<pre style=\"color:limegreen;\">%(message)s</pre>"
-        self.fileHandler = logging.FileHandler(self.html_file)
+        # Screenshots and log records are written to the report in background
+        self.report = ReportWriter(self.html_file, thumbnail=thumbnail)
+        self.fileHandler = ReportHandler(self.report)
         self.fileHandler.setLevel(logging.DEBUG)
         self.fileHandler.setFormatter(
             logging.Formatter("<p>" + fmt + "</p>")
@@ -323,7 +1288,15 @@ class GUI:
         keyboard.send('enter')
 
         # create screen object to use from calls
-        self.screen = Screen(self.screenshot_directory, self.html_file)
+        recording = self.html_directory.joinpath("recording.webm") \
+            if record else None
+        self.screen = Screen(self.screenshot_directory, self.html_file,
+                             stream=stream, report=self.report,
+                             record=recording)
+        # OCR results are shared by all methods, so the same frame is not
+        # recognized twice
+        self.ocr = OCRReader()
+        self.locator = TemplateLocator(template_dir)
 
     def __enter__(self):
         # By restarting gdm, the system gets into defined state
@@ -331,6 +1304,7 @@ class GUI:
         # Cannot screenshot before gdm starts displaying
         # This would break the display
         sleep(self.gdm_init_time)
+        self.screen.start()
 
         if not self.from_cli:
             logger.addHandler(self.fileHandler)
@@ -338,18 +1312,19 @@ class GUI:
         return self
 
     def __exit__(self, type, value, traceback):
+        self.screen.stop()
         done_file = self.html_directory.joinpath('done')
         print(done_file)
         if done_file.exists():
+            self.report.flush()
             return
 
         run(['systemctl', 'stop', 'gdm'], check=True)
 
-        with open(self.html_file, 'a') as fp:
-            fp.write(
-                "</body>\n"
-                "</html>\n"
-            )
+        self.report.write(
+            "</body>\n"
+            "</html>\n"
+        )
 
         print(done_file)
         with open(done_file, 'w') as fp:
@@ -357,66 +1332,70 @@ class GUI:
 
         if not self.from_cli:
             logger.removeHandler(self.fileHandler)
+        self.report.close()
 
         logger.info(f"HTML file with results created in {self.html_directory}.")
 
     @action_decorator
     @log_decorator
-    def click_on(self, key: str, timeout: float = 30):
-        """Clicks matching word on the screen.
+    def click_on(self, key: str, timeout: float = 30,
+                 region: Union[str, tuple] = None, image: bool = False,
+                 distance: int = 0):
+        """Clicks matching word or phrase on the screen.
 
-        :param key: String to find in the screenshot.
+        :param key: Word or phrase to find in the screenshot.
         :param timeout: If the key is not found within this timeout,
             an exception will be raised. Timeout is in seconds.
+        :param region: Search only in given region of the screen. Name of the
+            region from REGIONS or normalized (left, top, right, bottom)
+            coordinates.
+        :param image: If True, the key is a name of the image template (or
+            path to it) located by template matching instead of OCR.
+        :param distance: Maximal edit distance between the key and the text
+            on the screen, so OCR errors (e.g. "1" instead of "l") can be
+            tolerated.
         """
         logger.info(f"Trying to find key='{key}' to click on.")
 
-        end_time = time() + timeout
-        item = None
-        first_scr = None
-        last_scr = None
+        found = {}
 
         # Repeat screenshotting, until the key is found
-        while time() < end_time:
-            # Capture the screenshot
-            screenshot = self.screen.screenshot()
-
-            last_scr = screenshot
-            if first_scr is None:
-                first_scr = screenshot
-
-            df = image_to_data(screenshot)
-            selection = df['text'] == key
+        def key_found():
+            # Capture the screen, only the last frame is saved to the report
+            found['frame'] = self.screen.capture()
+            matches = self._find(found['frame'], key, region, image, distance)
 
             # If there is no matching word, try again
-            if selection.sum() == 0:
+            if len(matches) == 0:
                 logger.info('Found no match, trying again')
-                continue
+                return False
 
-            # Exactly one word matching, exit the loop
-            elif selection.sum() == 1:
+            # Exactly one word matching
+            elif len(matches) == 1:
                 logger.info('Found exactly one match')
-                item = df[selection].iloc[0]
-                break
 
             # More than one word matches, choose the first match
             # Probably deterministic, but it should not be relied upon
             else:
                 logger.info('Found multiple matches')
-                item = df[selection].iloc[0]
-                break
+            found['item'] = matches[0]
+            return True
 
+        self._poll(key_found, timeout)
+        frame = found.get('frame')
+        item = found.get('item')
+        screenshot = self.screen.save(frame) if frame is not None else None
         if item is None:
-            raise Exception(f"Found no key='{key}' in screenshots "
-                            f"{first_scr} to {last_scr}")
+            raise Exception(f"Found no key='{key}' until screenshot "
+                            f"{screenshot}")
 
-        x = float(item['left'] + item['width'] / 2)
-        y = float(item['top'] + item['height'] / 2)
+        left, top, width, height = item
+        x = float(left + width / 2)
+        y = float(top + height / 2)
 
         self.mouse.move(x, y)
         sleep(0.5)
         self.mouse.click()
-        sleep(self.wait_time)
 
     @action_decorator
     @log_decorator
@@ -442,7 +1421,9 @@ class GUI:
         keyboard.send(*args, **kwargs)
 
     @log_decorator
-    def assert_text(self, key: str, timeout: float = 0):
+    def assert_text(self, key: str, timeout: float = 0,
+                    region: Union[str, tuple] = None, image: bool = False,
+                    distance: int = 0):
         """
         Given key must be found in a screenshot before the timeout.
 
@@ -450,31 +1431,41 @@ class GUI:
         Zero timeout means that only one screenshot
         will be taken and evaluated.
 
-        :param key: String to find in the screenshot.
+        :param key: Word or phrase to find in the screenshot.
         :param timeout: If the key is not found within this timeout,
             an exception will be raised. Timeout is in seconds.
+        :param region: Search only in given region of the screen. Name of the
+            region from REGIONS or normalized (left, top, right, bottom)
+            coordinates.
+        :param image: If True, the key is a name of the image template (or
+            path to it) located by template matching instead of OCR.
+        :param distance: Maximal edit distance between the key and the text
+            on the screen, so OCR errors (e.g. "1" instead of "l") can be
+            tolerated.
         """
 
         logger.info(f"Trying to find key='{key}'")
 
-        end_time = time() + timeout
-        first = True
+        frames = []
 
-        while first or time() < end_time:
-            first = False
-            # Capture the screenshot
-            screenshot = self.screen.screenshot()
-            df = image_to_data(screenshot)
-            selection = df['text'] == key
+        def key_found():
+            # Capture the screen, only the last frame is saved to the report
+            frames[:] = [self.screen.capture()]
+            return bool(self._find(frames[0], key, region, image, distance))
 
-            # The key was found
-            if selection.sum() != 0:
-                return
+        # Zero timeout means exactly one check
+        if self._poll(key_found, timeout):
+            self.screen.save(frames[0])
+            return
 
-        raise Exception('The key was not found.')
+        screenshot = self.screen.save(frames[0])
+        raise Exception(f"The key was not found until screenshot "
+                        f"{screenshot}.")
 
     @log_decorator
-    def assert_no_text(self, key: str, timeout: float = 0):
+    def assert_no_text(self, key: str, timeout: float = 0,
+                       region: Union[str, tuple] = None, image: bool = False,
+                       distance: int = 0):
         """
         If the given key is found in any screenshot before the timeout,
         an exception is raised.
@@ -484,24 +1475,92 @@ class GUI:
 
         :param key: String that should not be found in the screenshot.
         :param timeout: Timeout is in seconds.
+        :param region: Search only in given region of the screen. Name of the
+            region from REGIONS or normalized (left, top, right, bottom)
+            coordinates.
+        :param image: If True, the key is a name of the image template (or
+            path to it) located by template matching instead of OCR.
+        :param distance: Maximal edit distance between the key and the text
+            on the screen, so OCR errors (e.g. "1" instead of "l") can be
+            tolerated.
         """
         logger.info(f"Trying to find key='{key}'"
                     " (it should not be in the screenshot)")
 
-        end_time = time() + timeout
-        first = True
+        frames = []
 
-        while first or time() < end_time:
-            first = False
-            # Capture the screenshot
-            screenshot = self.screen.screenshot()
-            df = image_to_data(screenshot)
-            selection = df['text'] == key
+        def key_found():
+            # Capture the screen, only the last frame is saved to the report
+            frames[:] = [self.screen.capture()]
+            return bool(self._find(frames[0], key, region, image, distance))
 
+        # Zero timeout means exactly one check
+        if self._poll(key_found, timeout):
             # The key was found, but should not be
-            if selection.sum() != 0:
-                raise Exception(f"The key='{key}' was found "
-                                f"in the screenshot {screenshot}")
+            screenshot = self.screen.save(frames[0])
+            raise Exception(f"The key='{key}' was found "
+                            f"in the screenshot {screenshot}")
+        self.screen.save(frames[0])
+
+    def wait_for_stable(self, timeout: float = None,
+                        changed_from: np.ndarray = None, tolerance: int = None):
+        """Wait until the screen is settled, i.e. it doesn't change for
+        ``settle_time`` seconds. The screen is polled with growing interval,
+        so fast transitions end the wait quickly and slow transitions don't
+        cause too many captures.
+
+        :param timeout: Maximal time to wait in seconds, ``wait_time`` by
+            default. When the screen is not settled before the timeout, the
+            last captured frame is returned anyway.
+        :param changed_from: If given, the screen is settled only when it
+            differs from this frame, so the wait is not finished before slow
+            action starts changing the screen.
+        :param tolerance: Number of tiles that can change, see images_equal.
+            ``change_tolerance`` by default.
+        :return: The last captured frame
+        :rtype: numpy.ndarray
+        """
+        timeout = self.wait_time if timeout is None else timeout
+        if tolerance is None:
+            tolerance = self.change_tolerance
+        state = {'frame': None, 'since': None}
+
+        def settled():
+            frame = self.screen.capture()
+            now = monotonic()
+            last = state['frame']
+            state['frame'] = frame
+            if last is None or not images_equal(last, frame, tolerance):
+                state['since'] = now
+                return False
+            if changed_from is not None \
+                    and images_equal(changed_from, frame, tolerance):
+                return False
+            return now - state['since'] >= self.settle_time
+
+        if not wait_until(settled, timeout, interval=0.1,
+                          max_interval=self.settle_time):
+            logger.debug(f"Screen is not settled within {timeout}s")
+        return state['frame']
+
+    @staticmethod
+    def _poll(condition, timeout: float):
+        """Check the condition until it is met or the timeout expires. The
+        condition is checked at least once."""
+        return wait_until(condition, timeout, interval=0.2, max_interval=2)
+
+    def _find(self, frame: np.ndarray, key: str,
+              region: Union[str, tuple] = None, image: bool = False,
+              distance: int = 0):
+        """Find all occurrences of the key in the frame. Key of several words
+        is matched against consecutive words on the same line.
+
+        :return: list of normalized (left, top, width, height) boxes
+        """
+        if image:
+            match = self.locator.locate(frame, key, region)
+            return [] if match is None else [match]
+        return self.ocr.words(frame, region).find(key, distance)
 
     @log_decorator
     def check_home_screen(self, polarity: bool = True):
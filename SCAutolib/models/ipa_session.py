@@ -0,0 +1,164 @@
+"""
+This module implements process-wide pool of authenticated sessions to IPA
+servers. All objects communicating with the same IPA server (IPAServerCA,
+IPAUser, ...) share single python_freeipa client, so TLS connection is kept
+alive and login is done only once instead of for every created object.
+The session is logged in again before the session cookie expires.
+"""
+import atexit
+import time
+from threading import Lock, RLock
+
+from SCAutolib import logger
+
+
+class IPASession:
+    """
+    Authenticated session to the IPA server. Methods of
+    ``python_freeipa.client_meta.ClientMeta`` can be called directly on the
+    session. When the server rejects expired session, the client logs in again
+    and the call is repeated.
+    """
+    # Default value of session_auth_duration in IPA server configuration
+    lifetime = 20 * 60
+    # Session is renewed when less than this time is left before expiration
+    margin = 5 * 60
+
+    def __init__(self, hostname: str, username: str, password: str,
+                 verify_ssl: bool = False):
+        """
+        :param hostname: Hostname of the IPA server
+        :type hostname: str
+        :param username: User to log in as
+        :type username: str
+        :param password: Password of the user
+        :type password: str
+        :param verify_ssl: Verify certificate of the IPA server
+        :type verify_ssl: bool
+        """
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.verify_ssl = verify_ssl
+        self._client = None
+        self._login_time = None
+        self._lock = RLock()
+
+    @property
+    def client(self):
+        """
+        Client logged in to the server. Login is done on the first use and
+        renewed when the session is about to expire.
+
+        :return: logged in client
+        :rtype: python_freeipa.client_meta.ClientMeta
+        """
+        with self._lock:
+            if self._expires_soon():
+                self.login()
+            return self._client
+
+    @property
+    def logged_in(self) -> bool:
+        return self._login_time is not None
+
+    def login(self):
+        """
+        Log in to the server. The same HTTP session is reused, so only the
+        session cookie is replaced.
+        """
+        from python_freeipa.client_meta import ClientMeta
+
+        with self._lock:
+            if self._client is None:
+                self._client = ClientMeta(self.hostname,
+                                          verify_ssl=self.verify_ssl)
+            self._login_time = None
+            self._client.login(self.username, self.password)
+            self._login_time = time.monotonic()
+        logger.info(f"Logged in to IPA server {self.hostname} as "
+                    f"{self.username}")
+
+    def logout(self):
+        """
+        Log out from the server if the session is logged in.
+        """
+        with self._lock:
+            if not self.logged_in:
+                return
+            self._login_time = None
+            try:
+                self._client.logout()
+                logger.debug(f"Logged out from IPA server {self.hostname}")
+            except Exception as e:
+                logger.debug(f"Logout from IPA server {self.hostname} "
+                             f"failed: {e}")
+
+    def _expires_soon(self) -> bool:
+        if self._login_time is None:
+            return True
+        age = time.monotonic() - self._login_time
+        return age > self.lifetime - self.margin
+
+    def __getattr__(self, name):
+        from python_freeipa.client_meta import ClientMeta
+
+        # Only public attributes of the client are delegated. Private names
+        # would cause infinite recursion before __init__ is finished.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if not callable(getattr(ClientMeta, name, None)):
+            return getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            from python_freeipa.exceptions import Unauthorized
+
+            try:
+                return getattr(self.client, name)(*args, **kwargs)
+            except Unauthorized:
+                logger.debug(f"Session to IPA server {self.hostname} is "
+                             f"expired, logging in again")
+                self.login()
+                return getattr(self._client, name)(*args, **kwargs)
+
+        return call
+
+
+_sessions = {}
+_sessions_lock = Lock()
+
+
+def get_session(hostname: str, username: str, password: str) -> IPASession:
+    """
+    Get shared session to the IPA server. New session is created only if there
+    is no session for the server and the user yet or the password has changed.
+    The session is not logged in until it is used.
+
+    :param hostname: Hostname of the IPA server
+    :type hostname: str
+    :param username: User to log in as
+    :type username: str
+    :param password: Password of the user
+    :type password: str
+    :return: shared session
+    :rtype: SCAutolib.models.ipa_session.IPASession
+    """
+    key = (hostname, username)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None or session.password != password:
+            session = IPASession(hostname, username, password)
+            _sessions[key] = session
+        return session
+
+
+@atexit.register
+def close_sessions():
+    """
+    Log out from all IPA servers and forget the sessions.
+    """
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.logout()
@@ -0,0 +1,121 @@
+"""
+This module implements a journal of finished setup steps. Each step is recorded
+with a fingerprint of its inputs (part of the configuration file and state of
+relevant files in the system) taken after the step is finished. When the
+fingerprint of the step is the same on the next run, nothing has changed since
+the step was done and the step can be skipped.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from threading import Lock
+
+from SCAutolib import logger, LIB_JOURNAL
+
+
+class StepJournal:
+    """
+    Persistent record of finished steps stored in JSON file. Steps can be
+    recorded from several threads at once.
+    """
+
+    def __init__(self, path: Path = LIB_JOURNAL):
+        """
+        :param path: path to the JSON file with the journal
+        :type path: pathlib.Path
+        """
+        self.path = Path(path)
+        self._lock = Lock()
+        self._steps = {}
+        if self.path.exists():
+            with self.path.open() as f:
+                self._steps = json.load(f)
+
+    @staticmethod
+    def state(path: Path):
+        """
+        Describe state of the file or the directory in the system. Directory
+        is described by state of all its entries, so a change of any file in
+        the directory changes its state.
+
+        :param path: path to the file or the directory
+        :type path: pathlib.Path
+        :return: JSON serializable description of the state, None if path
+            doesn't exist
+        """
+        path = Path(path)
+        if not path.exists():
+            return None
+        if path.is_dir():
+            return {entry.name: StepJournal.state(entry)
+                    for entry in sorted(path.iterdir())}
+        stat = path.stat()
+        return [stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def fingerprint(*inputs) -> str:
+        """
+        Compute fingerprint of given inputs of the step.
+
+        :param inputs: JSON serializable values. Values of unknown types (e.g.
+            pathlib.Path) are converted to strings.
+        :return: SHA-256 digest of the inputs
+        :rtype: str
+        """
+        data = json.dumps(inputs, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def done(self, step: str, *inputs) -> bool:
+        """
+        Check if the step was already done with the same inputs.
+
+        :param step: unique name of the step
+        :type step: str
+        :param inputs: inputs of the step, see ``fingerprint``
+        :return: True if the step can be skipped
+        :rtype: bool
+        """
+        with self._lock:
+            recorded = self._steps.get(step)
+        if recorded is not None and recorded == self.fingerprint(*inputs):
+            logger.info(f"Step {step} is already done, skipping it")
+            return True
+        return False
+
+    def record(self, step: str, *inputs):
+        """
+        Record the step as done with given inputs. Inputs should be described
+        after the step is finished, so the state of the files changed by the
+        step itself is included.
+
+        :param step: unique name of the step
+        :type step: str
+        :param inputs: inputs of the step, see ``fingerprint``
+        """
+        fingerprint = self.fingerprint(*inputs)
+        with self._lock:
+            self._steps[step] = fingerprint
+            self._save()
+        logger.debug(f"Step {step} is recorded to the journal")
+
+    def forget(self, step: str = None):
+        """
+        Remove the step from the journal, so it is done again on the next run.
+
+        :param step: name of the step. All steps are removed if not specified.
+        :type step: str
+        """
+        with self._lock:
+            if step is None:
+                self._steps.clear()
+            else:
+                self._steps.pop(step, None)
+            self._save()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        with tmp.open("w") as f:
+            json.dump(self._steps, f, indent=2)
+        os.replace(tmp, self.path)
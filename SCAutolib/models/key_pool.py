@@ -0,0 +1,182 @@
+"""
+This module implements a pool of pre-generated RSA private keys for virtual
+cards. Generation of the key is the most CPU demanding step of the card
+enrollment, so keys can be generated ahead of time (e.g. on golden images) or
+in background processes while other steps of the setup are running. Keys are
+stored in the pool directory readable only by the owner.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from shutil import move
+from threading import RLock
+from uuid import uuid4
+
+from SCAutolib import logger, LIB_KEYS
+
+
+def generate_key() -> bytes:
+    """
+    Generate RSA private key in PEM format.
+
+    :return: private key in PEM format
+    :rtype: bytes
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    # CAC specification do not specify key size specifies key size
+    # up to 2048 bits, so keys greater than 2048 bits is not supported
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption())
+
+
+class KeyPool:
+    """
+    Pool of private keys stored in a directory. Keys can be generated
+    synchronously by ``fill`` method or in background processes between
+    ``start`` and ``stop`` calls. Key is handed out by ``take`` method that
+    moves it from the pool to the requested location.
+    """
+
+    def __init__(self, directory: Path = LIB_KEYS, size: int = 20):
+        """
+        :param directory: path to the directory with pooled keys
+        :type directory: pathlib.Path
+        :param size: number of keys the pool should contain
+        :type size: int
+        """
+        self.directory = Path(directory)
+        self.size = size
+        self._executor = None
+        self._pending = 0
+        # Callback of already finished future is executed by the thread that
+        # adds it, so the lock has to be reentrant
+        self._lock = RLock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def keys(self) -> list:
+        """
+        Keys that are currently present in the pool.
+        """
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob("*.pem"))
+
+    def fill(self, jobs: int = None) -> int:
+        """
+        Generate keys in parallel processes until the pool contains ``size``
+        keys.
+
+        :param jobs: number of processes generating keys. Number of CPUs is
+            used by default.
+        :type jobs: int
+        :return: number of generated keys
+        :rtype: int
+        """
+        missing = self.size - len(self.keys)
+        if missing <= 0:
+            logger.info(f"Key pool {self.directory} is already filled")
+            return 0
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(generate_key) for _ in range(missing)]
+            for future in futures:
+                self._store(future.result())
+        logger.info(f"{missing} keys are generated to {self.directory}")
+        return missing
+
+    def start(self, jobs: int = None):
+        """
+        Start refilling the pool in background processes. Pool is refilled
+        every time a key is taken until ``stop`` is called.
+
+        :param jobs: number of processes generating keys. Number of CPUs is
+            used by default.
+        :type jobs: int
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=jobs)
+            logger.debug(f"Background refilling of key pool {self.directory} "
+                         f"is started")
+        self._refill()
+
+    def stop(self):
+        """
+        Stop background refilling. Keys that are already being generated are
+        still stored to the pool.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            logger.debug(f"Background refilling of key pool {self.directory} "
+                         f"is stopped")
+
+    def take(self, key_path: Path) -> bool:
+        """
+        Move a key from the pool to given location.
+
+        :param key_path: path where the key should be stored
+        :type key_path: pathlib.Path
+        :return: True if the key was taken from the pool, False if the pool is
+            empty
+        :rtype: bool
+        """
+        taken = False
+        for key in self.keys:
+            # Rename inside the pool directory is atomic, so the same key can't
+            # be handed out twice
+            claimed = key.with_name(f".{key.stem}.taken")
+            try:
+                os.rename(key, claimed)
+            except FileNotFoundError:
+                continue
+            move(claimed, key_path)
+            logger.debug(f"Key {key.name} from the pool is moved to {key_path}")
+            taken = True
+            break
+        self._refill()
+        return taken
+
+    def _refill(self):
+        if self._executor is None:
+            return
+        with self._lock:
+            missing = self.size - len(self.keys) - self._pending
+            for _ in range(missing):
+                self._pending += 1
+                self._executor.submit(generate_key).add_done_callback(
+                    self._done)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+        if future.cancelled():
+            return
+        try:
+            self._store(future.result())
+        except Exception as e:
+            logger.error(f"Key for the pool is not generated: {e}")
+
+    def _store(self, key: bytes):
+        """
+        Store the key to the pool. The key is written under temporary name
+        first, so a partially written key is never handed out.
+        """
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.directory.chmod(0o700)
+        name = uuid4().hex
+        tmp = self.directory.joinpath(f".{name}.tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        os.rename(tmp, self.directory.joinpath(f"{name}.pem"))
@@ -0,0 +1,248 @@
+"""
+This module translates openssl configuration files to objects of the
+cryptography package, so names and extensions described by the configuration
+templates of the library can be used for building CSRs and certificates
+in-process. Only the syntax used by the templates is supported. For anything
+else NotImplementedError is raised, so the caller can fall back to the
+openssl tool instead of silently ignoring a part of the configuration.
+"""
+from cryptography import x509
+from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+
+# Short and long names of the name attributes as openssl knows them. Short
+# names are used in one-line format of names (e.g. /O=Example/CN=user).
+ATTRIBUTES = [
+    (NameOID.COUNTRY_NAME, "C", "countryName"),
+    (NameOID.STATE_OR_PROVINCE_NAME, "ST", "stateOrProvinceName"),
+    (NameOID.LOCALITY_NAME, "L", "localityName"),
+    (NameOID.ORGANIZATION_NAME, "O", "organizationName"),
+    (NameOID.ORGANIZATIONAL_UNIT_NAME, "OU", "organizationalUnitName"),
+    (NameOID.COMMON_NAME, "CN", "commonName"),
+    (NameOID.EMAIL_ADDRESS, "emailAddress", "emailAddress"),
+    (NameOID.SERIAL_NUMBER, "serialNumber", "serialNumber"),
+    (NameOID.DOMAIN_COMPONENT, "DC", "domainComponent"),
+    (NameOID.USER_ID, "UID", "userId"),
+    (NameOID.GIVEN_NAME, "GN", "givenName"),
+    (NameOID.SURNAME, "SN", "surname"),
+    (NameOID.TITLE, "title", "title"),
+]
+SHORT_NAMES = {oid: short for oid, short, _ in ATTRIBUTES}
+_ATTRIBUTE_OIDS = {name: oid for oid, short, long in ATTRIBUTES
+                   for name in (short, long)}
+
+_NS_CERT_TYPE = x509.ObjectIdentifier("2.16.840.1.113730.1.1")
+_NS_COMMENT = x509.ObjectIdentifier("2.16.840.1.113730.1.13")
+# Names of other OIDs used in the templates
+_OIDS = {
+    "msSmartcardLogin": x509.ObjectIdentifier("1.3.6.1.4.1.311.20.2.2"),
+    "msUPN": x509.ObjectIdentifier("1.3.6.1.4.1.311.20.2.3"),
+    "serverAuth": ExtendedKeyUsageOID.SERVER_AUTH,
+    "clientAuth": ExtendedKeyUsageOID.CLIENT_AUTH,
+    "codeSigning": ExtendedKeyUsageOID.CODE_SIGNING,
+    "emailProtection": ExtendedKeyUsageOID.EMAIL_PROTECTION,
+    "timeStamping": ExtendedKeyUsageOID.TIME_STAMPING,
+    "OCSPSigning": ExtendedKeyUsageOID.OCSP_SIGNING,
+}
+# keyUsage names to parameters of x509.KeyUsage
+_KEY_USAGES = {
+    "digitalSignature": "digital_signature",
+    "nonRepudiation": "content_commitment",
+    "keyEncipherment": "key_encipherment",
+    "dataEncipherment": "data_encipherment",
+    "keyAgreement": "key_agreement",
+    "keyCertSign": "key_cert_sign",
+    "cRLSign": "crl_sign",
+    "encipherOnly": "encipher_only",
+    "decipherOnly": "decipher_only",
+}
+# nsCertType names in order of the bits
+_NS_CERT_TYPES = ["client", "server", "email", "objsign", "reserved", "sslCA",
+                  "emailCA", "objCA"]
+
+
+def parse(text: str) -> dict:
+    """
+    Split content of the configuration file to sections. Values are not
+    expanded.
+
+    :param text: content of the configuration file
+    :type text: str
+    :return: dictionary of sections, each section is a dictionary of values
+        in the order of the file. Values before the first section are in
+        "default" section.
+    :rtype: dict
+    """
+    sections = {}
+    section = sections.setdefault("default", {})
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line.startswith("[") and line.endswith("]"):
+            section = sections.setdefault(line[1:-1].strip(), {})
+        elif "=" in line:
+            key, _, value = line.partition("=")
+            section[key.strip()] = value.strip()
+    return sections
+
+
+def attribute_oid(field: str):
+    """
+    :param field: short or long name of the name attribute
+    :type field: str
+    :return: OID of the attribute or None if the name is not known
+    :rtype: cryptography.x509.ObjectIdentifier
+    """
+    return _ATTRIBUTE_OIDS.get(field)
+
+
+def build_name(section: dict) -> x509.Name:
+    """
+    Build name from distinguished name section of ``openssl req``
+    configuration with ``prompt = no``.
+
+    :param section: section of the configuration as returned by parse
+    :type section: dict
+    :return: name with attributes in the order of the section
+    :rtype: cryptography.x509.Name
+    """
+    attrs = []
+    for key, value in section.items():
+        # Repeated fields are prefixed by a number, e.g. 0.OU and 1.OU
+        oid = attribute_oid(key.rpartition(".")[2])
+        if oid is None:
+            raise NotImplementedError(f"Name attribute {key} is not supported")
+        attrs.append(x509.NameAttribute(oid, value))
+    return x509.Name(attrs)
+
+
+def build_extensions(section: dict, public_key) -> list:
+    """
+    Build extensions from extensions section of the configuration.
+
+    :param section: section of the configuration as returned by parse
+    :type section: dict
+    :param public_key: public key the extensions are created for (used by
+        subjectKeyIdentifier = hash)
+    :return: list of (extension, critical) tuples in the order of the section
+    :rtype: list
+    """
+    extensions = []
+    for key, value in section.items():
+        critical = False
+        if value.startswith("critical,"):
+            critical = True
+            value = value[len("critical,"):].strip()
+        if key == "nsComment":
+            ext = x509.UnrecognizedExtension(
+                _NS_COMMENT, _encode("IA5String", value.strip('"')))
+        else:
+            items = [item.strip() for item in value.split(",")]
+            builder = _BUILDERS.get(key)
+            if builder is None:
+                raise NotImplementedError(f"Extension {key} is not supported")
+            ext = builder(items, public_key)
+        extensions.append((ext, critical))
+    return extensions
+
+
+def _oid(name: str) -> x509.ObjectIdentifier:
+    if name in _OIDS:
+        return _OIDS[name]
+    try:
+        return x509.ObjectIdentifier(name)
+    except ValueError:
+        raise NotImplementedError(f"OID {name} is not supported")
+
+
+def _encode(asn1_type: str, value) -> bytes:
+    """
+    DER encode value of extension without dedicated class in cryptography.
+    """
+    try:
+        from cryptography.hazmat import asn1
+    except ImportError:
+        raise NotImplementedError("Installed cryptography package can't "
+                                  "encode ASN.1 values")
+    if asn1_type == "IA5String":
+        value = asn1.IA5String(value)
+    elif asn1_type == "BitString":
+        data, padding_bits = value
+        value = asn1.BitString(data=data, padding_bits=padding_bits)
+    elif asn1_type != "UTF8String":
+        raise NotImplementedError(f"ASN.1 type {asn1_type} is not supported")
+    return asn1.encode_der(value)
+
+
+def _basic_constraints(items: list, public_key):
+    options = dict(item.split(":", 1) for item in items)
+    path_length = options.get("pathlen")
+    return x509.BasicConstraints(
+        ca=options.get("CA", "FALSE").upper() == "TRUE",
+        path_length=int(path_length) if path_length else None)
+
+
+def _key_usage(items: list, public_key):
+    unknown = set(items) - set(_KEY_USAGES)
+    if unknown:
+        raise NotImplementedError(f"Key usage {', '.join(unknown)} is not "
+                                  f"supported")
+    return x509.KeyUsage(**{param: name in items
+                            for name, param in _KEY_USAGES.items()})
+
+
+def _extended_key_usage(items: list, public_key):
+    return x509.ExtendedKeyUsage([_oid(item) for item in items])
+
+
+def _subject_key_identifier(items: list, public_key):
+    if items != ["hash"]:
+        raise NotImplementedError("Only subjectKeyIdentifier = hash is "
+                                  "supported")
+    return x509.SubjectKeyIdentifier.from_public_key(public_key)
+
+
+def _subject_alt_name(items: list, public_key):
+    names = []
+    for item in items:
+        kind, _, value = item.partition(":")
+        if kind == "email":
+            names.append(x509.RFC822Name(value))
+        elif kind == "DNS":
+            names.append(x509.DNSName(value))
+        elif kind == "URI":
+            names.append(x509.UniformResourceIdentifier(value))
+        elif kind == "otherName":
+            # otherName:<OID>;UTF8:<value>
+            oid, _, typed = value.partition(";")
+            asn1_type, _, text = typed.partition(":")
+            if asn1_type not in ("UTF8", "UTF8String"):
+                raise NotImplementedError(f"Type {asn1_type} of otherName is "
+                                          f"not supported")
+            names.append(x509.OtherName(_oid(oid),
+                                        _encode("UTF8String", text)))
+        else:
+            raise NotImplementedError(f"Alternative name {kind} is not "
+                                      f"supported")
+    return x509.SubjectAlternativeName(names)
+
+
+def _ns_cert_type(items: list, public_key):
+    unknown = set(items) - set(_NS_CERT_TYPES)
+    if unknown:
+        raise NotImplementedError(f"nsCertType {', '.join(unknown)} is not "
+                                  f"supported")
+    # Named bit list: trailing zero bits are not encoded
+    bits = [_NS_CERT_TYPES.index(item) for item in items]
+    data = sum(0x80 >> bit for bit in bits)
+    return x509.UnrecognizedExtension(
+        _NS_CERT_TYPE,
+        _encode("BitString", (bytes([data]), 7 - max(bits))))
+
+
+_BUILDERS = {
+    "basicConstraints": _basic_constraints,
+    "keyUsage": _key_usage,
+    "extendedKeyUsage": _extended_key_usage,
+    "subjectKeyIdentifier": _subject_key_identifier,
+    "subjectAltName": _subject_alt_name,
+    "nsCertType": _ns_cert_type,
+}
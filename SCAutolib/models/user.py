@@ -10,7 +10,6 @@ create or remove a specified user in the system or in the specified IPA server.
 """
 import json
 import pwd
-import python_freeipa
 from pathlib import Path, PosixPath
 
 from SCAutolib import run, logger, LIB_DUMP_USERS
@@ -150,6 +149,8 @@ class IPAUser(User):
         """
         Adds IPA user to IPA server.
         """
+        import python_freeipa
+
         try:
             r = self._meta_client.user_add(self.username, self.username,
                                            self.username, self.username,
@@ -157,11 +158,10 @@ class IPAUser(User):
             logger.debug(r)
 
             # To avoid forcing IPA server to change the password on first login
-            # we changing it through the client
-            client = python_freeipa.client.Client(self._ipa_hostname,
-                                                  verify_ssl=False)
-            client.change_password(self.username, self.password,
-                                   self.default_password)
+            # we changing it through the client. Shared session is used, so
+            # no new connection to the server is made for each user.
+            self._meta_client.change_password(self.username, self.password,
+                                              self.default_password)
             logger.info(f"User {self.username} is added to the IPA server")
         except python_freeipa.exceptions.DuplicateEntry:
             msg = f"User {self.username} already exists on the " \
@@ -174,9 +174,105 @@ class IPAUser(User):
         """
         Deletes the user
         """
+        import python_freeipa
+
         try:
             r = self._meta_client.user_del(self.username)["result"]
             logger.info(f"User {self.username} is removed from the IPA server")
             logger.debug(r)
         except python_freeipa.exceptions.NotFound:
             pass
+
+
+class IPAUserSet:
+    """
+    Set of IPA users that are added to and deleted from the IPA server
+    together. All commands are sent by IPA batch command, so the number of
+    round trips to the server doesn't grow with the number of users.
+    """
+    # Users are created with password set by admin, which is expired
+    # immediately. Expiration is moved to the far future in the same batch,
+    # so users are not forced to change the password on the first login.
+    password_expiration = "20380119031407Z"
+
+    def __init__(self, ipa_server: IPAServerCA, users: list = None):
+        """
+        :param ipa_server: IPA server the users are managed on
+        :type ipa_server: SCAutolib.models.CA.IPAServerCA
+        :param users: IPA users in the set
+        :type users: list
+        """
+        self._ipa_server = ipa_server
+        self.users = list(users) if users else []
+
+    def add_users(self) -> list:
+        """
+        Add all users of the set to the IPA server with non-expiring
+        passwords.
+
+        :return: list with None for each added user or an exception for
+            users that are not added, in the same order as users in the set
+        :rtype: list
+        """
+        from python_freeipa import exceptions
+
+        methods = []
+        for usr in self.users:
+            methods.append({"method": "user_add",
+                            "params": [[usr.username],
+                                       {"givenname": usr.username,
+                                        "sn": usr.username,
+                                        "cn": usr.username,
+                                        "userpassword": usr.password}]})
+            methods.append({"method": "user_mod",
+                            "params": [[usr.username],
+                                       {"setattr": [
+                                           "krbpasswordexpiration="
+                                           f"{self.password_expiration}"]}]})
+        # user_mod must not be sent in a different chunk than its user_add
+        replies = self._ipa_server.batch(methods, group=2)
+
+        results = []
+        for i, usr in enumerate(self.users):
+            error = next((r for r in replies[2 * i:2 * i + 2]
+                          if isinstance(r, Exception)), None)
+            if isinstance(error, exceptions.DuplicateEntry):
+                error = SCAutolibException(
+                    f"User {usr.username} already exists on the IPA server. "
+                    f"Username should be unique to avoid future problems "
+                    f"with collisions")
+            if error is None:
+                logger.info(f"User {usr.username} is added to the IPA server")
+            else:
+                logger.critical(f"User {usr.username} is not added to the "
+                                f"IPA server: {error}")
+            results.append(error)
+        return results
+
+    def delete_users(self) -> list:
+        """
+        Delete all users of the set from the IPA server. Users that don't
+        exist on the server are skipped.
+
+        :return: list with None for each deleted or missing user or an
+            exception for users that are not deleted, in the same order as
+            users in the set
+        :rtype: list
+        """
+        from python_freeipa import exceptions
+
+        methods = [{"method": "user_del", "params": [[usr.username], {}]}
+                   for usr in self.users]
+        results = []
+        for usr, r in zip(self.users, self._ipa_server.batch(methods)):
+            if isinstance(r, exceptions.NotFound):
+                r = None
+            elif isinstance(r, Exception):
+                logger.error(f"User {usr.username} is not removed from the "
+                             f"IPA server: {r}")
+            else:
+                logger.info(f"User {usr.username} is removed from the IPA "
+                            f"server")
+                r = None
+            results.append(r)
+        return results
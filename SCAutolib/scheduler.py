@@ -0,0 +1,179 @@
+"""
+This module implements a scheduler for tasks with dependencies. Tasks form
+a directed acyclic graph: a task is started as soon as all its dependencies
+are successfully finished, so independent tasks run concurrently on the thread
+pool. When a task fails, all tasks depending on it are skipped. At the end,
+timing of the tasks on the critical path (the chain of dependent tasks that
+determined total time) is logged.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from SCAutolib import logger
+from SCAutolib.exceptions import SCAutolibException
+
+
+class Task:
+    """
+    Single unit of work in the task graph.
+    """
+    pending = "pending"
+    running = "running"
+    done = "done"
+    failed = "failed"
+    skipped = "skipped"
+
+    def __init__(self, name: str, func, deps: tuple = ()):
+        """
+        :param name: unique name of the task
+        :type name: str
+        :param func: callable without parameters executing the task
+        :type func: callable
+        :param deps: names of the tasks that have to be finished before this
+            task is started
+        :type deps: tuple
+        """
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.status = self.pending
+        self.result = None
+        self.error = None
+        self.start = None
+        self.end = None
+
+    @property
+    def duration(self) -> float:
+        if self.start is None or self.end is None:
+            return 0
+        return self.end - self.start
+
+    def __call__(self):
+        self.start = time.monotonic()
+        try:
+            return self.func()
+        finally:
+            self.end = time.monotonic()
+
+
+class TaskGraph:
+    """
+    Graph of tasks executed in order given by their dependencies.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+
+    def add(self, name: str, func, deps: tuple = ()) -> Task:
+        """
+        Add the task to the graph. Dependencies have to be added before the
+        task, so the graph can't contain cycles.
+
+        :param name: unique name of the task
+        :type name: str
+        :param func: callable without parameters executing the task
+        :type func: callable
+        :param deps: names of the tasks the task depends on
+        :type deps: tuple
+        :return: the task
+        :rtype: SCAutolib.scheduler.Task
+        """
+        if name in self.tasks:
+            raise SCAutolibException(f"Task {name} is already in the graph")
+        unknown = [d for d in deps if d not in self.tasks]
+        if unknown:
+            raise SCAutolibException(
+                f"Task {name} depends on unknown tasks: {', '.join(unknown)}")
+        task = Task(name, func, deps)
+        self.tasks[name] = task
+        return task
+
+    def run(self, jobs: int = 1) -> dict:
+        """
+        Execute all tasks of the graph. Ready tasks are started in the order
+        they were added to the graph.
+
+        :param jobs: maximum number of tasks running in parallel
+        :type jobs: int
+        :return: dictionary with results of the tasks
+        :rtype: dict
+        :raise: exception of the first failed task
+        """
+        begin = time.monotonic()
+        running = {}
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            while True:
+                for task in self._ready():
+                    task.status = Task.running
+                    running[executor.submit(task)] = task
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    try:
+                        task.result = future.result()
+                        task.status = Task.done
+                    except Exception as e:
+                        task.error = e
+                        task.status = Task.failed
+                        logger.error(f"Task {task.name} failed: {e}")
+
+        self._report(begin)
+        failed = [t for t in self.tasks.values() if t.status == Task.failed]
+        if failed:
+            skipped = [t.name for t in self.tasks.values()
+                       if t.status == Task.skipped]
+            if skipped:
+                logger.error(f"Tasks skipped due to failed dependencies: "
+                             f"{', '.join(skipped)}")
+            raise failed[0].error
+        return {name: t.result for name, t in self.tasks.items()}
+
+    def _ready(self) -> list:
+        """
+        Find pending tasks with all dependencies finished. Pending tasks with
+        failed or skipped dependency are marked as skipped.
+        """
+        ready = []
+        # Tasks are added after their dependencies, so single pass propagates
+        # skipping through the whole graph
+        for task in self.tasks.values():
+            if task.status != Task.pending:
+                continue
+            deps = [self.tasks[d].status for d in task.deps]
+            if any(s in (Task.failed, Task.skipped) for s in deps):
+                task.status = Task.skipped
+                logger.warning(f"Task {task.name} is skipped because some of "
+                               f"its dependencies failed")
+            elif all(s == Task.done for s in deps):
+                ready.append(task)
+        return ready
+
+    def critical_path(self) -> list:
+        """
+        Find the chain of dependent tasks that finished last. Each task in the
+        chain is preceded by its dependency that finished last.
+
+        :return: list of tasks from the first to the last one
+        :rtype: list
+        """
+        finished = [t for t in self.tasks.values() if t.end is not None]
+        if not finished:
+            return []
+        path = [max(finished, key=lambda t: t.end)]
+        while True:
+            deps = [self.tasks[d] for d in path[-1].deps
+                    if self.tasks[d].end is not None]
+            if not deps:
+                break
+            path.append(max(deps, key=lambda t: t.end))
+        return path[::-1]
+
+    def _report(self, begin: float):
+        total = time.monotonic() - begin
+        path = self.critical_path()
+        lines = [f"  {t.name}: {t.duration:.2f}s "
+                 f"(started at {t.start - begin:.2f}s)" for t in path]
+        lines.insert(0, f"Tasks finished in {total:.2f}s, critical path:")
+        logger.info("\n".join(lines))
@@ -4,18 +4,23 @@ across the library. These functions are based on library demands and are
 not aimed to cover some general use-cases or specific corner cases.
 """
 import json
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
 from pathlib import Path
 
 from SCAutolib import (run, logger, TEMPLATES_DIR, LIB_DUMP_USERS, LIB_DUMP_CAS,
-                       LIB_DUMP_CARDS)
+                       LIB_DUMP_CARDS, restart_sssd)
+from SCAutolib.enums import CABackend
 from SCAutolib.exceptions import SCAutolibException
 from SCAutolib.models.CA import LocalCA, BaseCA, CustomCA, IPAServerCA
 from SCAutolib.models.card import Card
 from SCAutolib.models.file import OpensslCnf, SSSDConf
+from SCAutolib.models.key_pool import generate_key
 from SCAutolib.models.user import User
 
+try:
+    import rpm
+except ImportError:
+    rpm = None
+
 
 def _check_selinux():
     """
@@ -46,47 +51,82 @@ def _gen_private_key(key_path: Path):
 
     :param key_path: path to output certificate
     """
-    # CAC specification do not specify key size specifies key size
-    # up to 2048 bits, so keys greater than 2048 bits is not supported
-    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
-
     with key_path.open("wb") as f:
-        f.write(key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.TraditionalOpenSSL,
-            encryption_algorithm=serialization.NoEncryption()))
+        f.write(generate_key())
+
 
+def _query_packages(packages) -> dict:
+    """
+    Query the RPM database for given packages in one pass. The ``rpm`` Python
+    bindings are used when available, otherwise single ``rpm -q`` command is
+    executed for all packages.
 
-def _install_packages(packages):
+    :param packages: list of package names
+    :type packages: list
+    :return: dictionary with installed version (NEVRA) of each package or None
+        if the package is not installed
+    :rtype: dict
+    """
+    result = {pkg: None for pkg in packages}
+    if not packages:
+        return result
+    if rpm is not None:
+        ts = rpm.TransactionSet()
+        for pkg in packages:
+            for header in ts.dbMatch("name", pkg):
+                result[pkg] = header[rpm.RPMTAG_NEVRA]
+        return result
+
+    # Return code is the number of packages that are not installed. Lines for
+    # missing packages are printed without the query format
+    out = run(["rpm", "-q", "--queryformat", "%{NAME} %{NEVRA}\n", *packages],
+              check=False, print_=False)
+    for line in out.stdout.splitlines():
+        name, _, nevra = line.partition(" ")
+        if name in result and nevra:
+            result[name] = nevra
+    return result
+
+
+def _install_packages(packages, cache: dict = None):
     """
     Install given packages and log package version
 
     :param packages: list of packages to be installed
+    :param cache: dictionary with results of previous package queries that is
+        updated with versions of installed packages
+    :type cache: dict
     """
     run(f"dnf install -y {' '.join(packages)}")
-    for pkg in packages:
-        pkg = run(["rpm", "-q", pkg]).stdout
+    installed = _query_packages(packages)
+    for pkg in installed.values():
         logger.debug(f"Package {pkg} is installed")
+    if cache is not None:
+        cache.update(installed)
 
 
-def _check_packages(packages):
+def _check_packages(packages, cache: dict = None):
     """
     Find missing packages
 
     :param packages: list of required packages
     :type packages: list
+    :param cache: dictionary with results of previous package queries. Only
+        packages that are not in the cache are queried and the cache is updated
+        with the results.
+    :type cache: dict
     :return: list of missing packages
     """
+    cache = {} if cache is None else cache
+    cache.update(_query_packages([pkg for pkg in packages if pkg not in cache]))
     missing = []
     for pkg in packages:
-        # Return code 1 means the package is not installed
-        out = run(["rpm", "-q", pkg], return_code=[0, 1])
-        if out.returncode == 1:
+        if cache[pkg] is None:
             logger.warning(f"Package {pkg} is required for the testing, "
                            f"but is not present in the system")
             missing.append(pkg)
         else:
-            logger.debug(f"Package {out.stdout.strip()} is present")
+            logger.debug(f"Package {cache[pkg]} is present")
     return missing
 
 
@@ -146,7 +186,7 @@ def load_token(card_name: str = None, update_sssd: bool = False):
                       value=f"<SUBJECT>.*CN={card.CN}.*")
         sssd_conf.save()
         run(["sss_cache", "-E"])
-        run(["systemctl", "restart", "sssd"])
+        restart_sssd()
     return card
 
 
@@ -177,7 +217,7 @@ def ipa_factory():
 
 def ca_factory(path: Path = None, cnf: OpensslCnf = None,
                card_data: dict = None, ca_name: str = None,
-               create: bool = False):
+               create: bool = False, backend: CABackend = CABackend.openssl):
     """
     Create CA object. If certain CA object was created in previous run of
     SCAutolib and it was serialized and saved in .json file, then such CA object
@@ -197,6 +237,8 @@ def ca_factory(path: Path = None, cnf: OpensslCnf = None,
     :param create: indicator to create new CA. If it's false existing CA files
         will be loaded
     :type create: bool
+    :param backend: engine used by new local CA for issuing certificates
+    :type backend: SCAutolib.enums.CABackend
     :return: CA object
     :rtype: SCAutolib.models.CA object
     """
@@ -208,5 +250,5 @@ def ca_factory(path: Path = None, cnf: OpensslCnf = None,
         ca = CustomCA(card_data)
         return ca
     else:                   # create new CA object for virtual card
-        ca = LocalCA(root_dir=path, cnf=cnf)
+        ca = LocalCA(root_dir=path, cnf=cnf, backend=backend)
         return ca
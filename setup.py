@@ -45,7 +45,9 @@ setup(
     python_requires='>=3',
     install_requires=reqs,
     extras_require={
-        'graphical': graphical_reqs
+        'graphical': graphical_reqs,
+        # Faster OCR, requires tesseract-devel package for building
+        'tesserocr': graphical_reqs + ['tesserocr'],
     },
     include_package_data=True,
     tests_require=["pytest", "pytest-env"],
@@ -1,14 +1,18 @@
 import pytest
 import python_freeipa
+import threading
+import time
 from cryptography import x509
+from cryptography.hazmat.primitives import serialization
 from pathlib import Path
 from python_freeipa.client_meta import ClientMeta
 from random import randint
 from shutil import copyfile
-from subprocess import check_output
+from subprocess import CalledProcessError, check_output
 
 import SCAutolib.exceptions
 from SCAutolib import TEMPLATES_DIR
+from SCAutolib.enums import CABackend
 from SCAutolib.models import CA
 from SCAutolib.models.file import OpensslCnf
 
@@ -125,6 +129,317 @@ def test_revoke_cert(local_ca_fixture, tmpdir):
     assert revoked_cert is not None
 
 
+def test_cryptography_backend(tmpdir):
+    root = Path(tmpdir, "ca")
+    root.mkdir()
+    cnf = OpensslCnf(conf_type="CA", filepath=root.joinpath("ca.cnf"),
+                     replace=str(root))
+    cnf.create()
+    cnf.save()
+    ca = CA.LocalCA(root, cnf, backend=CABackend.cryptography)
+    ca.setup()
+
+    username = "username2"
+    csr = Path(tmpdir, f"{username}.csr")
+    cmd = ['openssl', 'req', '-new', '-nodes', '-newkey', 'rsa:2048',
+           '-keyout', f'{tmpdir}/{username}.key', '-out', csr,
+           '-subj', f'/O=Example/CN={username}']
+    check_output(cmd, encoding="utf-8")
+
+    cert = ca.request_cert(csr, username)
+    with cert.open("rb") as f:
+        cert_obj = x509.load_pem_x509_certificate(f.read())
+    with ca.cert.open("rb") as f:
+        cert_obj.verify_directly_issued_by(
+            x509.load_pem_x509_certificate(f.read()))
+
+    with ca._index.open() as f:
+        entry = f.read().strip().split("\t")
+    assert entry[0] == "V"
+    assert entry[3] == "01"
+    assert entry[5] == f"/O=Example/CN={username}"
+    assert root.joinpath("newcerts", "01.pem").exists()
+    with ca._serial.open() as f:
+        assert f.read().strip() == "02"
+
+    # Database has to stay usable by openssl ca
+    ca.revoke_cert(cert)
+    with open(ca._crl, "rb") as f:
+        crl = x509.load_pem_x509_crl(f.read())
+    assert crl.get_revoked_certificate_by_serial_number(1) is not None
+
+
+def test_cryptography_backend_openssl_compat(tmpdir):
+    root = Path(tmpdir, "ca")
+    root.mkdir()
+    cnf = OpensslCnf(conf_type="CA", filepath=root.joinpath("ca.cnf"),
+                     replace=str(root))
+    cnf.create()
+    cnf.save()
+    ca = CA.LocalCA(root, cnf, backend=CABackend.cryptography)
+    ca.setup()
+
+    csrs = []
+    for name, subj in (("user", "/L=Brno/O=Example/CN=\u017elu\u0165/"
+                                "emailAddress=user@example.com"),
+                       ("again", "/O=Example/CN=\u017elu\u0165"),
+                       ("nocn", "/O=Example/OU=Example Test")):
+        csr = Path(tmpdir, f"{name}.csr")
+        check_output(['openssl', 'req', '-new', '-nodes', '-newkey',
+                      'rsa:2048', '-keyout', f'{tmpdir}/{name}.key', '-out',
+                      csr, '-utf8', '-subj', subj], encoding="utf-8")
+        csrs.append(csr)
+
+    cert, again, nocn = ca.request_certs(
+        [(csrs[0], "user", None), (csrs[1], "again", None),
+         (csrs[2], "nocn", None)])
+    # Subject is built by the policy of the CA: fields not in the policy
+    # are dropped and email is not in DN
+    subject = check_output(['openssl', 'x509', '-in', cert, '-noout',
+                            '-subject', '-nameopt', 'compat'],
+                           encoding="utf-8").strip()
+    assert subject == "subject=/O=Example/CN=\\xC5\\xBElu\\xC5\\xA5"
+    with ca._index.open() as f:
+        assert f.read().split("\t")[5].strip() == subject[len("subject="):]
+    # Subject is unique in the database
+    assert isinstance(again, Exception)
+    assert isinstance(nocn, Exception)
+
+    # openssl finds the certificate issued by the engine
+    cmd = ['openssl', 'ca', '-config', cnf.path, '-batch']
+    with pytest.raises(CalledProcessError):
+        check_output(cmd + ['-keyfile', ca._ca_key, '-in', csrs[1],
+                            '-out', Path(tmpdir, "again.pem")])
+    check_output(cmd + ['-revoke', cert])
+    with pytest.raises(CalledProcessError):
+        check_output(cmd + ['-revoke', cert])
+    check_output(cmd + ['-gencrl', '-out', ca._crl])
+    with open(ca._crl, "rb") as f:
+        crl = x509.load_pem_x509_crl(f.read())
+    assert crl.get_revoked_certificate_by_serial_number(1) is not None
+    with ca.cert.open("rb") as f:
+        assert x509.load_pem_x509_certificate(f.read()).serial_number == 0
+
+
+@pytest.mark.parametrize("backend", [CABackend.openssl,
+                                     CABackend.cryptography])
+def test_request_certs(tmpdir, backend):
+    root = Path(tmpdir, "ca")
+    root.mkdir()
+    cnf = OpensslCnf(conf_type="CA", filepath=root.joinpath("ca.cnf"),
+                     replace=str(root))
+    cnf.create()
+    cnf.save()
+    ca = CA.LocalCA(root, cnf, backend=backend)
+    ca.setup()
+
+    batch = []
+    for username in ("batch-user-1", "batch-user-2"):
+        csr = Path(tmpdir, f"{username}.csr")
+        cmd = ['openssl', 'req', '-new', '-nodes', '-newkey', 'rsa:2048',
+               '-keyout', f'{tmpdir}/{username}.key', '-out', csr,
+               '-subj', f'/CN={username}']
+        check_output(cmd, encoding="utf-8")
+        batch.append((csr, username, None))
+    batch.append((Path(tmpdir, "missing.csr"), "missing", None))
+
+    results = ca.request_certs(batch)
+
+    assert isinstance(results[2], FileNotFoundError)
+    for (_, username, _), cert in zip(batch, results[:2]):
+        with cert.open("rb") as f:
+            cert_obj = x509.load_pem_x509_certificate(f.read())
+        assert cert_obj.subject.rfc4514_string() == f"CN={username}"
+    with ca._index.open() as f:
+        assert len(f.readlines()) == 2
+
+
+@pytest.mark.parametrize("backend", [CABackend.openssl,
+                                     CABackend.cryptography])
+def test_request_certs_keys(tmpdir, backend):
+    root = Path(tmpdir, "ca")
+    root.mkdir()
+    cnf = OpensslCnf(conf_type="CA", filepath=root.joinpath("ca.cnf"),
+                     replace=str(root))
+    cnf.create()
+    cnf.save()
+    ca = CA.LocalCA(root, cnf, backend=backend)
+    ca.setup()
+
+    batch = []
+    keys = []
+    # CSR without common name is refused by the policy of the CA
+    for n, subj in enumerate(["/CN=user-0", "/CN=user-1", "/O=Example",
+                              "/CN=user-3", "/CN=user-4"]):
+        key = Path(tmpdir, f"{n}.key")
+        csr = check_output(['openssl', 'req', '-new', '-nodes', '-newkey',
+                            'rsa:2048', '-keyout', key, '-subj', subj])
+        with key.open("rb") as f:
+            keys.append(serialization.load_pem_private_key(f.read(), None))
+        # CSRs are given both as files and in memory
+        if n % 2:
+            csr_path = Path(tmpdir, f"{n}.csr")
+            csr_path.write_bytes(csr)
+            csr = csr_path
+        batch.append((csr, f"user-{n}", None))
+
+    results = ca.request_certs(batch)
+
+    assert isinstance(results[2], Exception)
+    for n, cert in enumerate(results):
+        if n == 2:
+            continue
+        with cert.open("rb") as f:
+            cert_obj = x509.load_pem_x509_certificate(f.read())
+        assert cert_obj.public_key() == keys[n].public_key()
+        assert cert_obj.subject.rfc4514_string() == f"CN=user-{n}"
+
+
+@pytest.mark.parametrize("backend", [CABackend.openssl,
+                                     CABackend.cryptography])
+def test_revoke_certs(tmpdir, backend):
+    root = Path(tmpdir, "ca")
+    root.mkdir()
+    cnf = OpensslCnf(conf_type="CA", filepath=root.joinpath("ca.cnf"),
+                     replace=str(root))
+    cnf.create()
+    cnf.save()
+    ca = CA.LocalCA(root, cnf, backend=backend)
+    ca.setup()
+
+    batch = []
+    for username in ("revoked-user-1", "revoked-user-2"):
+        csr = Path(tmpdir, f"{username}.csr")
+        cmd = ['openssl', 'req', '-new', '-nodes', '-newkey', 'rsa:2048',
+               '-keyout', f'{tmpdir}/{username}.key', '-out', csr,
+               '-subj', f'/CN={username}']
+        check_output(cmd, encoding="utf-8")
+        batch.append((csr, username, None))
+    certs = ca.request_certs(batch)
+    # Issuing changes the CA database too
+    assert ca.crl_outdated
+    ca.update_crl()
+
+    # Revocations are recorded to the database, CRL is updated on demand
+    assert ca.revoke_certs(certs, update_crl=False) == [None, None]
+    with ca._index.open() as f:
+        assert [line.split("\t")[0] for line in f] == ["R", "R"]
+    assert ca.crl_outdated
+
+    ca.update_crl()
+    assert not ca.crl_outdated
+    with open(ca._crl, "rb") as f:
+        crl = x509.load_pem_x509_crl(f.read())
+    assert len(crl) == 2
+
+    results = ca.revoke_certs(certs[:1])
+    assert isinstance(results[0], Exception)
+
+
+def test_batch_keeps_groups(monkeypatch):
+    chunks = []
+
+    class Client:
+        def batch(self, a_methods):
+            chunks.append([m["method"] for m in a_methods])
+            return {"results": [{"result": m["method"]} for m in a_methods]}
+
+    server = CA.IPAServerCA.__new__(CA.IPAServerCA)
+    server.meta_client = Client()
+    monkeypatch.setattr(server, "batch_size", 5)
+    methods = [{"method": f"{name}-{i}", "params": [[], {}]}
+               for i in range(4) for name in ("add", "mod")]
+
+    results = server.batch(methods, group=2)
+
+    # Chunks are smaller than batch_size, so pairs are not split
+    assert sorted(chunks) == [["add-0", "mod-0", "add-1", "mod-1"],
+                              ["add-2", "mod-2", "add-3", "mod-3"]]
+    assert [r["result"] for r in results] == [m["method"] for m in methods]
+    with pytest.raises(ValueError):
+        server.batch(methods[:3], group=2)
+
+
+def test_batch_concurrent_chunks(monkeypatch):
+    """Test that chunks are sent concurrently, at most max_requests at the
+    same time, and results are in the order of the commands even if the
+    chunks are finished in a different order."""
+    lock = threading.Lock()
+    active = [0]
+    most_active = []
+    # Two requests have to be sent at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=10)
+    finished = []
+
+    class Client:
+        def batch(self, a_methods):
+            with lock:
+                active[0] += 1
+                most_active.append(active[0])
+            first = int(a_methods[0]["method"])
+            barrier.wait()
+            # Earlier chunks are finished later
+            time.sleep(0.05 if first % 6 == 0 else 0)
+            with lock:
+                active[0] -= 1
+                finished.append(first)
+            return {"results": [{"result": m["method"]} for m in a_methods]}
+
+    server = CA.IPAServerCA.__new__(CA.IPAServerCA)
+    server.meta_client = Client()
+    monkeypatch.setattr(server, "batch_size", 3)
+    monkeypatch.setattr(server, "max_requests", 2)
+    methods = [{"method": str(i), "params": [[], {}]} for i in range(11)]
+
+    results = server.batch(methods)
+
+    assert [r["result"] for r in results] == [m["method"] for m in methods]
+    assert max(most_active) == 2
+    assert finished == [3, 0, 9, 6]
+
+
+def test_revoke_certs_errors(tmp_path):
+    """Test that results of IPA batch are mapped to serial numbers of revoked
+    certificates and to exceptions by IPA error codes."""
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from datetime import datetime, timedelta, timezone
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(x509.NameOID.COMMON_NAME, "test")])
+    now = datetime.now(timezone.utc)
+    certs = []
+    for serial in (10, 11, 12):
+        cert = x509.CertificateBuilder().subject_name(name) \
+            .issuer_name(name).public_key(key.public_key()) \
+            .serial_number(serial).not_valid_before(now) \
+            .not_valid_after(now + timedelta(days=1)) \
+            .sign(key, hashes.SHA256())
+        path = tmp_path.joinpath(f"{serial}.pem")
+        path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+        certs.append(path)
+    sent = []
+
+    class Client:
+        def batch(self, a_methods):
+            sent.extend(a_methods)
+            return {"results": [
+                {"result": {"revoked": True}},
+                {"error": "certificate not found", "error_code": 4001},
+                {"error": "unknown", "error_code": 9999}]}
+
+    server = CA.IPAServerCA.__new__(CA.IPAServerCA)
+    server.meta_client = Client()
+
+    results = server.revoke_certs(certs)
+
+    assert sent == [{"method": "cert_revoke", "params": [[serial], {}]}
+                    for serial in (10, 11, 12)]
+    assert results[0] == 10
+    assert isinstance(results[1], python_freeipa.exceptions.NotFound)
+    assert isinstance(results[2], python_freeipa.exceptions.BadRequest)
+
+
 @pytest.mark.skip(reason="ipa server not available for tests")
 @pytest.mark.ipa
 def test_ipa_server_setup(ipa_config, ipa_meta_client, caplog):
@@ -1,12 +1,13 @@
 import pytest
+from cryptography import x509
 from pathlib import Path
 from subprocess import check_output, run
 from time import sleep
 
-from SCAutolib.models.card import Card
-from SCAutolib.models.file import SoftHSM2Conf
+from SCAutolib.models.card import Card, VirtualCard
+from SCAutolib.models.file import SoftHSM2Conf, OpensslCnf
 from SCAutolib.models.user import User
-from SCAutolib.utils import dump_to_json
+from SCAutolib.utils import dump_to_json, _gen_private_key
 
 
 @pytest.fixture()
@@ -46,6 +47,48 @@ def local_user_with_smart_card(local_user, gen_key_and_cert):
         local_user.card.service_location.unlink()
 
 
+@pytest.mark.parametrize("edit", [
+    None,
+    # Changes of the CNF file are reflected in the CSR
+    ("OU = Example Test", "OU = Other Unit\n1.OU = Second Unit"),
+    ("email:", "DNS:host.example.com, email:"),
+    # Extension not supported in memory is created by openssl req
+    ("basicConstraints", "certificatePolicies = 1.2.3.4\nbasicConstraints"),
+])
+def test_gen_csr_matches_user_cnf(local_user, tmp_path, edit):
+    card = VirtualCard({"name": "csr-card", "pin": "123456",
+                        "cardholder": local_user.username,
+                        "card_type": "virtual", "CN": "csr-cn",
+                        "ca_name": "local_ca"}, card_dir=tmp_path)
+    card.user = local_user
+    _gen_private_key(card.key)
+
+    cnf = OpensslCnf(tmp_path.joinpath("user.cnf"), "user",
+                     [card.cardholder, card.CN])
+    cnf.create()
+    cnf.save()
+    if edit is not None:
+        content = cnf.path.read_text()
+        assert edit[0] in content
+        cnf.path.write_text(content.replace(edit[0], edit[1], 1))
+        card.cnf = cnf.path
+    expected = tmp_path.joinpath("expected.csr")
+    check_output(["openssl", "req", "-new", "-nodes", "-key", card.key,
+                  "-reqexts", "req_exts", "-config", cnf.path,
+                  "-out", expected], encoding="utf-8")
+    with expected.open("rb") as f:
+        expected = x509.load_pem_x509_csr(f.read())
+
+    csr = x509.load_pem_x509_csr(card.gen_csr(write=False))
+
+    assert not tmp_path.joinpath(f"csr-{card.cardholder}.csr").exists()
+    assert csr.subject == expected.subject
+    assert [(e.oid, e.critical, e.value.public_bytes())
+            for e in csr.extensions] == \
+        [(e.oid, e.critical, e.value.public_bytes())
+         for e in expected.extensions]
+
+
 @pytest.mark.skip(reason="need to be fixed for compatibility with V3")
 @pytest.mark.service_restart
 def test_create_and_enroll(local_user_with_smart_card):
@@ -1,5 +1,6 @@
 import json
 import pytest
+import sys
 from click.testing import CliRunner
 from pwd import getpwnam
 from subprocess import run
@@ -70,3 +71,29 @@ def test_setup_ca(runner, dummy_config, ca_type, clean_ipa, ipa_config):
 
     print(result.stdout)
     assert result.exit_code == ReturnCode.SUCCESS.value
+
+
+def test_prepare_jobs_option(runner, dummy_config):
+    """Test that the prepare command accepts a number of parallel jobs."""
+    result = runner.invoke(cli_cmd.cli, ["--conf", dummy_config,
+                                         "prepare", "--jobs", "0"])
+    assert result.exit_code == 2
+    assert "--jobs" in result.output
+
+
+def test_cli_startup_is_lazy():
+    """Test that the CLI starts without loading heavy dependencies and within
+    the time budget."""
+    heavy = ["python_freeipa", "cryptography", "fabric", "paramiko", "cv2",
+             "numpy", "pandas", "pytesseract"]
+    code = ("import sys, time\n"
+            "start = time.monotonic()\n"
+            "import SCAutolib.cli_commands, SCAutolib.controller\n"
+            "print(time.monotonic() - start)\n"
+            f"print(' '.join(m for m in {heavy} if m in sys.modules))\n")
+    # Fresh interpreter, so modules imported by other tests don't count
+    result = run([sys.executable, "-c", code], capture_output=True,
+                 text=True, check=True)
+    elapsed, loaded = result.stdout.split("\n")[:2]
+    assert loaded == ""
+    assert float(elapsed) < 1.0
@@ -1,7 +1,12 @@
 import pytest
 from subprocess import check_output
+from types import SimpleNamespace
 
+from SCAutolib import controller as controller_module
 from SCAutolib.controller import Controller
+from SCAutolib.enums import UserType
+from SCAutolib.models import CA, user
+from SCAutolib.models.journal import StepJournal
 
 
 @pytest.fixture()
@@ -31,3 +36,144 @@ def test_setup_system(controller):
     for p in packages:
         out = check_output(["rpm", "-qa", p], encoding="utf-8")
         assert p in out
+
+
+@pytest.fixture()
+def system(tmp_path, monkeypatch):
+    """Replace everything what setup steps change on the system by stand-ins
+    working in tmp_path. Side effects done by the steps are listed in calls,
+    users contains names of the local users present on the system."""
+    calls = []
+    sssd_conf = tmp_path.joinpath("sssd.conf")
+    system_file = tmp_path.joinpath("pcscd.service")
+    default_conf = tmp_path.joinpath("default.conf")
+    users = set()
+
+    class SSSDConf:
+        def create(self):
+            sssd_conf.write_text("[sssd]\ndomains = shadowutils\n")
+
+        def save(self):
+            calls.append("sssd.conf")
+
+        def update_default_content(self):
+            pass
+
+        def set(self, key, value, section):
+            sssd_conf.write_text(f"[{section}]\n{key} = {value}\n")
+
+    def virtual_sc():
+        system_file.write_text("[Service]")
+        calls.append("virtual_sc")
+
+    def ipa_setup(self):
+        default_conf.write_text("[global]")
+        calls.append("ipa-client-install")
+
+    def add_user(self):
+        users.add(self.username)
+        calls.append(f"useradd {self.username}")
+
+    def getpwnam(name):
+        if name not in users:
+            raise KeyError(name)
+
+    monkeypatch.setattr(controller_module, "run",
+                        lambda *args, **kwargs: calls.append(args))
+    monkeypatch.setattr(controller_module, "_check_packages",
+                        lambda packages, cache: [])
+    monkeypatch.setattr(controller_module, "LIB_DUMP_CAS", tmp_path)
+    monkeypatch.setattr(controller_module, "LIB_DUMP_USERS", tmp_path)
+    monkeypatch.setattr(user, "LIB_DUMP_USERS", tmp_path)
+    monkeypatch.setattr(Controller, "sssd_conf", SSSDConf())
+    monkeypatch.setattr(Controller, "_sssd_conf_file", sssd_conf)
+    monkeypatch.setattr(Controller, "_system_files", (system_file,))
+    monkeypatch.setattr(Controller, "_ipa_default_conf", default_conf)
+    monkeypatch.setattr(Controller, "_general_steps_for_virtual_sc",
+                        staticmethod(virtual_sc))
+    monkeypatch.setattr(CA, "get_session", lambda *args: None)
+    monkeypatch.setattr(CA.IPAServerCA, "_add_to_hosts", lambda self: None)
+    monkeypatch.setattr(CA.IPAServerCA, "is_installed",
+                        property(lambda self: False))
+    monkeypatch.setattr(CA.IPAServerCA, "setup", ipa_setup)
+    monkeypatch.setattr(CA.IPAServerCA, "dump_file",
+                        tmp_path.joinpath("ipa-server.json"))
+    monkeypatch.setattr(user.User, "add_user", add_user)
+    monkeypatch.setattr(controller_module.pwd, "getpwnam", getpwnam)
+    return SimpleNamespace(calls=calls, users=users)
+
+
+def test_setup_steps_are_skipped_on_second_run(dummy_config, tmp_path,
+                                               system):
+    """Test that setup steps executed again by a new process do nothing,
+    unless their inputs are changed."""
+    def run_steps():
+        cnt = Controller(dummy_config)
+        cnt.journal = StepJournal(tmp_path.joinpath("journal.json"))
+        system.calls.clear()
+        cnt.setup_system(install_missing=False, gdm=False, graphical=False)
+        cnt.setup_ipa_client()
+        return list(system.calls)
+
+    calls = run_steps()
+    assert "virtual_sc" in calls
+    assert calls.count("ipa-client-install") == 1
+    assert run_steps() == []
+
+    # Re-created sssd.conf without IPA domain requires IPA client setup again
+    Controller._sssd_conf_file.write_text("[sssd]\ndomains = shadowutils\n")
+    assert run_steps() == ["ipa-client-install"]
+    assert run_steps() == []
+
+
+def test_setup_user_removed_from_system(dummy_config, tmp_path, system):
+    """Test that the local user is added again when it was removed from the
+    system after it was set up."""
+    cnt = Controller(dummy_config)
+    cnt.journal = StepJournal(tmp_path.joinpath("journal.json"))
+    user_dict = cnt.lib_conf["users"][0]
+
+    cnt.setup_user(user_dict)
+    assert system.calls == ["useradd local-user"]
+
+    system.calls.clear()
+    cnt.setup_user(user_dict)
+    assert system.calls == []
+
+    system.users.remove("local-user")
+    cnt.setup_user(user_dict)
+    assert system.calls == ["useradd local-user"]
+
+
+def test_revoke_card_certs_failures(controller, tmp_path):
+    """Test that certificates not revoked by the CAs are reported, while the
+    other certificates are revoked."""
+    def card(name, user_type):
+        cert = tmp_path.joinpath(f"{name}.pem")
+        cert.write_text(name)
+        return SimpleNamespace(cert=cert,
+                               user=SimpleNamespace(user_type=user_type))
+
+    cards = [card("ipa-ok", UserType.ipa), card("ipa-bad", UserType.ipa),
+             card("local-ok", UserType.local),
+             card("local-bad", UserType.local),
+             SimpleNamespace(cert=tmp_path.joinpath("missing.pem"),
+                             user=SimpleNamespace(user_type=UserType.local))]
+    revoked = []
+
+    def revoke(success):
+        def revoke_certs(certs, **kwargs):
+            revoked.extend((cert.stem, kwargs) for cert in certs)
+            return [ValueError("failed") if "bad" in cert.stem else success
+                    for cert in certs]
+        return revoke_certs
+
+    # IPA returns serial numbers of revoked certificates, local CA None
+    controller.ipa_ca = SimpleNamespace(revoke_certs=revoke(1))
+    controller.local_ca = SimpleNamespace(revoke_certs=revoke(None))
+
+    assert controller._revoke_card_certs(cards) == [cards[1].cert,
+                                                    cards[3].cert]
+    assert revoked == [("ipa-ok", {}), ("ipa-bad", {}),
+                       ("local-ok", {"update_crl": False}),
+                       ("local-bad", {"update_crl": False})]
@@ -0,0 +1,501 @@
+import io
+import json
+import sys
+from unittest import mock
+
+import pytest
+
+# Devices and OCR are not available in CI, GUI module only needs them to be
+# importable
+for module in ("keyboard", "uinput", "pytesseract"):
+    sys.modules.setdefault(module, mock.MagicMock())
+pytest.importorskip("cv2")
+pytest.importorskip("pandas")
+
+from SCAutolib.models import gui  # noqa: E402
+
+
+def test_ocr_engine_fallback(monkeypatch):
+    monkeypatch.setattr(gui, "_ocr_engine", None)
+    monkeypatch.setattr(gui, "tesserocr", None)
+
+    engine = gui.get_ocr_engine()
+
+    assert isinstance(engine, gui.PytesseractEngine)
+    assert gui.get_ocr_engine() is engine
+
+
+def test_ocr_engine_tesserocr(monkeypatch):
+    tesserocr = mock.MagicMock()
+    monkeypatch.setattr(gui, "_ocr_engine", None)
+    monkeypatch.setattr(gui, "tesserocr", tesserocr)
+
+    engine = gui.get_ocr_engine()
+    assert isinstance(engine, gui.TesserocrEngine)
+    # Language model is loaded only once for all images
+    assert gui.get_ocr_engine() is engine
+    tesserocr.PyTessBaseAPI.assert_called_once_with(lang="eng")
+
+    gui.set_ocr_engine(gui.PytesseractEngine())
+    tesserocr.PyTessBaseAPI.return_value.End.assert_called_once()
+
+
+class FakeProcess:
+    """ffmpeg process writing given raw frames of 40x20 pixels."""
+
+    def __init__(self, frames):
+        self.stderr = io.BytesIO(
+            b"Input #0, kmsgrab, from '-':\n"
+            b"Output #0, rawvideo, to 'pipe:1':\n"
+            b"  Stream #0:0: Video: rawvideo (BGR[0] / 0x30524742), bgr0, "
+            b"40x20, q=2-31\n")
+        self.stdout = io.BytesIO(b"".join(f.tobytes() for f in frames))
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        self.returncode = 0
+        return self.returncode
+
+    def terminate(self):
+        self.returncode = -15
+
+
+def test_frame_stream(monkeypatch):
+    frames = [gui.np.full((20, 40, 4), n, gui.np.uint8) for n in range(3)]
+    commands = []
+
+    def popen(cmd, **kwargs):
+        commands.append(cmd)
+        return FakeProcess(frames)
+
+    monkeypatch.setattr(gui.subprocess, "Popen", popen)
+    stream = gui.FrameStream()
+    stream.start()
+
+    # Whole output is read, the latest frame is kept without alpha channel
+    with pytest.raises(Exception, match="ffmpeg exited with 0"):
+        stream.frame(timeout=5)
+    frame = stream.frame(newer=False)
+    assert frame.shape == (20, 40, 3)
+    assert (frame == 2).all()
+    assert not stream.running
+
+    stream.stop()
+    assert commands == [gui.FrameStream.cmd]
+
+
+class FakeEngine(gui.OCREngine):
+    """Finds single word in the top left tenth of each image."""
+
+    def __init__(self):
+        self.images = []
+
+    def image_to_data(self, image):
+        self.images.append(image)
+        height, width = image.shape[:2]
+        return gui.pd.DataFrame([
+            {"level": 1, "page_num": 1, "block_num": 0, "par_num": 0,
+             "line_num": 0, "word_num": 0, "left": 0, "top": 0,
+             "width": width, "height": height, "conf": -1, "text": None},
+            {"level": 5, "page_num": 1, "block_num": 1, "par_num": 1,
+             "line_num": 1, "word_num": 1, "left": 0, "top": 0,
+             "width": width / 10, "height": height / 10, "conf": 90,
+             "text": f"word{len(self.images)}"},
+        ])
+
+
+@pytest.fixture()
+def engine(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(gui, "_ocr_engine", engine)
+    return engine
+
+
+def test_image_to_data_region(engine):
+    frame = gui.np.zeros((200, 400, 3), gui.np.uint8)
+
+    df = gui.image_to_data(frame, (0.5, 0.25, 1, 0.75))
+
+    # Only the region upscaled twice is recognized
+    assert engine.images[0].shape == (200, 400)
+    word = df.dropna(subset=["text"]).iloc[0]
+    assert (word.left, word.top, word.width, word.height) == \
+        pytest.approx((0.5, 0.25, 0.05, 0.05))
+
+
+def test_ocr_reader_cache(engine):
+    reader = gui.OCRReader()
+    frame = gui.np.zeros((200, 400, 3), gui.np.uint8)
+
+    df = reader.read(frame)
+    assert reader.read(frame.copy()) is df
+    assert len(engine.images) == 1
+    # Region is recognized separately from the whole screen
+    reader.read(frame, "center")
+    assert len(engine.images) == 2
+
+
+def test_ocr_reader_changed_area(engine):
+    reader = gui.OCRReader()
+    frame = gui.np.zeros((200, 400, 3), gui.np.uint8)
+    reader.read(frame)
+
+    changed = frame.copy()
+    changed[150:160, 300:310] = 255
+    df = reader.read(changed)
+
+    # Only the changed area with margin is recognized again
+    assert len(engine.images) == 2
+    assert engine.images[1].shape == (2 * 26, 2 * 26)
+    boxes = {w.text: (w.left, w.top, w.width, w.height)
+             for w in df.dropna(subset=["text"]).itertuples()}
+    area = (292 / 400, 142 / 200, 26 / 400, 26 / 200)
+    assert boxes == {
+        "word1": pytest.approx((0, 0, 0.1, 0.1)),
+        "word2": pytest.approx((area[0], area[1], area[2] / 10,
+                                area[3] / 10))}
+
+    reader.read(frame)
+    reader.read(changed)
+    assert len(engine.images) == 2
+
+
+def test_ocr_reader_big_change(engine):
+    reader = gui.OCRReader()
+    frame = gui.np.zeros((200, 400, 3), gui.np.uint8)
+    reader.read(frame)
+
+    changed = frame.copy()
+    changed[50:150, 20:380] = 255
+    reader.read(changed)
+
+    assert engine.images[1].shape == engine.images[0].shape
+
+
+@pytest.fixture()
+def frame():
+    rng = gui.np.random.default_rng(0)
+    return rng.integers(0, 255, (240, 320, 3), dtype=gui.np.uint8)
+
+
+def test_changed_tiles(frame):
+    other = frame.copy()
+    other[40, 70] += 1
+
+    changed = gui.changed_tiles(frame, other, tile=32)
+
+    # Partial tiles at the bottom and right edges are included
+    assert changed.shape == (8, 10)
+    assert changed.sum() == 1
+    assert changed[1, 2]
+
+
+def test_images_equal_identical(frame):
+    assert gui.images_equal(frame, frame.copy())
+
+
+def test_images_equal_tolerance(frame):
+    other = frame.copy()
+    # Pixel that is not sampled by the fast check
+    other[33, 33] += 1
+
+    assert not gui.images_equal(frame, other)
+    assert gui.images_equal(frame, other, tolerance=1)
+
+    # Change of the second tile is above the tolerance
+    other[100:140, 200:210] = 0
+    assert not gui.images_equal(frame, other, tolerance=1)
+    assert gui.images_equal(frame, other, tolerance=3)
+
+
+def test_images_equal_shape(frame):
+    assert not gui.images_equal(frame, frame[:200])
+
+
+def test_images_equal_paths(frame, tmp_path):
+    path = tmp_path.joinpath("frame.png")
+    gui.cv2.imwrite(str(path), frame)
+    other = frame.copy()
+    other[0, 0] += 1
+
+    assert gui.images_equal(path, frame)
+    assert gui.images_equal(str(path), path)
+    assert not gui.images_equal(path, other)
+
+
+def test_report_writer(tmp_path):
+    html = tmp_path.joinpath("report.html")
+    writer = gui.ReportWriter(str(html), thumbnail="jpg")
+    image = gui.np.full((20, 40, 3), 128, gui.np.uint8)
+
+    writer.write("<h1>start</h1>\n")
+    for number in range(1, 4):
+        writer.add_image(str(tmp_path.joinpath(f"{number}.png")), image,
+                         f"screenshot number {number}")
+        writer.write(f"<p>step {number}</p>\n")
+    writer.flush()
+
+    # Items are written in the order they were added
+    content = html.read_text()
+    positions = [content.index(text) for text in (
+        "start", "1.png", "step 1", "2.png", "step 2", "3.png", "step 3")]
+    assert positions == sorted(positions)
+    assert '<a href="1.png"><img src="1_thumb.jpg"' in content
+    for number in range(1, 4):
+        stored = gui.cv2.imread(str(tmp_path.joinpath(f"{number}.png")))
+        assert (stored == image).all()
+        assert gui.cv2.imread(
+            str(tmp_path.joinpath(f"{number}_thumb.jpg"))).shape == \
+            (10, 20, 3)
+
+    writer.close()
+    assert not writer._thread.is_alive()
+    # Items added after closing are written immediately
+    writer.write("<p>end</p>\n")
+    writer.add_image(str(tmp_path.joinpath("4.png")), image)
+    assert html.read_text().endswith(
+        '<p>end</p>\n<a href="4.png"><img src="4_thumb.jpg" alt=""></a>')
+    assert tmp_path.joinpath("4.png").exists()
+
+
+def test_report_handler(tmp_path):
+    html = tmp_path.joinpath("report.html")
+    writer = gui.ReportWriter(str(html))
+    logger = gui.logging.getLogger("test_report_handler")
+    logger.addHandler(gui.ReportHandler(writer))
+
+    logger.warning("first")
+    logger.warning("second")
+    writer.close()
+
+    assert html.read_text() == "first\nsecond\n"
+
+
+def test_screenshot_numbering(tmp_path):
+    for name in ("1.png", "1_thumb.webp", "2.png", "2_thumb.jpg",
+                 "capture.png", "report.html"):
+        tmp_path.joinpath(name).touch()
+
+    screen = gui.Screen(str(tmp_path))
+
+    assert screen.screenshot_num == 3
+
+
+def test_screenshot_numbering_empty(tmp_path):
+    assert gui.Screen(str(tmp_path)).screenshot_num == 1
+
+
+class FakeStream:
+    running = True
+
+    def __init__(self):
+        self.position = 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self.running = False
+
+    def timed_frame(self, timeout=30, newer=True):
+        self.position += 1.25
+        return gui.np.zeros((20, 40, 3), gui.np.uint8), self.position
+
+
+def test_recording_index(tmp_path, monkeypatch):
+    commands = []
+    monkeypatch.setattr(gui, "run",
+                        lambda cmd, **kwargs: commands.append(cmd))
+    video = tmp_path.joinpath("recording.webm")
+    screen = gui.Screen(str(tmp_path), record=video)
+    screen.stream = FakeStream()
+    screen.start()
+
+    frame = screen.capture()
+    screen.capture()
+    # Captured frame is marked at the time it was captured
+    assert screen.save(frame) == f"{video}#t=1.25"
+    assert screen.save(gui.np.zeros((20, 40, 3), gui.np.uint8)) == \
+        f"{video}#t=3.75"
+    screen.stop()
+
+    index = json.loads(video.with_suffix(".json").read_text())
+    assert index == {"video": "recording.webm",
+                     "screenshots": [{"number": 1, "time": 1.25},
+                                     {"number": 2, "time": 3.75}]}
+    # Screenshots are not stored as images
+    assert not list(tmp_path.glob("*.png"))
+
+    screen.extract(3.75, str(tmp_path.joinpath("2.png")))
+    assert commands[0][:6] == ["ffmpeg", "-hide_banner", "-y", "-ss",
+                               "3.750", "-i"]
+
+
+@pytest.fixture()
+def screen_frame():
+    rng = gui.np.random.default_rng(1)
+    noise = rng.integers(0, 255, (1080, 1920, 3), dtype=gui.np.uint8)
+    return gui.cv2.GaussianBlur(noise, (5, 5), 0)
+
+
+def test_template_locate(screen_frame, tmp_path):
+    gui.cv2.imwrite(str(tmp_path.joinpath("icon.png")),
+                    screen_frame[400:448, 600:664])
+    locator = gui.TemplateLocator(tmp_path)
+
+    expected = (600 / 1920, 400 / 1080, 64 / 1920, 48 / 1080)
+    assert locator.locate(screen_frame, "icon") == pytest.approx(expected)
+    assert locator.locate(screen_frame, "icon", region="center") == \
+        pytest.approx(expected)
+    # Template is outside of the region
+    assert locator.locate(screen_frame, "icon", region="top-bar") is None
+
+
+def test_template_not_found(screen_frame, tmp_path):
+    rng = gui.np.random.default_rng(2)
+    other = rng.integers(0, 255, (48, 64, 3), dtype=gui.np.uint8)
+    gui.cv2.imwrite(str(tmp_path.joinpath("icon.png")), other)
+    locator = gui.TemplateLocator(tmp_path)
+
+    assert locator.locate(screen_frame, "icon") is None
+    assert locator.locate(screen_frame, "icon", threshold=-1) is not None
+    with pytest.raises(FileNotFoundError):
+        locator.locate(screen_frame, "missing")
+
+
+def ocr_data(lines):
+    """Build OCR result from lines of (text, left, top, width, height)."""
+    rows = []
+    for line_num, words in enumerate(lines, 1):
+        for word_num, (text, left, top, width, height) in enumerate(words, 1):
+            rows.append({"block_num": 1, "par_num": 1, "line_num": line_num,
+                         "word_num": word_num, "left": left, "top": top,
+                         "width": width, "height": height, "conf": 90,
+                         "text": text})
+    # Empty rows for blocks without text are part of tesseract output
+    rows.append({"block_num": 2, "par_num": 0, "line_num": 0, "word_num": 0,
+                 "left": 0, "top": 0, "width": 1, "height": 1, "conf": -1,
+                 "text": None})
+    return gui.pd.DataFrame(rows)
+
+
+@pytest.fixture()
+def words():
+    return gui.WordIndex(ocr_data([
+        [("Log", 0.1, 0.10, 0.05, 0.02), ("in:", 0.16, 0.11, 0.04, 0.02)],
+        [("Smart", 0.1, 0.20, 0.07, 0.03), ("Card", 0.18, 0.21, 0.06, 0.03),
+         ("PIN", 0.25, 0.20, 0.05, 0.03)],
+        [("Password", 0.1, 0.30, 0.1, 0.02)],
+    ]))
+
+
+@pytest.mark.parametrize(("a", "b", "limit", "expected"), [
+    ("Password", "Password", 1, 0),
+    ("Passwerd", "Password", 1, 1),
+    ("Pasword", "Password", 1, 1),
+    ("Passwrod", "Password", 1, 2),
+    ("Pass", "Password", 2, 3),
+    ("", "PIN", 3, 3),
+])
+def test_edit_distance(a, b, limit, expected):
+    assert gui.edit_distance(a, b, limit) == expected
+
+
+def test_word_index_exact(words):
+    assert words.find("Password") == [pytest.approx((0.1, 0.30, 0.1, 0.02))]
+    # Punctuation at the end of the word is ignored
+    assert words.find("in") == [pytest.approx((0.16, 0.11, 0.04, 0.02))]
+    assert words.find("Passwor") == []
+    assert words.find("") == []
+
+
+def test_word_index_phrase(words):
+    # Box of the phrase contains boxes of all its words
+    assert words.find("Smart Card PIN") == \
+        [pytest.approx((0.1, 0.20, 0.2, 0.04))]
+    assert len(words.find("Log in:")) == 1
+    # Words of the phrase have to be on the same line in the same order
+    assert words.find("Card Smart") == []
+    assert words.find("PIN Password") == []
+
+
+def test_word_index_fuzzy(words):
+    assert words.find("Passwerd") == []
+    assert words.find("Passwerd", max_distance=1) == \
+        [pytest.approx((0.1, 0.30, 0.1, 0.02))]
+    assert words.find("Smart Cart PlN", max_distance=1) == []
+    assert len(words.find("Smart Cart PlN", max_distance=2)) == 1
+
+
+def test_word_index_case(words):
+    assert words.find("smart card") == []
+    assert len(words.find("smart card", ignore_case=True)) == 1
+    assert words.find("PASWORD", ignore_case=True) == []
+    assert len(words.find("PASWORD", max_distance=1, ignore_case=True)) == 1
+
+
+def test_ocr_reader_words(engine):
+    reader = gui.OCRReader()
+    frame = gui.np.zeros((200, 400, 3), gui.np.uint8)
+    reader.read(frame)
+    changed = frame.copy()
+    changed[150:160, 300:310] = 255
+
+    words = reader.words(changed)
+
+    # Index is built once per frame
+    assert reader.words(changed) is words
+    # Words of the partial result are not merged into lines of kept words
+    assert words.find("word1 word2") == []
+    assert len(words.find("word2")) == 1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    import SCAutolib
+
+    clock = FakeClock()
+    monkeypatch.setattr(SCAutolib, "time", clock)
+    return clock
+
+
+def test_poll_backoff(clock):
+    checks = iter([False, False, False, True])
+
+    assert gui.GUI._poll(lambda: next(checks), timeout=10)
+    # Interval between the checks is doubled
+    assert clock.sleeps == [0.2, 0.4, 0.8]
+
+
+def test_poll_timeout(clock):
+    checks = []
+
+    assert not gui.GUI._poll(lambda: checks.append(clock.now), timeout=5)
+    # Interval is limited and the last wait ends at the timeout
+    assert clock.sleeps == pytest.approx([0.2, 0.4, 0.8, 1.6, 2])
+    assert checks == pytest.approx([0, 0.2, 0.6, 1.4, 3.0, 5])
+
+
+def test_poll_without_timeout(clock):
+    checks = []
+
+    # Condition is checked at least once
+    assert not gui.GUI._poll(lambda: checks.append(clock.now), timeout=0)
+    assert checks == [0]
+    assert clock.sleeps == []
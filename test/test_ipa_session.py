@@ -0,0 +1,71 @@
+import pytest
+from python_freeipa import client_meta
+from python_freeipa.exceptions import Unauthorized
+
+from SCAutolib.models import ipa_session
+from SCAutolib.models.ipa_session import get_session, close_sessions
+
+
+class FakeClient:
+    instances = []
+
+    def __init__(self, hostname, verify_ssl=True):
+        self.hostname = hostname
+        self.logins = 0
+        self.expired = False
+        FakeClient.instances.append(self)
+
+    def login(self, username, password):
+        self.logins += 1
+        self.expired = False
+
+    def logout(self):
+        pass
+
+    def user_show(self, username):
+        if self.expired:
+            raise Unauthorized()
+        return {"result": {"uid": [username]}}
+
+
+@pytest.fixture(autouse=True)
+def fake_client(monkeypatch):
+    FakeClient.instances = []
+    monkeypatch.setattr(client_meta, "ClientMeta", FakeClient)
+    yield
+    close_sessions()
+
+
+def test_session_is_shared():
+    session = get_session("ipa.example.com", "admin", "passwd")
+
+    assert get_session("ipa.example.com", "admin", "passwd") is session
+    assert get_session("other.example.com", "admin", "passwd") is not session
+    # No login before the first use
+    assert FakeClient.instances == []
+
+    session.user_show("user")
+    get_session("ipa.example.com", "admin", "passwd").user_show("user")
+    assert len(FakeClient.instances) == 1
+    assert FakeClient.instances[0].logins == 1
+
+
+def test_session_is_renewed(monkeypatch):
+    session = get_session("ipa.example.com", "admin", "passwd")
+    session.user_show("user")
+    client = FakeClient.instances[0]
+
+    monkeypatch.setattr(ipa_session.IPASession, "lifetime", 0)
+    session.user_show("user")
+    assert client.logins == 2
+    assert len(FakeClient.instances) == 1
+
+
+def test_login_after_rejected_session():
+    session = get_session("ipa.example.com", "admin", "passwd")
+    session.user_show("user")
+    client = FakeClient.instances[0]
+
+    client.expired = True
+    assert session.user_show("user") == {"result": {"uid": ["user"]}}
+    assert client.logins == 2
@@ -0,0 +1,33 @@
+from SCAutolib.models.journal import StepJournal
+
+
+def test_step_journal(tmp_path):
+    journal_file = tmp_path.joinpath("journal.json")
+    conf = tmp_path.joinpath("some.conf")
+    conf.write_text("value")
+    section = {"dir": tmp_path, "name": "test"}
+
+    journal = StepJournal(journal_file)
+    assert not journal.done("step", section, StepJournal.state(conf))
+    journal.record("step", section, StepJournal.state(conf))
+
+    # Journal is persistent
+    journal = StepJournal(journal_file)
+    assert journal.done("step", section, StepJournal.state(conf))
+    assert not journal.done("step", {"dir": tmp_path, "name": "other"},
+                            StepJournal.state(conf))
+
+    conf.write_text("changed value")
+    assert not journal.done("step", section, StepJournal.state(conf))
+
+    journal.forget("step")
+    assert not StepJournal(journal_file).done("step", section,
+                                              StepJournal.state(conf))
+
+
+def test_directory_state(tmp_path):
+    state = StepJournal.state(tmp_path)
+    tmp_path.joinpath("file").write_text("content")
+
+    assert StepJournal.state(tmp_path) != state
+    assert StepJournal.state(tmp_path.joinpath("missing")) is None
@@ -0,0 +1,36 @@
+from cryptography.hazmat.primitives import serialization
+
+from SCAutolib.models.key_pool import KeyPool
+
+
+def test_fill(tmp_path):
+    pool = KeyPool(tmp_path.joinpath("keys"), size=2)
+
+    assert pool.fill(jobs=2) == 2
+    assert len(pool.keys) == 2
+    assert pool.directory.stat().st_mode & 0o777 == 0o700
+    for key in pool.keys:
+        assert key.stat().st_mode & 0o777 == 0o600
+        serialization.load_pem_private_key(key.read_bytes(), None)
+    assert pool.fill() == 0
+
+
+def test_take(tmp_path):
+    pool = KeyPool(tmp_path.joinpath("keys"), size=1)
+    key_path = tmp_path.joinpath("key.pem")
+    pool.fill()
+    key = pool.keys[0].read_bytes()
+
+    assert pool.take(key_path)
+    assert key_path.read_bytes() == key
+    assert pool.keys == []
+    assert not pool.take(tmp_path.joinpath("other.pem"))
+
+
+def test_background_refill(tmp_path):
+    pool = KeyPool(tmp_path.joinpath("keys"), size=2)
+    pool.fill()
+    with pool:
+        assert pool.take(tmp_path.joinpath("key.pem"))
+    # stop waits for keys that are being generated
+    assert len(pool.keys) == 2
@@ -0,0 +1,51 @@
+import pytest
+from threading import Event
+
+from SCAutolib.exceptions import SCAutolibException
+from SCAutolib.scheduler import Task, TaskGraph
+
+
+def test_dependencies_order():
+    order = []
+    graph = TaskGraph()
+    graph.add("a", lambda: order.append("a"))
+    graph.add("b", lambda: order.append("b"), deps=["a"])
+    graph.add("c", lambda: order.append("c") or "c", deps=["a", "b"])
+
+    results = graph.run(jobs=4)
+
+    assert order == ["a", "b", "c"]
+    assert results["c"] == "c"
+    assert [t.name for t in graph.critical_path()] == ["a", "b", "c"]
+
+
+def test_independent_tasks_run_concurrently():
+    started = Event()
+    graph = TaskGraph()
+    graph.add("first", lambda: started.wait(5))
+    graph.add("second", started.set)
+
+    assert graph.run(jobs=2)["first"]
+
+
+def test_failure_skips_dependents():
+    def fail():
+        raise SCAutolibException("failed")
+
+    graph = TaskGraph()
+    graph.add("fail", fail)
+    graph.add("dependent", lambda: None, deps=["fail"])
+    graph.add("transitive", lambda: None, deps=["dependent"])
+    graph.add("independent", lambda: None)
+
+    with pytest.raises(SCAutolibException, match="failed"):
+        graph.run(jobs=2)
+    assert graph.tasks["dependent"].status == Task.skipped
+    assert graph.tasks["transitive"].status == Task.skipped
+    assert graph.tasks["independent"].status == Task.done
+
+
+def test_unknown_dependency():
+    graph = TaskGraph()
+    with pytest.raises(SCAutolibException):
+        graph.add("task", lambda: None, deps=["missing"])
@@ -1,8 +1,10 @@
 import os
 import pwd
 import pytest
+from python_freeipa import exceptions
 
-from SCAutolib.models.user import User
+from SCAutolib.exceptions import SCAutolibException
+from SCAutolib.models.user import User, IPAUserSet
 from SCAutolib.utils import dump_to_json
 
 
@@ -24,3 +26,50 @@ def test_dump_and_load_user(local_user):
     assert user.username == local_user.username
     assert user.password == local_user.password
     assert user.user_type == local_user.user_type
+
+
+class FakeIPAServer:
+    meta_client = None
+    ipa_server_hostname = "ipa.example.com"
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.methods = []
+
+    def batch(self, methods, group=1):
+        self.methods.append(methods)
+        self.group = group
+        return [self.replies.get((m["method"], m["params"][0][0]),
+                                 {"result": {}}) for m in methods]
+
+
+def test_user_set_add():
+    server = FakeIPAServer({
+        ("user_add", "taken"): exceptions.DuplicateEntry("exists", 4002)})
+    users = [User("first", "pass1"), User("taken", "pass2")]
+
+    results = IPAUserSet(server, users).add_users()
+
+    assert results[0] is None
+    assert isinstance(results[1], SCAutolibException)
+    # All commands are sent in single batch
+    assert len(server.methods) == 1
+    assert server.group == 2
+    methods = [(m["method"], m["params"][0][0]) for m in server.methods[0]]
+    assert methods == [("user_add", "first"), ("user_mod", "first"),
+                       ("user_add", "taken"), ("user_mod", "taken")]
+    assert server.methods[0][0]["params"][1]["userpassword"] == "pass1"
+
+
+def test_user_set_delete():
+    server = FakeIPAServer({
+        ("user_del", "missing"): exceptions.NotFound("not found", 4001),
+        ("user_del", "broken"): exceptions.BadRequest("error", 4000)})
+    users = [User("first", "pass"), User("missing", "pass"),
+             User("broken", "pass")]
+
+    results = IPAUserSet(server, users).delete_users()
+
+    assert results[:2] == [None, None]
+    assert isinstance(results[2], exceptions.BadRequest)
+    assert len(server.methods) == 1
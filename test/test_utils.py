@@ -1,6 +1,7 @@
 from shutil import copy
+from subprocess import CompletedProcess
 
-from SCAutolib import utils, LIB_DUMP_USERS
+from SCAutolib import utils, wait_until, LIB_DUMP_USERS
 
 
 def test_load_user(local_user, tmp_path):
@@ -10,3 +11,37 @@ def test_load_user(local_user, tmp_path):
 
     user = utils.load_user(local_user.username)
     assert user
+
+
+def test_wait_until():
+    checks = []
+
+    def condition():
+        checks.append(1)
+        return len(checks) == 3
+
+    assert wait_until(condition, timeout=5, interval=0.01)
+    assert len(checks) == 3
+    assert not wait_until(lambda: False, timeout=0.1, interval=0.01)
+
+
+def test_check_packages(monkeypatch):
+    calls = []
+
+    def rpm_query(cmd, **kwargs):
+        calls.append(cmd)
+        out = "\n".join(f"{pkg} {pkg}-1.0-1.x86_64" if pkg != "missing"
+                        else "package missing is not installed"
+                        for pkg in cmd[4:])
+        return CompletedProcess(cmd, 1, stdout=out)
+
+    monkeypatch.setattr(utils, "rpm", None)
+    monkeypatch.setattr(utils, "run", rpm_query)
+    cache = {}
+
+    assert utils._check_packages(["opensc", "missing"], cache) == ["missing"]
+    assert cache == {"opensc": "opensc-1.0-1.x86_64", "missing": None}
+    assert len(calls) == 1
+
+    assert utils._check_packages(["opensc", "sssd"], cache) == []
+    assert calls[1][4:] == ["sssd"]